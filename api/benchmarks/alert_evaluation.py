@@ -0,0 +1,96 @@
+"""Scalar vs. columnar threshold evaluation over synthetic heartbeat batches.
+
+Builds `--users` users with a few threshold configs each and heartbeats whose
+readings mostly sit well inside those thresholds, then times
+`evaluate` (one heartbeat at a time) against `evaluate_batch` for every
+batch size. No database is needed:
+
+    python -m benchmarks.alert_evaluation --sizes 10000 100000 1000000
+"""
+
+import argparse
+import random
+import time
+
+from src.notifications.alerts import compile_rules, evaluate, evaluate_batch
+
+METRICS = ["cpu_usage", "ram_usage", "free_disk", "temperature", "latency"]
+
+
+def make_rules(users: int, rng: random.Random) -> dict:
+    rules_by_user = {}
+    for user in range(users):
+        configs = []
+        for config in range(rng.randint(1, 3)):
+            watch_keys = rng.sample(METRICS, rng.randint(1, len(METRICS)))
+            threshHold = {"watch_keys": watch_keys}
+            for metric in watch_keys:
+                threshHold[metric] = (
+                    rng.uniform(5, 20) if metric == "free_disk" else rng.uniform(70, 95)
+                )
+            configs.append({"_id": f"{user}-{config}", "threshHold": threshHold})
+        rules_by_user[f"user-{user}"] = compile_rules(configs)
+    return rules_by_user
+
+
+def make_heartbeats(size: int, users: int, rng: random.Random) -> list:
+    return [
+        (
+            f"device-{index % (users * 4)}",
+            f"user-{index % users}",
+            {
+                "cpu_usage": rng.gauss(35, 12),
+                "ram_usage": rng.gauss(45, 10),
+                "free_disk": rng.gauss(60, 15),
+                "temperature": rng.gauss(50, 8),
+                "latency": rng.gauss(30, 10),
+            },
+        )
+        for index in range(size)
+    ]
+
+
+def run_scalar(heartbeats: list, rules_by_user: dict) -> int:
+    return sum(
+        len(evaluate(rules_by_user[user_id], status))
+        for _, user_id, status in heartbeats
+    )
+
+
+def timed(fn, *args) -> tuple[float, int]:
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10000, 100000, 1000000]
+    )
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rules_by_user = make_rules(args.users, rng)
+
+    print(
+        f"{'heartbeats':>10} {'scalar':>10} {'columnar':>10} {'speedup':>8} {'violations':>11}"
+    )
+    for size in args.sizes:
+        heartbeats = make_heartbeats(size, args.users, rng)
+        # evaluate_heartbeats only loads the rules of users present in the batch
+        batch_rules = {user_id: rules_by_user[user_id] for _, user_id, _ in heartbeats}
+        scalar_time, scalar_violations = timed(run_scalar, heartbeats, batch_rules)
+        batch_time, violations = timed(evaluate_batch, heartbeats, batch_rules)
+        assert scalar_violations == len(violations), "evaluators disagree"
+
+        print(
+            f"{size:>10} {scalar_time:>9.3f}s {batch_time:>9.3f}s "
+            f"{scalar_time / batch_time:>7.1f}x {len(violations):>11}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Concurrent request throughput against a running API.
+
+Logs in with an existing user and fires `--requests` GETs at `--path` keeping
+`--concurrency` in flight, then prints throughput and latency percentiles.
+Run it once per build to compare (e.g. before/after a change):
+
+    python -m benchmarks.concurrent_requests --email user@mail.com --password Secret123
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(args) -> None:
+    async with httpx.AsyncClient(base_url=args.url, timeout=30) as client:
+        login = await client.post(
+            "/api/users/login", data={"email": args.email, "password": args.password}
+        )
+        login.raise_for_status()
+
+        latencies: list[float] = []
+        errors = 0
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one_request():
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(args.path)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one_request() for _ in range(args.requests)))
+        elapsed = time.perf_counter() - started
+
+    print(f"path:        {args.path}")
+    print(f"requests:    {args.requests} ({errors} errors)")
+    print(f"concurrency: {args.concurrency}")
+    print(f"throughput:  {args.requests / elapsed:.1f} req/s")
+    print(f"latency avg: {statistics.mean(latencies) * 1000:.2f} ms")
+    print(f"latency p50: {percentile(latencies, 50) * 1000:.2f} ms")
+    print(f"latency p99: {percentile(latencies, 99) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--path", default="/api/devices/")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+
+    asyncio.run(run(parser.parse_args()))
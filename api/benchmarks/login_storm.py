@@ -0,0 +1,123 @@
+"""Heartbeat latency while a login storm is being verified, measured in-process.
+
+Drives a two-route Starlette app through ASGI (no sockets, no Mongo/Redis):
+`/login` verifies a bcrypt hash and `/heartbeat` stands in for ingest, a cheap
+handler whose latency only depends on how soon the event loop gets to it.
+`--logins` clients hammer `/login` while heartbeats are sent at a fixed rate,
+with bcrypt run on:
+
+* the shared default threadpool (`run_in_threadpool`, the previous code),
+* the bounded `HashingPool`, which rejects logins past `max_pending` with 503.
+
+    python -m benchmarks.login_storm --logins 64 --seconds 5
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from src.users.utils import Hasher, HashingBusy, HashingPool
+
+PASSWORD = "VerySecurepassword123"
+HEARTBEAT_INTERVAL = 0.005
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def make_app(verify) -> Starlette:
+    hashed = Hasher.get_password_hash(PASSWORD)
+
+    async def login(request: Request):
+        try:
+            valid = await verify(PASSWORD, hashed)
+        except HashingBusy:
+            return PlainTextResponse("busy", status_code=503)
+        return PlainTextResponse("ok" if valid else "invalid")
+
+    async def heartbeat(request: Request):
+        return PlainTextResponse("ok", status_code=201)
+
+    return Starlette(
+        routes=[
+            Route("/login", login, methods=["POST"]),
+            Route("/heartbeat", heartbeat, methods=["POST"]),
+        ]
+    )
+
+
+async def storm(app: Starlette, logins: int, seconds: float) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        deadline = time.perf_counter() + seconds
+        statuses: dict[int, int] = {}
+        latencies: list[float] = []
+
+        async def login_client():
+            while time.perf_counter() < deadline:
+                response = await client.post("/login")
+                statuses[response.status_code] = (
+                    statuses.get(response.status_code, 0) + 1
+                )
+                if response.status_code == 503:
+                    await asyncio.sleep(0.05)
+
+        async def heartbeats():
+            # Latency is counted from when the heartbeat was due, so time spent
+            # waiting for a starved event loop to wake up is included
+            due = time.perf_counter()
+            while due < deadline:
+                await asyncio.sleep(max(due - time.perf_counter(), 0))
+                await client.post("/heartbeat")
+                latencies.append(time.perf_counter() - due)
+                due = max(due + HEARTBEAT_INTERVAL, time.perf_counter())
+
+        await asyncio.gather(heartbeats(), *(login_client() for _ in range(logins)))
+
+    return {"latencies": latencies, "statuses": statuses}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--max-pending", type=int, default=32)
+    args = parser.parse_args()
+
+    async def threadpool_verify(password, hashed):
+        return await run_in_threadpool(Hasher.verify_password, password, hashed)
+
+    pool = HashingPool(workers=args.workers, max_pending=args.max_pending)
+
+    async def pool_verify(password, hashed):
+        valid, _ = await pool.verify_and_update(password, hashed)
+        return valid
+
+    modes = {"default threadpool": threadpool_verify, "HashingPool": pool_verify}
+    for name, verify in modes.items():
+        result = asyncio.run(storm(make_app(verify), args.logins, args.seconds))
+        latencies = result["latencies"]
+        print(
+            f"{name:>18}: heartbeat p50 {statistics.median(latencies) * 1000:7.1f}ms "
+            f"p99 {percentile(latencies, 99) * 1000:7.1f}ms "
+            f"({len(latencies)} sent), logins by status {result['statuses']}"
+        )
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
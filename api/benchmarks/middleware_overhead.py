@@ -0,0 +1,151 @@
+"""Per-request cost of the auth middleware, measured in-process.
+
+Drives a one-route Starlette app directly through ASGI (no sockets, no Redis:
+the session is served from the session cache) and compares:
+
+* no middleware at all,
+* the previous stack: two `BaseHTTPMiddleware` classes re-running the
+  `public_routes` scan and the device-status regex on every request,
+* the current `AuthMiddleware` with its precompiled route table.
+
+    python -m benchmarks.middleware_overhead --requests 20000
+"""
+
+import argparse
+import asyncio
+import re
+import time
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from src.middlewares.auth import AuthMiddleware, route_table
+from src.users.sessions import session_cache
+
+LEGACY_PUBLIC_ROUTES = ["/api/users", "/docs", "/openapi.json", "/api/login"]
+SESSION_ID = "benchmark-session"
+SESSIONS = {SESSION_ID: "benchmark-user"}
+
+
+def legacy_is_public(method: str, path: str) -> bool:
+    if path == "/" or any(path.startswith(route) for route in LEGACY_PUBLIC_ROUTES):
+        return True
+    if method == "OPTIONS":
+        return True
+    return (
+        re.fullmatch(r"/api/devices/([a-z0-9]){32}/status", path) is not None
+        and method == "POST"
+    )
+
+
+class LegacyAuth(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        if legacy_is_public(request.method, request.url.path):
+            return await call_next(request)
+        if not request.cookies.get("session_id"):
+            return JSONResponse({"detail": "Unauthorized"}, status_code=401)
+        return await call_next(request)
+
+
+class LegacyUserId(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        if legacy_is_public(request.method, request.url.path):
+            return await call_next(request)
+        user_id = SESSIONS.get(request.cookies.get("session_id"))
+        if not user_id:
+            return JSONResponse({"detail": "Unauthorized"}, status_code=401)
+        request.state.user_id = user_id
+        return await call_next(request)
+
+
+async def devices(request: Request):
+    return PlainTextResponse("ok")
+
+
+def make_app(middleware: list[Middleware]) -> Starlette:
+    return Starlette(routes=[Route("/api/devices", devices)], middleware=middleware)
+
+
+def make_scope(path: str) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"cookie", f"session_id={SESSION_ID}".encode())],
+        "client": ("127.0.0.1", 1234),
+        "server": ("127.0.0.1", 8000),
+    }
+
+
+async def drive(app, requests: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            assert message["status"] == 200, message
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(make_scope("/api/devices"), receive, send)
+    return time.perf_counter() - start
+
+
+def time_classification(fn, paths: list[tuple[str, str]], rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for method, path in paths:
+            fn(method, path)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    session_cache.set(SESSION_ID, SESSIONS[SESSION_ID], ttl=3600)
+
+    paths = [
+        ("GET", "/api/devices"),
+        ("GET", "/api/users/login"),
+        ("POST", "/api/devices/0123456789abcdef0123456789abcdef/status"),
+        ("GET", "/api/notifications/config"),
+    ]
+    rounds = args.requests
+    legacy = time_classification(legacy_is_public, paths, rounds)
+    current = time_classification(route_table.is_public, paths, rounds)
+    lookups = rounds * len(paths)
+    print(f"route classification: legacy {legacy / lookups * 1e6:.2f}us")
+    print(f"                      table  {current / lookups * 1e6:.2f}us")
+
+    stacks = {
+        "no middleware": make_app([]),
+        "BaseHTTPMiddleware x2": make_app(
+            [Middleware(LegacyUserId), Middleware(LegacyAuth)]
+        ),
+        "ASGI AuthMiddleware": make_app([Middleware(AuthMiddleware)]),
+    }
+    baseline = None
+    for name, app in stacks.items():
+        elapsed = asyncio.run(drive(app, args.requests))
+        per_request = elapsed / args.requests * 1e6
+        baseline = per_request if baseline is None else baseline
+        print(
+            f"{name:>22}: {per_request:7.1f}us/request "
+            f"(+{per_request - baseline:.1f}us over bare app)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Response time of status histories by list size, measured in-process.
+
+Drives two FastAPI routes through ASGI (no sockets, no Mongo) that return the
+same projected heartbeat documents:
+
+* through `response_model=list[DeviceStatus]`, which validates and then
+  serializes every item (the default),
+* as a `FastJSONResponse`, the `FAST_JSON_RESPONSES` path.
+
+Both bodies are checked to be byte-identical before timing.
+
+    python -m benchmarks.response_serialization --sizes 10 100 1000 5000
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from fastapi import FastAPI, Response
+
+from src.devices.schemas import DeviceStatus
+from src.serialization import fast_json_response
+
+
+def make_statuses(size: int) -> list[dict]:
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    boot_date = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "cpu_usage": round(random.uniform(0, 100), 2),
+            "ram_usage": round(random.uniform(0, 100), 2),
+            "free_disk": round(random.uniform(0, 500), 2),
+            "temperature": round(random.uniform(20, 90), 2),
+            "latency": None,
+            "connectivity": True,
+            "boot_date": boot_date,
+            # Millisecond precision, as stored by Mongo
+            "created_at": now - timedelta(milliseconds=1500 * index),
+        }
+        for index in range(size)
+    ]
+
+
+def make_app(statuses: list[dict]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/model", response_model=list[DeviceStatus])
+    async def model():
+        return statuses
+
+    @app.get("/fast", response_model=list[DeviceStatus])
+    async def fast(response: Response):
+        return fast_json_response(statuses, response)
+
+    return app
+
+
+async def measure(app: FastAPI, path: str, requests: int) -> tuple[list, bytes]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        body = (await client.get(path)).content
+        timings = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            await client.get(path)
+            timings.append(time.perf_counter() - started)
+    return timings, body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        app = make_app(make_statuses(size))
+        model_timings, model_body = asyncio.run(measure(app, "/model", args.requests))
+        fast_timings, fast_body = asyncio.run(measure(app, "/fast", args.requests))
+        assert model_body == fast_body, "fast path body differs from the model's"
+
+        model_ms = statistics.median(model_timings) * 1000
+        fast_ms = statistics.median(fast_timings) * 1000
+        print(
+            f"{size:>6} statuses: response_model {model_ms:8.2f}ms, "
+            f"orjson {fast_ms:8.2f}ms ({model_ms / fast_ms:4.1f}x), "
+            f"{len(fast_body)} bytes"
+        )
+
+
+if __name__ == "__main__":
+    main()
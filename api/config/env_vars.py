@@ -9,6 +9,11 @@ def get_port():
     return int(os.getenv("PORT", "8000"))
 
 
+def get_workers():
+    # Same variable uvicorn's CLI reads for --workers
+    return int(os.getenv("WEB_CONCURRENCY", "1"))
+
+
 def get_enviroment():
     return os.getenv("ENV", "development")
 
@@ -35,3 +40,130 @@ def get_database_host() -> str:
 
 def get_redis_host() -> str:
     return os.getenv("REDIS_HOST", "localhost")
+
+
+def get_redis_port() -> int:
+    return int(os.getenv("REDIS_PORT", "6379"))
+
+
+def get_mongo_pool_options() -> dict:
+    return {
+        "maxPoolSize": int(os.getenv("MONGODB_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.getenv("MONGODB_MIN_POOL_SIZE", "5")),
+        "maxIdleTimeMS": int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "60000")),
+        "waitQueueTimeoutMS": int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "2000")),
+        "serverSelectionTimeoutMS": int(
+            os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000")
+        ),
+    }
+
+
+def get_redis_pool_options() -> dict:
+    return {
+        "max_connections": int(os.getenv("REDIS_MAX_CONNECTIONS", "50")),
+        "timeout": float(os.getenv("REDIS_POOL_TIMEOUT", "2")),
+    }
+
+
+def get_device_offline_after() -> int:
+    return int(os.getenv("DEVICE_OFFLINE_AFTER_SECONDS", "180"))
+
+
+def get_ingest_options() -> dict:
+    return {
+        "max_batch_size": int(os.getenv("INGEST_MAX_BATCH_SIZE", "500")),
+        "max_delay": float(os.getenv("INGEST_MAX_DELAY_MS", "20")) / 1000,
+        "max_queue_size": int(os.getenv("INGEST_MAX_QUEUE_SIZE", "10000")),
+    }
+
+
+def get_session_cache_options() -> dict:
+    return {
+        "maxsize": int(os.getenv("SESSION_CACHE_MAX_SIZE", "10000")),
+        "ttl": float(os.getenv("SESSION_CACHE_TTL_SECONDS", "30")),
+    }
+
+
+def get_websocket_options() -> dict:
+    return {
+        "max_queue_size": int(os.getenv("WS_SEND_QUEUE_SIZE", "100")),
+        # drop_oldest | drop_newest | coalesce
+        "overflow_policy": os.getenv("WS_OVERFLOW_POLICY", "coalesce"),
+        "send_timeout": float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "5")),
+        "max_dropped": int(os.getenv("WS_MAX_DROPPED", "1000")),
+        # Only for sockets that negotiated a batching subprotocol
+        "batch_window": float(os.getenv("WS_BATCH_WINDOW_MS", "25")) / 1000,
+        "max_batch_size": int(os.getenv("WS_MAX_BATCH_SIZE", "100")),
+    }
+
+
+def get_presence_options() -> dict:
+    return {
+        "ttl": float(os.getenv("WS_PRESENCE_TTL_SECONDS", "30")),
+        "heartbeat": float(os.getenv("WS_PRESENCE_HEARTBEAT_SECONDS", "10")),
+    }
+
+
+def get_telemetry_subscription_options() -> dict:
+    return {
+        # Default per-device push interval; clients can ask for another one
+        "interval": float(os.getenv("WS_TELEMETRY_INTERVAL_MS", "1000")) / 1000,
+        "max_devices": int(os.getenv("WS_TELEMETRY_MAX_DEVICES", "1000")),
+    }
+
+
+def get_retention_options() -> dict:
+    """Retention periods in days; 0 keeps data forever."""
+    return {
+        "telemetry_days": int(os.getenv("TELEMETRY_RETENTION_DAYS", "30")),
+        # Coarser rollups are cheaper to keep, so they outlive the raw data
+        "rollup_days": {
+            "1m": int(os.getenv("ROLLUP_1M_RETENTION_DAYS", "90")),
+            "5m": int(os.getenv("ROLLUP_5M_RETENTION_DAYS", "365")),
+            "1h": int(os.getenv("ROLLUP_1H_RETENTION_DAYS", "1825")),
+        },
+        "read_notification_days": int(
+            os.getenv("READ_NOTIFICATION_RETENTION_DAYS", "7")
+        ),
+        "stream_days": int(os.getenv("NOTIFICATION_STREAM_RETENTION_DAYS", "7")),
+        "interval": float(os.getenv("RETENTION_INTERVAL_SECONDS", "3600")),
+    }
+
+
+def get_password_hashing_options() -> dict:
+    # Leave a core to the event loop by default
+    default_workers = max((os.cpu_count() or 2) - 1, 1)
+    return {
+        "rounds": int(os.getenv("BCRYPT_ROUNDS", "12")),
+        "workers": int(os.getenv("PASSWORD_HASH_WORKERS", str(default_workers))),
+        "max_pending": int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32")),
+    }
+
+
+def get_login_throttle_options() -> dict:
+    return {
+        "window": int(os.getenv("LOGIN_THROTTLE_WINDOW_SECONDS", "300")),
+        "max_email_failures": int(os.getenv("LOGIN_MAX_FAILURES_PER_EMAIL", "5")),
+        "max_ip_failures": int(os.getenv("LOGIN_MAX_FAILURES_PER_IP", "50")),
+    }
+
+
+def get_alert_cooldown() -> int:
+    # A device still over a threshold is notified again after this long
+    return int(os.getenv("ALERT_COOLDOWN_SECONDS", "3600"))
+
+
+def get_device_cache_options() -> dict:
+    return {
+        "maxsize": int(os.getenv("DEVICE_CACHE_MAX_SIZE", "50000")),
+        "ttl": float(os.getenv("DEVICE_CACHE_TTL_SECONDS", "60")),
+    }
+
+
+def get_metrics_token() -> str | None:
+    # /metrics is disabled unless a scrape token is configured
+    return os.getenv("METRICS_TOKEN") or None
+
+
+def get_fast_json_responses() -> bool:
+    return os.getenv("FAST_JSON_RESPONSES", "false").lower() in ("1", "true")
@@ -0,0 +1,88 @@
+"""One-shot migration of embedded `status` arrays into the telemetry store.
+
+    python3 -m config.migrate_status
+
+Each device's heartbeats are copied into the time-series collection and the
+`status` field is then replaced by the `last_status` snapshot, so re-running
+the script only processes devices that were not migrated yet.
+
+A device interrupted between the copy and the `$unset` is copied again on the
+next run, but only the heartbeats its telemetry does not hold yet: the
+time-series collection has no unique key to reject duplicates.
+"""
+
+from collections import Counter
+from datetime import datetime
+
+from src.database import get_sync_database
+from src.devices.dependencies import get_devices_collection, get_telemetry_collection
+from src.devices.telemetry import (
+    TELEMETRY_COLLECTION,
+    TIMESERIES_OPTIONS,
+    latest_status_update,
+    to_telemetry_document,
+)
+
+BATCH_SIZE = 1000
+
+db = get_sync_database()
+devices_collection = get_devices_collection(db)
+telemetry_collection = get_telemetry_collection(db)
+
+
+def stored_instant(created_at: datetime) -> datetime:
+    # BSON dates keep milliseconds
+    return created_at.replace(microsecond=created_at.microsecond // 1000 * 1000)
+
+
+def already_copied(device_id: str) -> Counter:
+    """How many heartbeats of the device the telemetry holds per `created_at`."""
+    return Counter(
+        stored_instant(document["created_at"])
+        for document in telemetry_collection.find(
+            {"meta.device_id": device_id}, {"_id": 0, "created_at": 1}
+        )
+    )
+
+
+def migrate_device(device: dict) -> int:
+    documents = [
+        to_telemetry_document(device["id"], device["user_id"], status)
+        for status in device.get("status", [])
+    ]
+
+    copied = already_copied(device["id"]) if documents else Counter()
+    pending = []
+    for document in documents:
+        instant = stored_instant(document["created_at"])
+        if copied[instant]:
+            copied[instant] -= 1
+        else:
+            pending.append(document)
+
+    for start in range(0, len(pending), BATCH_SIZE):
+        telemetry_collection.insert_many(
+            pending[start : start + BATCH_SIZE], ordered=False
+        )
+
+    update = [{"$unset": "status"}]
+    if documents:
+        newest = max(documents, key=lambda document: document["created_at"])
+        update = latest_status_update(newest) + update
+
+    devices_collection.update_one({"_id": device["_id"]}, update)
+    return len(pending)
+
+
+if __name__ == "__main__":
+    if TELEMETRY_COLLECTION not in db.list_collection_names():
+        db.create_collection(TELEMETRY_COLLECTION, timeseries=TIMESERIES_OPTIONS)
+
+    migrated_devices = 0
+    migrated_status = 0
+    for device in devices_collection.find({"status": {"$exists": True}}):
+        migrated_status += migrate_device(device)
+        migrated_devices += 1
+        print(f"migrated device {device['id']}")
+
+    print(f"migrated {migrated_status} heartbeats from {migrated_devices} devices")
@@ -7,8 +7,14 @@ from src.users.utils import Hasher
 from src.users.schemas import UserIn
 from src.notifications.dependencies import get_notifications_config_collection
 from src.users.dependencies import get_user_collection
-from src.devices.dependencies import get_devices_collection
-from src.database import get_database
+from src.devices.dependencies import get_devices_collection, get_telemetry_collection
+from src.devices.telemetry import (
+    TELEMETRY_COLLECTION,
+    TIMESERIES_OPTIONS,
+    status_snapshot,
+    to_telemetry_document,
+)
+from src.database import get_sync_database
 from .device_helper import create_device
 
 from faker import Faker
@@ -17,11 +23,12 @@ QTD_DEVICES = 1
 QTD_NOTIFICATION_CONFIG = 2
 
 faker = Faker()
-db = get_database()
+db = get_sync_database()
 
 notification_collection = get_notifications_config_collection(db)
 users_collection = get_user_collection(db)
 devices_collection = get_devices_collection(db)
+telemetry_collection = get_telemetry_collection(db)
 
 
 def drop_collections():
@@ -58,8 +65,12 @@ if __name__ == "__main__":
         print("Failed to create user")
         exit()
 
+    if TELEMETRY_COLLECTION not in db.list_collection_names():
+        db.create_collection(TELEMETRY_COLLECTION, timeseries=TIMESERIES_OPTIONS)
+
     print(f"------- seeding {QTD_DEVICES} devices for user...------- ")
     devices = []
+    status = []
     for _ in range(QTD_DEVICES):
         device = Device(
             name=faker.word(),
@@ -76,7 +87,6 @@ if __name__ == "__main__":
             interval=10,
         )
 
-        status = []
         for _ in range(random.randint(1, 5)):
             device_status = DeviceStatusInput(
                 cpu_usage=faker.random_int(min=0, max=100),
@@ -88,9 +98,11 @@ if __name__ == "__main__":
                 boot_date=faker.date_this_decade().isoformat(),
             ).model_dump()
 
-            status.append(device_status)
+            status.append(to_telemetry_document(device["id"], user_id, device_status))
 
-        device["status"] = status
+        device["last_status"] = status_snapshot(status[-1])
+        device["last_seen_at"] = status[-1]["created_at"]
+        device["online"] = status[-1]["connectivity"]
         devices.append(device)
 
     print("-------------------------")
@@ -131,5 +143,6 @@ if __name__ == "__main__":
 
     with db.client.start_session() as session:
         devices_collection.insert_many(devices, session=session)
+        telemetry_collection.insert_many(status, session=session)
         notification_collection.insert_many(notification_list, session=session)
     print("finished seeding database")
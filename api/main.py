@@ -1,19 +1,30 @@
 from contextlib import asynccontextmanager
+import secrets
 import uvicorn
 import logging
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Header, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
 from src.middlewares.auth import AuthMiddleware
-from src.middlewares.users import UserIdAppend
 
-from config.env_vars import get_allowed_hosts
+from config.env_vars import get_allowed_hosts, get_metrics_token
 from config.logging import setup_logger
 
 from src.devices.router import router as devicesRouter
 from src.users.router import router as usersRouter
 from src.notifications.router import router as notificationsRouter
-from src.database import check_client_connection
+from src.websocket.router import router as websocketRouter
+from src.database import check_client_connection, clients, get_database
+from src.invalidation import cache_invalidator
+from src.devices.indexes import ensure_indexes
+from src.devices.ingest import batcher
+from src.websocket.dispatcher import dispatcher
+from src.websocket.presence import presence
+from src.websocket.routing import message_router
+from src.websocket.telemetry import telemetry_hub
+from src.metrics import metrics
+from src.retention import ensure_retention_indexes, retention_job
+from src.users.utils import hashing_pool
 
 setup_logger()
 
@@ -26,8 +37,28 @@ allowed_hosts = get_allowed_hosts()
 @asynccontextmanager
 async def lifespan(_: FastAPI):
     logger.info("application custom startup")
-    check_client_connection()
+    clients.open()
+    await check_client_connection()
+    await ensure_indexes(get_database())
+    await ensure_retention_indexes(get_database())
+    cache_invalidator.start()
+    batcher.start()
+    presence.start()
+    message_router.start()
+    dispatcher.start()
+    telemetry_hub.start()
+    retention_job.start()
     yield
+    logger.info("application custom shutdown")
+    await retention_job.stop()
+    await telemetry_hub.stop()
+    await dispatcher.stop()
+    await message_router.stop()
+    await presence.stop()
+    await batcher.stop()
+    await cache_invalidator.stop()
+    hashing_pool.shutdown()
+    await clients.close()
 
 
 app = FastAPI(
@@ -46,11 +77,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 app.add_middleware(AuthMiddleware)
-app.add_middleware(UserIdAppend)
 
 app.include_router(usersRouter, prefix="/api")
 app.include_router(devicesRouter, prefix="/api")
 app.include_router(notificationsRouter, prefix="/api")
+app.include_router(websocketRouter)
 
 
 @app.get("/")
@@ -58,16 +89,41 @@ def default():
     return {"Hello": "World"}
 
 
+def require_metrics_token(authorization: str | None = Header(None)):
+    # Pool, queue and connection internals: scrapers present METRICS_TOKEN
+    # instead of a session
+    token = get_metrics_token()
+    if token is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    if not secrets.compare_digest(authorization or "", f"Bearer {token}"):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Unauthorized",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+@app.get("/metrics", dependencies=[Depends(require_metrics_token)])
+def get_metrics():
+    return metrics.snapshot()
+
+
 if __name__ == "__main__":
-    from config.env_vars import get_port, get_enviroment
+    from config.env_vars import get_port, get_enviroment, get_workers
 
     port = get_port()
     env = get_enviroment()
+    workers = get_workers()
+
+    # uvicorn silently runs a single process when reload is on
+    reload = env == "development" and workers == 1
+    if env == "development" and not reload:
+        logger.warning(f"Running {workers} workers without auto-reload")
 
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=port,
-        workers=1,
-        reload=True if env == "development" else False,
+        workers=workers,
+        reload=reload,
     )
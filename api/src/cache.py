@@ -0,0 +1,53 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from .metrics import metrics
+
+MISSING = object()
+
+
+class TTLCache:
+    """Bounded per-worker LRU cache whose entries expire after `ttl` seconds.
+
+    Meant for small hot lookups on the request path; it is not thread-safe and
+    must only be used from the event loop. Hits and misses are reported as
+    `cache.<name>.hits` / `cache.<name>.misses`.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                metrics.incr(f"cache.{self.name}.hits")
+                return value
+            del self._entries[key]
+
+        metrics.incr(f"cache.{self.name}.misses")
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            metrics.incr(f"cache.{self.name}.evictions")
+
+    def invalidate(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
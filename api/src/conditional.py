@@ -0,0 +1,74 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from .metrics import metrics
+
+
+def make_etag(*parts) -> str:
+    """Weak ETag for a version made of `parts` (anything with a stable repr)."""
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def has_validator(request: Request) -> bool:
+    return "if-none-match" in request.headers
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Weak comparison of `etag` against the request's `If-None-Match`."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag.removeprefix("W/") in tags
+
+
+def http_date(*values: datetime | str | None) -> str | None:
+    """`Last-Modified` value for the latest of `values`.
+
+    Accepts datetimes and ISO strings; naive values are UTC.
+    """
+    latest = None
+    for value in values:
+        if isinstance(value, str):
+            try:
+                value = datetime.fromisoformat(value)
+            except ValueError:
+                continue
+        if value is None:
+            continue
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        else:
+            value = value.astimezone(timezone.utc)
+        latest = value if latest is None else max(latest, value)
+
+    if latest is None:
+        return None
+    return format_datetime(latest, usegmt=True)
+
+
+def set_validators(
+    response: Response, etag: str, *modified: datetime | str | None
+) -> None:
+    response.headers["ETag"] = etag
+    # Always revalidate: some versions also change with time (e.g. `online`)
+    response.headers["Cache-Control"] = "private, no-cache"
+    last_modified = http_date(*modified)
+    if last_modified:
+        response.headers["Last-Modified"] = last_modified
+
+
+def not_modified(etag: str, *modified: datetime | str | None) -> Response:
+    """Empty 304 answer carrying the same validators as the full response."""
+    metrics.incr("http.not_modified")
+    response = Response(status_code=304)
+    set_validators(response, etag, *modified)
+    return response
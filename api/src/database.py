@@ -1,44 +1,216 @@
 import logging
+import time
 
-from config.env_vars import get_database_credentials, get_database_host, get_redis_host
-from pymongo import MongoClient
+from config.env_vars import (
+    get_database_credentials,
+    get_database_host,
+    get_mongo_pool_options,
+    get_redis_host,
+    get_redis_port,
+    get_redis_pool_options,
+)
+from pymongo import AsyncMongoClient, MongoClient, monitoring
+from pymongo.asynchronous.database import AsyncDatabase
 from pymongo.database import Database
-from redis import Redis
 from redis import asyncio
 
+from .metrics import metrics
+
 logger = logging.getLogger(__name__)
 
+DATABASE_NAME = "iotDevices"
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """Feeds pymongo connection pool events into the metrics registry."""
+
+    def __init__(self):
+        self.open_connections = 0
+        self.checked_out = 0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        metrics.incr("mongo.pool.cleared")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self.open_connections += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self.open_connections -= 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        metrics.incr("mongo.pool.checkout_failed")
+
+    def connection_checked_out(self, event):
+        self.checked_out += 1
+        metrics.incr("mongo.pool.checkouts")
+        if event.duration is not None:
+            metrics.observe("mongo.pool.checkout_wait", event.duration)
+
+    def connection_checked_in(self, event):
+        self.checked_out -= 1
+
+
+class InstrumentedAsyncRedisPool(asyncio.BlockingConnectionPool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checked_out = 0
+
+    async def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        connection = await super().get_connection(*args, **kwargs)
+        metrics.observe("redis.async_pool.checkout_wait", time.perf_counter() - start)
+        metrics.incr("redis.async_pool.checkouts")
+        self.checked_out += 1
+        return connection
+
+    async def release(self, connection):
+        self.checked_out -= 1
+        return await super().release(connection)
+
+
+class ClientRegistry:
+    """Process-wide database clients.
+
+    One Mongo connection pool and one Redis connection pool per worker. The
+    FastAPI lifespan opens and closes them; scripts and tests that never run
+    the lifespan get the same clients lazily on first use.
+    """
+
+    def __init__(self):
+        self._mongo: AsyncMongoClient | None = None
+        self._sync_mongo: MongoClient | None = None
+        self._mongo_metrics: MongoPoolMetrics | None = None
+        self._async_redis_pool: InstrumentedAsyncRedisPool | None = None
+        self._async_redis: asyncio.Redis | None = None
 
-def get_db_client() -> MongoClient:
+    @property
+    def mongo(self) -> AsyncMongoClient:
+        if self._mongo is None:
+            self._mongo = self._create_mongo_client()
+        return self._mongo
+
+    @property
+    def sync_mongo(self) -> MongoClient:
+        if self._sync_mongo is None:
+            self._sync_mongo = MongoClient(get_connection_string(), tz_aware=True)
+        return self._sync_mongo
+
+    @property
+    def async_redis_pool(self) -> InstrumentedAsyncRedisPool:
+        if self._async_redis_pool is None:
+            self._async_redis_pool = InstrumentedAsyncRedisPool(
+                host=get_redis_host(),
+                port=get_redis_port(),
+                db=0,
+                decode_responses=True,
+                **get_redis_pool_options(),
+            )
+        return self._async_redis_pool
+
+    @property
+    def async_redis(self) -> asyncio.Redis:
+        # Building a client costs ~100us, so share one; it is safe across tasks
+        # since every command checks its own connection out of the pool.
+        if self._async_redis is None:
+            self._async_redis = asyncio.Redis(connection_pool=self.async_redis_pool)
+        return self._async_redis
+
+    def _create_mongo_client(self) -> AsyncMongoClient:
+        self._mongo_metrics = MongoPoolMetrics()
+
+        try:
+            return AsyncMongoClient(
+                get_connection_string(),
+                tz_aware=True,
+                event_listeners=[self._mongo_metrics],
+                **get_mongo_pool_options(),
+            )
+        except Exception as e:
+            logger.error(f"Unable to connec to mongodb client due to:\n {e}")
+            raise Exception("Unable to connect to mongodb client")
+
+    def open(self) -> None:
+        self.mongo
+        self.async_redis_pool
+
+        metrics.register_gauge(
+            "mongo.pool.size", lambda: self._mongo_metrics.open_connections
+        )
+        metrics.register_gauge(
+            "mongo.pool.checked_out", lambda: self._mongo_metrics.checked_out
+        )
+        metrics.register_gauge(
+            "redis.async_pool.checked_out", lambda: self._async_redis_pool.checked_out
+        )
+
+    async def close(self) -> None:
+        for gauge in (
+            "mongo.pool.size",
+            "mongo.pool.checked_out",
+            "redis.async_pool.checked_out",
+        ):
+            metrics.unregister_gauge(gauge)
+
+        if self._mongo is not None:
+            await self._mongo.close()
+            self._mongo = None
+
+        if self._sync_mongo is not None:
+            self._sync_mongo.close()
+            self._sync_mongo = None
+
+        self._async_redis = None
+        if self._async_redis_pool is not None:
+            await self._async_redis_pool.aclose()
+            self._async_redis_pool = None
+
+
+clients = ClientRegistry()
+
+
+def get_connection_string() -> str:
     (username, password) = get_database_credentials()
     host = get_database_host()
-    connectionString = f"mongodb://{username}:{password}@{host}:27017"
-    logger.debug(f"connectionString: {connectionString}")
+    return f"mongodb://{username}:{password}@{host}:27017"
 
-    try:
-        client = MongoClient(connectionString)
-        return client
-    except Exception as e:
-        logger.error(f"Unable to connec to mongodb client due to:\n {e}")
-        raise Exception("Unable to connect to mongodb client")
 
+def get_db_client() -> AsyncMongoClient:
+    return clients.mongo
 
-def get_database() -> Database:
-    client = get_db_client()
-    return Database(client, "iotDevices")
 
+def get_database() -> AsyncDatabase:
+    return clients.mongo.get_database(DATABASE_NAME)
 
-def check_client_connection():
-    client = get_db_client()
-    logger.debug(f"client: {client}")
-    return client.admin.command("ping")
 
+def get_sync_db_client() -> MongoClient:
+    """Blocking client for scripts and test fixtures that run outside the event loop."""
+    return clients.sync_mongo
 
-def get_redis_storage():
-    host = get_redis_host()
-    return Redis(host=host, port=6379, db=0, decode_responses=True)
+
+def get_sync_database() -> Database:
+    return get_sync_db_client().get_database(DATABASE_NAME)
+
+
+async def check_client_connection():
+    client = get_db_client()
+    logger.debug(f"client: {client}")
+    return await client.admin.command("ping")
 
 
-def get_async_redis_storage():
-    host = get_redis_host()
-    return asyncio.Redis(host=host, port=6379, db=0, decode_responses=True)
+def get_async_redis_storage() -> asyncio.Redis:
+    return clients.async_redis
@@ -0,0 +1,76 @@
+from pymongo.asynchronous.collection import AsyncCollection
+
+from config.env_vars import get_device_cache_options
+from src.cache import MISSING, TTLCache
+from src.invalidation import cache_invalidator
+
+DEVICE_CACHE_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "user_id": 1,
+    "name": 1,
+    "location": 1,
+    "sn": 1,
+    "description": 1,
+    "created_at": 1,
+    "updated_at": 1,
+}
+
+# Unknown ids are remembered briefly so heartbeats for a deleted or mistyped
+# device don't reach Mongo every time; create_device invalidates them anyway.
+NEGATIVE_TTL = 5
+
+# device_id -> metadata and owner, or None for a device that does not exist.
+# Entries must not be mutated by callers.
+device_cache = cache_invalidator.register(
+    TTLCache("devices", **get_device_cache_options())
+)
+
+
+async def get_devices(collection: AsyncCollection, device_ids: list[str]) -> dict:
+    """Device id -> metadata (including `user_id`), read through the cache.
+
+    Misses are resolved with a single `$in` query; ids of devices that do not
+    exist are absent from the result.
+    """
+    devices = {}
+    misses = []
+    for device_id in device_ids:
+        device = device_cache.get(device_id)
+        if device is MISSING:
+            misses.append(device_id)
+        elif device is not None:
+            devices[device_id] = device
+
+    if not misses:
+        return devices
+
+    found = {
+        device["id"]: device
+        async for device in collection.find(
+            {"id": {"$in": misses}}, DEVICE_CACHE_PROJECTION
+        )
+    }
+    for device_id in misses:
+        device = found.get(device_id)
+        if device is None:
+            device_cache.set(device_id, None, ttl=NEGATIVE_TTL)
+        else:
+            device_cache.set(device_id, device)
+            devices[device_id] = device
+
+    return devices
+
+
+async def get_owned_device(
+    collection: AsyncCollection, device_id: str, user_id: str
+) -> dict | None:
+    device = (await get_devices(collection, [device_id])).get(device_id)
+    if device is None or device["user_id"] != user_id:
+        return None
+    return device
+
+
+async def invalidate_device(device_id: str) -> None:
+    """Drop a device from every worker's cache."""
+    await cache_invalidator.invalidate(device_cache, device_id)
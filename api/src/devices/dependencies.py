@@ -1,51 +1,106 @@
 from datetime import datetime
 
-from typing import Annotated
-from fastapi import Depends
-from pymongo.collection import Collection
+from typing import Annotated, Optional
+from fastapi import Depends, HTTPException, Request, status
+from pydantic import TypeAdapter, ValidationError
+from pymongo.asynchronous.collection import AsyncCollection
 from src.schemas import DatabaseDep
 
+from .indexes import DEVICES_COLLECTION
+from .rollups import ROLLUPS_COLLECTION
+from .schemas import DeviceHeartbeatInput
+from .telemetry import TELEMETRY_COLLECTION, parse_timestamp
 
-def get_devices_collection(db: DatabaseDep) -> Collection:
-    devices_collection = db.get_collection("devices")
+
+def get_devices_collection(db: DatabaseDep) -> AsyncCollection:
+    devices_collection = db.get_collection(DEVICES_COLLECTION)
     return devices_collection
 
 
+def get_telemetry_collection(db: DatabaseDep) -> AsyncCollection:
+    telemetry_collection = db.get_collection(TELEMETRY_COLLECTION)
+    return telemetry_collection
+
+
+def get_rollups_collection(db: DatabaseDep) -> AsyncCollection:
+    rollups_collection = db.get_collection(ROLLUPS_COLLECTION)
+    return rollups_collection
+
+
 def get_devices_query_params(
     location: str = "",
     uuid: str = "",
     sn: str = "",
     skip: int = 0,
     limit: int = 100,
-    start_date: str = "",
-    end_date: str = "",
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
 ):
     q = dict()
     if location:
         q.update({"location": location})
 
     if uuid:
-        q.update({"uuid": uuid})
+        q.update({"id": uuid})
 
     if sn:
         q.update({"sn": sn})
 
-    if start_date:
-        q.update({"start_date": datetime.fromisoformat(start_date).date().isoformat()})
-
-    if end_date:
-        q.update({"end_date": datetime.fromisoformat(end_date).date().isoformat()})
-
     print(f"query: {q}")
     return {
         "q": q,
         "skip": skip,
         "limit": limit,
-        "start_date": start_date,
-        "end_date": end_date,
+        "start_date": parse_timestamp(start_date) if start_date else None,
+        "end_date": parse_timestamp(end_date) if end_date else None,
+        "cursor": cursor,
+        "include_total": include_total,
     }
 
 
-DevicesCollectionDep = Annotated[Collection, Depends(get_devices_collection)]
+MAX_BULK_HEARTBEATS = 10000
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson")
+
+heartbeat_list_adapter = TypeAdapter(list[DeviceHeartbeatInput])
+
+
+async def get_bulk_heartbeats(request: Request) -> list[DeviceHeartbeatInput]:
+    """Parse a JSON array or NDJSON body of heartbeats for many devices."""
+    body = await request.body()
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+
+    try:
+        if content_type in NDJSON_CONTENT_TYPES:
+            heartbeats = [
+                DeviceHeartbeatInput.model_validate_json(line)
+                for line in body.splitlines()
+                if line.strip()
+            ]
+        else:
+            heartbeats = heartbeat_list_adapter.validate_json(body)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=e.errors(include_url=False, include_context=False),
+        )
+
+    if len(heartbeats) > MAX_BULK_HEARTBEATS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {MAX_BULK_HEARTBEATS} heartbeats per request",
+        )
+
+    return heartbeats
+
+
+DevicesCollectionDep = Annotated[AsyncCollection, Depends(get_devices_collection)]
+
+TelemetryCollectionDep = Annotated[AsyncCollection, Depends(get_telemetry_collection)]
+
+RollupsCollectionDep = Annotated[AsyncCollection, Depends(get_rollups_collection)]
 
 DevicesQueryParamsDep = Annotated[dict, Depends(get_devices_query_params)]
+
+BulkHeartbeatsDep = Annotated[list[DeviceHeartbeatInput], Depends(get_bulk_heartbeats)]
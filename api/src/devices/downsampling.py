@@ -0,0 +1,89 @@
+import numpy as np
+
+DOWNSAMPLING_METHODS = ("lttb", "minmax")
+
+
+def lttb(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indexes of the points to keep.
+
+    The first and last points are always kept; every bucket in between keeps
+    the point forming the largest triangle with the previously kept point and
+    the average of the next bucket, which preserves peaks and the overall
+    shape far better than striding.
+    """
+    size = len(x)
+    if max_points >= size:
+        return np.arange(size)
+    if max_points < 3:
+        return np.array([0, size - 1][:max_points], dtype=np.intp)
+
+    edges = np.linspace(1, size - 1, max_points - 1).astype(np.intp)
+    selected = np.empty(max_points, dtype=np.intp)
+    selected[0], selected[-1] = 0, size - 1
+
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else size
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+
+        previous_x, previous_y = x[previous], y[previous]
+        areas = np.abs(
+            (previous_x - next_x) * (y[start:end] - previous_y)
+            - (previous_x - x[start:end]) * (next_y - previous_y)
+        )
+        previous = start + int(areas.argmax())
+        selected[bucket + 1] = previous
+
+    return selected
+
+
+def minmax(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """Indexes of the lowest and highest point of equal-width time buckets.
+
+    Keeps every spike whatever its width, at the cost of a less even spacing
+    than `lttb`.
+    """
+    size = len(x)
+    if max_points >= size:
+        return np.arange(size)
+
+    buckets = max(max_points // 2, 1)
+    span = x[-1] - x[0]
+    if span <= 0:
+        return np.array([0, size - 1][:max_points], dtype=np.intp)
+
+    bucket_ids = ((x - x[0]) * (buckets / span)).astype(np.intp)
+    np.minimum(bucket_ids, buckets - 1, out=bucket_ids)
+
+    # x is sorted, so every bucket is a contiguous run
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(bucket_ids)) + 1))
+    segments = np.repeat(np.arange(len(starts)), np.diff(starts, append=size))
+
+    selected = []
+    for reduce in (np.minimum, np.maximum):
+        hits = np.flatnonzero(y == reduce.reduceat(y, starts)[segments])
+        hit_segments = segments[hits]
+        # Ties keep the first hit of each bucket
+        first = np.concatenate(([True], hit_segments[1:] != hit_segments[:-1]))
+        selected.append(hits[first])
+
+    return np.unique(np.concatenate(selected))
+
+
+def downsample(
+    x: np.ndarray, y: np.ndarray, max_points: int, method: str = "lttb"
+) -> np.ndarray:
+    """Indexes into (x, y) of at most `max_points` points, ascending.
+
+    `x` must be sorted. Points without a value (NaN) can't be drawn and are
+    never selected.
+    """
+    present = np.flatnonzero(~np.isnan(y))
+    if len(present) == 0:
+        return present
+
+    x, y = x[present], y[present]
+    select = lttb if method == "lttb" else minmax
+    return present[select(x, y, max_points)]
@@ -0,0 +1,122 @@
+import csv
+import io
+import logging
+import zlib
+from collections.abc import AsyncIterator
+from datetime import datetime
+
+import orjson
+from fastapi.responses import StreamingResponse
+from pymongo.asynchronous.collection import AsyncCollection
+
+from src.metrics import metrics
+
+from .telemetry import STATUS_RESPONSE_PROJECTION, device_range_filter
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("ndjson", "csv")
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+EXPORT_PROJECTION = {"device_id": "$meta.device_id", **STATUS_RESPONSE_PROJECTION}
+EXPORT_FIELDS = [key for key in EXPORT_PROJECTION if key != "_id"]
+
+# Documents per cursor batch and bytes per response chunk: memory stays
+# bounded by these whatever the exported range
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+async def export_rows(
+    collection: AsyncCollection,
+    device_ids: list[str],
+    user_id: str,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+) -> AsyncIterator[dict]:
+    """Heartbeats of `device_ids` in the range, device by device, oldest first.
+
+    Each device is read with its own server-side cursor along the
+    (device, created_at) index, so nothing is sorted in memory.
+    """
+    for device_id in device_ids:
+        cursor = (
+            collection.find(
+                device_range_filter(device_id, user_id, start_date, end_date),
+                EXPORT_PROJECTION,
+            )
+            .sort("created_at", 1)
+            .batch_size(EXPORT_BATCH_SIZE)
+        )
+        try:
+            async for row in cursor:
+                yield row
+        finally:
+            await cursor.close()
+
+
+def csv_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+async def encode_ndjson(rows: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    chunk = bytearray()
+    async for row in rows:
+        chunk += orjson.dumps(row, option=orjson.OPT_UTC_Z | orjson.OPT_APPEND_NEWLINE)
+        if len(chunk) >= EXPORT_CHUNK_SIZE:
+            yield bytes(chunk)
+            chunk.clear()
+    if chunk:
+        yield bytes(chunk)
+
+
+async def encode_csv(rows: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    async for row in rows:
+        writer.writerow([csv_value(row.get(field)) for field in EXPORT_FIELDS])
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+async def counted(rows: AsyncIterator[dict], name: str) -> AsyncIterator[dict]:
+    exported = 0
+    try:
+        async for row in rows:
+            exported += 1
+            yield row
+    except Exception as e:
+        # Headers are already sent: the connection is dropped mid-body so
+        # the client sees a failed download instead of a truncated file
+        logger.error(f"Error exporting {name}: {e}")
+        raise
+    finally:
+        metrics.incr("export.rows", exported)
+
+
+def export_response(
+    rows: AsyncIterator[dict], export_format: str, name: str, gzip: bool = False
+) -> StreamingResponse:
+    encode = encode_csv if export_format == "csv" else encode_ndjson
+    body = encode(counted(rows, name))
+    headers = {"Content-Disposition": f'attachment; filename="{name}.{export_format}"'}
+    if gzip:
+        body = gzip_chunks(body)
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(
+        body, media_type=EXPORT_MEDIA_TYPES[export_format], headers=headers
+    )
@@ -0,0 +1,37 @@
+import logging
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import OperationFailure
+
+from .rollups import ensure_rollup_indexes
+from .telemetry import ensure_telemetry_collection
+
+logger = logging.getLogger(__name__)
+
+DEVICES_COLLECTION = "devices"
+
+DEVICE_INDEXES = [
+    IndexModel([("user_id", ASCENDING), ("sn", ASCENDING)], name="user_sn", unique=True),
+    IndexModel([("user_id", ASCENDING), ("location", ASCENDING)], name="user_location"),
+    IndexModel(
+        [("user_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)],
+        name="user_created_at",
+    ),
+    IndexModel([("id", ASCENDING)], name="device_id", unique=True),
+]
+
+
+async def ensure_indexes(db: AsyncDatabase) -> None:
+    """Create the device, telemetry and rollup indexes on startup.
+
+    A no-op for the ones that already exist.
+    """
+    try:
+        await db.get_collection(DEVICES_COLLECTION).create_indexes(DEVICE_INDEXES)
+    except OperationFailure as e:
+        # e.g. duplicated serial numbers left over from before the unique index
+        logger.error(f"Unable to create device indexes: {e}")
+
+    await ensure_telemetry_collection(db)
+    await ensure_rollup_indexes(db)
@@ -0,0 +1,327 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+
+from pymongo import UpdateOne
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import BulkWriteError, WriteError
+
+from config.env_vars import get_ingest_options
+from src.metrics import metrics
+from src.notifications.alerts import evaluate_heartbeats
+from src.websocket.telemetry import publish_telemetry
+
+from .cache import get_devices
+from .indexes import DEVICES_COLLECTION
+from .rollups import ROLLUPS_COLLECTION, rollup_updates
+from .telemetry import (
+    TELEMETRY_COLLECTION,
+    latest_status_update,
+    telemetry_event,
+    to_telemetry_document,
+)
+
+logger = logging.getLogger(__name__)
+
+
+_STOP = object()
+
+# Stored batches whose follow-up work has not run yet; a full queue holds the
+# next flush back
+FOLLOW_UP_QUEUE_SIZE = 100
+
+
+class IngestQueueFull(Exception):
+    pass
+
+
+@dataclass(slots=True)
+class StoredHeartbeats:
+    """Outcome of `store_heartbeats`.
+
+    `owners` maps every known device to its owner, `documents` are the
+    telemetry documents that were written and `failed` maps the positions of
+    heartbeats whose insert was rejected to the server's write error.
+    """
+
+    owners: dict[str, str]
+    documents: list[dict]
+    failed: dict[int, WriteError]
+
+
+async def store_heartbeats(
+    db: AsyncDatabase, heartbeats: list[tuple[str, dict]]
+) -> StoredHeartbeats:
+    """Write a batch of (device_id, status) heartbeats to the telemetry store.
+
+    Owners come from the device cache (one `$in` query for misses) and the
+    heartbeats are written with one unordered `insert_many`; heartbeats for
+    unknown devices are dropped. A partial failure only fails the heartbeats
+    the server rejected: the time-series collection has no unique key, so a
+    client retrying ones that were stored would duplicate them.
+    """
+    if not heartbeats:
+        return StoredHeartbeats({}, [], {})
+
+    devices_collection = db.get_collection(DEVICES_COLLECTION)
+    device_ids = list({device_id for device_id, _ in heartbeats})
+    devices = await get_devices(devices_collection, device_ids)
+    owners = {device_id: device["user_id"] for device_id, device in devices.items()}
+
+    documents = []
+    positions = []
+    for position, (device_id, status) in enumerate(heartbeats):
+        user_id = owners.get(device_id)
+        if user_id is None:
+            continue
+
+        documents.append(to_telemetry_document(device_id, user_id, status))
+        positions.append(position)
+
+    metrics.incr("ingest.rejected_heartbeats", len(heartbeats) - len(documents))
+    if not documents:
+        return StoredHeartbeats(owners, [], {})
+
+    failed = {}
+    try:
+        await db.get_collection(TELEMETRY_COLLECTION).insert_many(
+            documents, ordered=False
+        )
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+        if not write_errors:
+            raise
+
+        failed = {
+            positions[error["index"]]: WriteError(error["errmsg"], error["code"], error)
+            for error in write_errors
+        }
+        logger.error(
+            f"Error storing {len(failed)} of {len(documents)} heartbeats: "
+            f"{write_errors[0]['errmsg']}"
+        )
+        rejected = {error["index"] for error in write_errors}
+        documents = [
+            document
+            for index, document in enumerate(documents)
+            if index not in rejected
+        ]
+
+    metrics.incr("ingest.heartbeats", len(documents))
+    return StoredHeartbeats(owners, documents, failed)
+
+
+async def process_heartbeats(db: AsyncDatabase, documents: list[dict]) -> None:
+    """Follow-up work for stored telemetry documents.
+
+    Refreshes the per-device snapshots and the rollups with one unordered
+    `bulk_write` each, publishes live telemetry and evaluates alerts. Each step
+    logs its own failure so one does not skip the others.
+    """
+    if not documents:
+        return
+
+    newest: dict[str, dict] = {}
+    for document in documents:
+        device_id = document["meta"]["device_id"]
+        current = newest.get(device_id)
+        if current is None or document["created_at"] > current["created_at"]:
+            newest[device_id] = document
+
+    try:
+        await db.get_collection(DEVICES_COLLECTION).bulk_write(
+            [
+                UpdateOne({"id": device_id}, latest_status_update(status))
+                for device_id, status in newest.items()
+            ],
+            ordered=False,
+        )
+    except Exception as e:
+        logger.error(f"Error updating device snapshots: {e}")
+
+    try:
+        with metrics.timer("ingest.rollups"):
+            await db.get_collection(ROLLUPS_COLLECTION).bulk_write(
+                rollup_updates(documents), ordered=False
+            )
+    except Exception as e:
+        logger.error(f"Error updating device rollups: {e}")
+
+    try:
+        await publish_telemetry([telemetry_event(document) for document in documents])
+    except Exception as e:
+        logger.error(f"Error publishing live telemetry: {e}")
+
+    try:
+        await evaluate_heartbeats(
+            db,
+            [
+                (document["meta"]["device_id"], document["meta"]["user_id"], document)
+                for document in documents
+            ],
+        )
+    except Exception as e:
+        logger.error(f"Error evaluating heartbeat alerts: {e}")
+
+
+async def ingest_heartbeats(
+    db: AsyncDatabase, heartbeats: list[tuple[str, dict]]
+) -> StoredHeartbeats:
+    """`store_heartbeats` followed by their `process_heartbeats`, in line."""
+    stored = await store_heartbeats(db, heartbeats)
+    await process_heartbeats(db, stored.documents)
+    return stored
+
+
+class HeartbeatBatcher:
+    """Coalesces concurrent single-heartbeat requests into batched writes.
+
+    Requests enqueue their heartbeat and wait for the batch that contains it
+    to be flushed, which happens once `max_batch_size` heartbeats are queued or
+    `max_delay` seconds after the first one arrived. A full queue raises
+    `IngestQueueFull` instead of buffering without bound.
+
+    Requests are answered as soon as the insert is acknowledged; snapshots,
+    rollups, live telemetry and alerts for the batch run in a second task
+    while the next batch is collected.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = 500,
+        max_delay: float = 0.02,
+        max_queue_size: int = 10000,
+    ):
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.max_queue_size = max_queue_size
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._follow_ups: asyncio.Queue | None = None
+        self._follow_up_task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._follow_ups = asyncio.Queue(maxsize=FOLLOW_UP_QUEUE_SIZE)
+        self._task = asyncio.create_task(self._run())
+        self._follow_up_task = asyncio.create_task(self._run_follow_ups())
+        metrics.register_gauge("ingest.queue_depth", self._queue.qsize)
+
+    async def stop(self) -> None:
+        """Flush and process everything already accepted, then stop."""
+        if self._task is None:
+            return
+
+        await self._queue.put(_STOP)
+        await self._task
+        await self._follow_ups.put(_STOP)
+        await self._follow_up_task
+        metrics.unregister_gauge("ingest.queue_depth")
+        self._task = None
+        self._follow_up_task = None
+
+    async def join(self) -> None:
+        """Wait for the follow-up work of every batch flushed so far."""
+        if self._follow_ups is not None:
+            await self._follow_ups.join()
+
+    async def submit(self, db: AsyncDatabase, device_id: str, status: dict) -> str | None:
+        """Queue one heartbeat and return the device owner once it is stored."""
+        if not self.running:
+            stored = await ingest_heartbeats(db, [(device_id, status)])
+            if 0 in stored.failed:
+                raise stored.failed[0]
+            return stored.owners.get(device_id)
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((db, device_id, status, future))
+        except asyncio.QueueFull:
+            metrics.incr("ingest.queue_full")
+            raise IngestQueueFull()
+
+        return await future
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+
+            items = [item]
+            deadline = asyncio.get_running_loop().time() + self.max_delay
+            while len(items) < self.max_batch_size:
+                try:
+                    if self._queue.empty():
+                        async with asyncio.timeout_at(deadline):
+                            item = await self._queue.get()
+                    else:
+                        item = self._queue.get_nowait()
+                except TimeoutError:
+                    break
+
+                if item is _STOP:
+                    stopping = True
+                    break
+                items.append(item)
+
+            await self._flush(items)
+
+    async def _flush(self, items: list) -> None:
+        if not items:
+            return
+
+        # Requests can target different databases (e.g. test overrides)
+        batches: dict[str, tuple[AsyncDatabase, list]] = {}
+        for item in items:
+            db = item[0]
+            batches.setdefault(db.name, (db, []))[1].append(item)
+
+        for db, batch in batches.values():
+            with metrics.timer("ingest.flush"):
+                try:
+                    stored = await store_heartbeats(
+                        db, [(device_id, status) for _, device_id, status, _ in batch]
+                    )
+                except Exception as e:
+                    logger.error(f"Error flushing heartbeat batch: {e}")
+                    for *_, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+
+            metrics.incr("ingest.batches")
+            metrics.incr("ingest.batched_heartbeats", len(batch))
+            for position, (_, device_id, _, future) in enumerate(batch):
+                if future.done():
+                    continue
+                if position in stored.failed:
+                    future.set_exception(stored.failed[position])
+                else:
+                    future.set_result(stored.owners.get(device_id))
+
+            if stored.documents:
+                await self._follow_ups.put((db, stored.documents))
+
+    async def _run_follow_ups(self) -> None:
+        while True:
+            item = await self._follow_ups.get()
+            try:
+                if item is _STOP:
+                    return
+
+                db, documents = item
+                with metrics.timer("ingest.follow_up"):
+                    await process_heartbeats(db, documents)
+            except Exception as e:
+                logger.error(f"Error processing stored heartbeats: {e}")
+            finally:
+                self._follow_ups.task_done()
+
+
+batcher = HeartbeatBatcher(**get_ingest_options())
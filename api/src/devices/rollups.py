@@ -0,0 +1,185 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, IndexModel, UpdateOne
+from pymongo.asynchronous.database import AsyncDatabase
+
+from config.env_vars import get_retention_options
+
+from .telemetry import EPOCH
+
+ROLLUPS_COLLECTION = "device_rollups"
+
+# Finest first
+RESOLUTIONS = {
+    "1m": timedelta(minutes=1),
+    "5m": timedelta(minutes=5),
+    "1h": timedelta(hours=1),
+}
+
+ROLLUP_METRICS = ("cpu_usage", "ram_usage", "free_disk", "temperature", "latency")
+
+ROLLUP_INDEXES = [
+    IndexModel(
+        [("device_id", ASCENDING), ("resolution", ASCENDING), ("start", ASCENDING)],
+        name="device_resolution_start",
+        unique=True,
+    ),
+    # Buckets carry their own expiry so each resolution has its own retention
+    IndexModel([("expires_at", ASCENDING)], name="expires_at", expireAfterSeconds=0),
+]
+
+# Percentiles come from log-scaled histogram bins: any value is reported
+# within 1% of the true one, whatever the metric's unit or range.
+PERCENTILE_ACCURACY = 0.01
+GAMMA = (1 + PERCENTILE_ACCURACY) / (1 - PERCENTILE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+ZERO_BIN = "z"
+MIN_BIN_VALUE = 1e-9
+
+
+async def ensure_rollup_indexes(db: AsyncDatabase) -> None:
+    await db.get_collection(ROLLUPS_COLLECTION).create_indexes(ROLLUP_INDEXES)
+
+
+def bucket_start(created_at: datetime, step: timedelta) -> datetime:
+    return EPOCH + (created_at - EPOCH) // step * step
+
+
+def histogram_bin(value: float) -> str:
+    if abs(value) < MIN_BIN_VALUE:
+        return ZERO_BIN
+
+    index = math.ceil(math.log(abs(value)) / LOG_GAMMA)
+    return f"p{index}" if value > 0 else f"n{index}"
+
+
+def bin_value(key: str) -> float:
+    if key == ZERO_BIN:
+        return 0.0
+
+    value = 2 * GAMMA ** int(key[1:]) / (GAMMA + 1)
+    return value if key[0] == "p" else -value
+
+
+def percentile(
+    histogram: dict[str, int], q: float, minimum: float, maximum: float
+) -> float:
+    bins = sorted((bin_value(key), count) for key, count in histogram.items())
+    rank = math.ceil(q * sum(count for _, count in bins))
+
+    seen = 0
+    for value, count in bins:
+        seen += count
+        if seen >= rank:
+            return min(max(value, minimum), maximum)
+    return maximum
+
+
+def rollup_updates(documents: list[dict]) -> list[UpdateOne]:
+    """Upserts folding telemetry documents into every rollup resolution.
+
+    Heartbeats of the same device and bucket are merged first, so a batch
+    costs one update per (device, resolution, bucket) however many readings
+    it holds. Counters and sums use `$inc` and extremes `$min` / `$max`, so
+    concurrent batches for the same bucket never overwrite each other. New
+    buckets get an `expires_at` from their resolution's retention period.
+    """
+    retention = {
+        resolution: timedelta(days=days) if days else None
+        for resolution, days in get_retention_options()["rollup_days"].items()
+    }
+
+    buckets: dict[tuple, dict] = {}
+    for document in documents:
+        meta = document["meta"]
+        readings = [
+            (metric, value, histogram_bin(value))
+            for metric in ROLLUP_METRICS
+            if (value := document.get(metric)) is not None
+        ]
+        online = 1 if document.get("connectivity") else 0
+
+        for resolution, step in RESOLUTIONS.items():
+            key = (
+                meta["device_id"],
+                resolution,
+                bucket_start(document["created_at"], step),
+            )
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = {
+                    "user_id": meta["user_id"],
+                    "inc": defaultdict(int),
+                    "min": {},
+                    "max": {},
+                }
+
+            inc, minimums, maximums = bucket["inc"], bucket["min"], bucket["max"]
+            inc["count"] += 1
+            inc["online"] += online
+            for metric, value, bin_key in readings:
+                prefix = f"metrics.{metric}"
+                inc[f"{prefix}.count"] += 1
+                inc[f"{prefix}.sum"] += value
+                inc[f"{prefix}.hist.{bin_key}"] += 1
+                minimums[f"{prefix}.min"] = min(
+                    value, minimums.get(f"{prefix}.min", value)
+                )
+                maximums[f"{prefix}.max"] = max(
+                    value, maximums.get(f"{prefix}.max", value)
+                )
+
+    updates = []
+    for (device_id, resolution, start), bucket in buckets.items():
+        on_insert = {"user_id": bucket["user_id"]}
+        if retention[resolution] is not None:
+            on_insert["expires_at"] = (
+                start + RESOLUTIONS[resolution] + retention[resolution]
+            )
+
+        update = {"$inc": dict(bucket["inc"]), "$setOnInsert": on_insert}
+        if bucket["min"]:
+            update["$min"] = bucket["min"]
+            update["$max"] = bucket["max"]
+
+        updates.append(
+            UpdateOne(
+                {"device_id": device_id, "resolution": resolution, "start": start},
+                update,
+                upsert=True,
+            )
+        )
+    return updates
+
+
+def pick_resolution(start: datetime, end: datetime, max_points: int) -> str:
+    """Finest resolution whose buckets over the range fit in `max_points`.
+
+    Falls back to the coarsest one when even that exceeds the budget.
+    """
+    for resolution, step in RESOLUTIONS.items():
+        if (end - start) / step <= max_points:
+            return resolution
+    return resolution
+
+
+def summarize(rollup: dict) -> dict:
+    """API shape of one rollup bucket: count, uptime and per-metric stats."""
+    metrics = {}
+    for metric, stats in rollup.get("metrics", {}).items():
+        metrics[metric] = {
+            "count": stats["count"],
+            "min": stats["min"],
+            "max": stats["max"],
+            "avg": stats["sum"] / stats["count"],
+            "p95": percentile(stats["hist"], 0.95, stats["min"], stats["max"]),
+        }
+
+    return {
+        "start": rollup["start"],
+        "count": rollup["count"],
+        "uptime": rollup["online"] / rollup["count"],
+        "metrics": metrics,
+    }
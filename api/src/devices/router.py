@@ -1,64 +1,246 @@
+import asyncio
 import logging
-from datetime import datetime, timezone
-from typing import Optional
-
-from fastapi import APIRouter, HTTPException, Request, status
-from pymongo.errors import ServerSelectionTimeoutError
-
-from src.websocket.stream import publish_to_stream, acknowledge_message
+from datetime import datetime, timedelta, timezone
+from typing import Literal, Optional
+
+import numpy as np
+from bson import ObjectId
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.errors import DuplicateKeyError, ServerSelectionTimeoutError
+
+from src.conditional import (
+    etag_matches,
+    has_validator,
+    make_etag,
+    not_modified,
+    set_validators,
+)
+from src.schemas import DatabaseDep
+from src.serialization import fast_json_response, fast_json_responses
+from src.websocket.stream import STREAM_ID_PATTERN, acknowledge_messages
 
+from .cache import get_owned_device, invalidate_device
 from .dependencies import (
+    BulkHeartbeatsDep,
     DevicesCollectionDep,
     DevicesQueryParamsDep,
+    RollupsCollectionDep,
+    TelemetryCollectionDep,
+)
+from .downsampling import DOWNSAMPLING_METHODS, downsample
+from .export import EXPORT_FORMATS, export_response, export_rows
+from .ingest import IngestQueueFull, batcher, ingest_heartbeats
+from .rollups import (
+    RESOLUTIONS,
+    ROLLUP_METRICS,
+    bucket_start,
+    pick_resolution,
+    summarize,
 )
 from .schemas import (
+    BulkIngestResult,
     DeviceCreated,
     DeviceForm,
     DeviceDetails,
+    DeviceMetrics,
     DeviceSummary,
     DeviceStatus,
     DeviceStatusInput,
     DeviceUpdate,
+    NotificationAck,
+    NotificationAckResult,
+)
+from .telemetry import (
+    EPOCH,
+    STATUS_PROJECTION,
+    STATUS_RESPONSE_PROJECTION,
+    decode_cursor,
+    device_range_filter,
+    encode_cursor,
+    online_expression,
 )
 
 router = APIRouter(prefix="/devices", tags=["devices"])
 logger = logging.getLogger(__name__)
 
+DEFAULT_METRICS_RANGE = timedelta(hours=24)
+MAX_METRICS_POINTS = 5000
+MAX_STATUS_POINTS = 5000
+SERIES_CHUNK_SIZE = 10000
+
+DEVICE_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "name": 1,
+    "location": 1,
+    "sn": 1,
+    "description": 1,
+    "created_at": 1,
+    "updated_at": 1,
+}
+
+
+def encode_device_cursor(device: dict) -> str:
+    return f"{device['created_at']}|{device['id']}"
+
+
+def decode_device_cursor(cursor: str) -> dict:
+    """Keyset filter for devices after the cursor in (created_at, id) order."""
+    created_at, separator, device_id = cursor.rpartition("|")
+    if not separator or not created_at or not device_id:
+        raise ValueError("Invalid cursor")
+
+    return {
+        "$or": [
+            {"created_at": {"$gt": created_at}},
+            {"created_at": created_at, "id": {"$gt": device_id}},
+        ]
+    }
+
+
+def device_page_pipeline(page_query: dict, skip: int, limit: int) -> list[dict]:
+    # Filter first so the user_id compound indexes drive the scan, then page
+    return [
+        {"$match": page_query},
+        {"$sort": {"created_at": 1, "id": 1}},
+        {"$skip": skip},
+        {"$limit": limit},
+    ]
+
+
+def epoch_millis(value: datetime | None) -> int:
+    return (value - EPOCH) // timedelta(milliseconds=1) if value else 0
+
+
+def device_page_version_stage() -> dict:
+    """`$group` reducing a page of devices to its version, see below."""
+    return {
+        "$group": {
+            "_id": None,
+            "count": {"$sum": 1},
+            "first": {"$first": "$id"},
+            "last": {"$last": "$id"},
+            "updated_at": {"$max": "$updated_at"},
+            "last_seen_at": {"$max": "$last_seen_at"},
+            "seen": {"$sum": {"$toLong": {"$ifNull": ["$last_seen_at", EPOCH]}}},
+            "online": {"$sum": {"$cond": [online_expression(), 1, 0]}},
+        }
+    }
+
+
+def device_page_version(devices: list[dict]) -> dict | None:
+    """Version of a page of devices, as `device_page_version_stage` computes it.
+
+    A heartbeat only replaces a device's status when it moves `last_seen_at`
+    forward (changing `seen`), edits bump `updated_at`, devices going offline
+    with time change `online` and the first/last ids catch the page shifting.
+    """
+    if not devices:
+        return None
+
+    return {
+        "count": len(devices),
+        "first": devices[0]["id"],
+        "last": devices[-1]["id"],
+        "updated_at": max(
+            filter(None, (device.get("updated_at") for device in devices)),
+            default=None,
+        ),
+        "last_seen_at": max(
+            filter(None, (device.get("last_seen_at") for device in devices)),
+            default=None,
+        ),
+        "seen": sum(epoch_millis(device.get("last_seen_at")) for device in devices),
+        "online": sum(1 for device in devices if device.get("online")),
+    }
+
+
+def device_page_etag(
+    user_id: str, request: Request, total: int | None, version: dict | None
+) -> str:
+    version = version or {}
+    return make_etag(
+        user_id,
+        request.url.query,
+        total,
+        *(
+            version.get(field)
+            for field in ("count", "first", "last", "updated_at", "seen", "online")
+        ),
+    )
+
+
+def device_etag(user_id: str, request: Request, metadata: dict, liveness: dict) -> str:
+    # Heartbeats arriving out of order don't move `last_seen_at`, so one
+    # landing inside the requested page only shows up with the next newer one
+    return make_etag(
+        user_id,
+        request.url.query,
+        metadata.get("updated_at"),
+        liveness.get("last_seen_at"),
+        liveness.get("online"),
+    )
+
 
 @router.get("/", response_model=Optional[list[DeviceSummary]])
 async def get_devices(
-    request: Request, commons: DevicesQueryParamsDep, collection: DevicesCollectionDep
+    request: Request,
+    response: Response,
+    commons: DevicesQueryParamsDep,
+    collection: DevicesCollectionDep,
 ):
     user_id = request.state.user_id
+    query = {"user_id": user_id, **commons["q"]}
 
+    try:
+        page_query = (
+            {**query, **decode_device_cursor(commons["cursor"])}
+            if commons["cursor"]
+            else query
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+
+    page = device_page_pipeline(
+        page_query, 0 if commons["cursor"] else commons["skip"], commons["limit"]
+    )
     pipeline = [
-        {"$skip": commons["skip"]},
-        {"$limit": commons["limit"]},
-        {
-            "$match": {
-                "user_id": user_id,
-            },
-        },
+        *page,
         {
+            # Exactly the `DeviceSummary` fields, so the fast path can
+            # serialize the documents as they are
             "$project": {
-                "_id": 0,
-                "id": 1,
-                "name": 1,
-                "location": 1,
-                "sn": 1,
-                "description": 1,
-                "created_at": 1,
-                "updated_at": 1,
-                "status": {
-                    "$arrayElemAt": ["$status", 0],
-                },
+                **DEVICE_PROJECTION,
+                "status": {"$ifNull": ["$last_status", None]},
+                "last_seen_at": {"$ifNull": ["$last_seen_at", None]},
+                "online": online_expression(),
             }
         },
     ]
+    total = None
     try:
-        return collection.aggregate(
+        if commons["include_total"]:
+            total = await collection.count_documents(query)
+
+        if has_validator(request):
+            # Only the page's version is computed and compared, the devices
+            # are neither projected nor serialized when it did not change
+            cursor = await collection.aggregate([*page, device_page_version_stage()])
+            versions = await cursor.to_list()
+            version = versions[0] if versions else None
+            etag = device_page_etag(user_id, request, total, version)
+            if etag_matches(request, etag):
+                return not_modified(
+                    etag,
+                    version and version["updated_at"],
+                    version and version["last_seen_at"],
+                )
+
+        cursor = await collection.aggregate(
             pipeline,
-        ).to_list()
+        )
+        devices = await cursor.to_list()
     except ServerSelectionTimeoutError as db_err:
         logger.error(f"Database connection error: {db_err}")
         raise HTTPException(status_code=503, detail="Database connection error")
@@ -66,179 +248,412 @@ async def get_devices(
         logger.error(f"Error retrieving devices: {e}")
         raise HTTPException(status_code=500, detail="Unable to retrieve devices")
 
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
+    if commons["limit"] and len(devices) == commons["limit"]:
+        response.headers["X-Next-Cursor"] = encode_device_cursor(devices[-1])
+
+    version = device_page_version(devices)
+    set_validators(
+        response,
+        device_page_etag(user_id, request, total, version),
+        version and version["updated_at"],
+        version and version["last_seen_at"],
+    )
+    if fast_json_responses:
+        return fast_json_response(devices, response)
+    return devices
+
+
+# Declared before /{device_id}, which would otherwise match "export"
+@router.get("/export")
+async def export_telemetry(
+    request: Request,
+    commons: DevicesQueryParamsDep,
+    collection: DevicesCollectionDep,
+    telemetry_collection: TelemetryCollectionDep,
+    format: Literal[EXPORT_FORMATS] = "ndjson",
+    gzip: bool = False,
+):
+    """Stream the heartbeats of every device matching the filters.
+
+    Devices are exported one after the other, each oldest first, between
+    `start_date` and `end_date`, as NDJSON or CSV, optionally gzip-encoded.
+    """
+    user_id = request.state.user_id
+
+    try:
+        device_ids = [
+            device["id"]
+            async for device in collection.find(
+                {"user_id": user_id, **commons["q"]}, {"_id": 0, "id": 1}
+            ).sort([("created_at", 1), ("id", 1)])
+        ]
+    except Exception as e:
+        logger.error(f"Error retrieving devices to export: {e}")
+        raise HTTPException(500, "Failed to export telemetry") from e
+
+    rows = export_rows(
+        telemetry_collection,
+        device_ids,
+        user_id,
+        commons["start_date"],
+        commons["end_date"],
+    )
+    return export_response(rows, format, "telemetry", gzip)
+
 
 @router.get("/{device_id}", response_model=DeviceDetails)
 async def get_device(
     commons: DevicesQueryParamsDep,
     request: Request,
+    response: Response,
     device_id: str,
     collection: DevicesCollectionDep,
+    telemetry_collection: TelemetryCollectionDep,
 ):
     user_id = request.state.user_id
-    pipeline = [
-        {
-            "$match": {"id": device_id, "user_id": user_id},
-        },
-        {
-            "$project": {
-                "_id": 0,
-                "id": 1,
-                "name": 1,
-                "location": 1,
-                "sn": 1,
-                "description": 1,
-                "created_at": 1,
-                "updated_at": 1,
-                "status": {
-                    "$slice": [
-                        {
-                            "$sortArray": {
-                                "input": "$status",
-                                "sortBy": {"created_at": -1},
-                            }
-                        },
-                        commons["skip"],
-                        commons["limit"],
-                    ],
-                },
-            }
-        },
-    ]
+
+    def find_liveness():
+        return collection.find_one(
+            {"id": device_id},
+            {"_id": 0, "last_seen_at": 1, "online": online_expression()},
+        )
+
+    def find_statuses():
+        return (
+            telemetry_collection.find(
+                device_range_filter(device_id, user_id), STATUS_PROJECTION
+            )
+            .sort("created_at", -1)
+            .skip(commons["skip"])
+            .limit(commons["limit"])
+            .to_list()
+        )
 
     try:
-        device = collection.aggregate(pipeline).to_list()
+        # Ownership and metadata come from the device cache; only the live
+        # fields are read, concurrently with the heartbeats unless the
+        # client's version may still be current
+        metadata = await get_owned_device(collection, device_id, user_id)
+        if not metadata:
+            raise HTTPException(404, "Device not found")
+
+        if has_validator(request):
+            liveness = await find_liveness()
+            if liveness is not None:
+                etag = device_etag(user_id, request, metadata, liveness)
+                if etag_matches(request, etag):
+                    return not_modified(
+                        etag, metadata.get("updated_at"), liveness.get("last_seen_at")
+                    )
+            statuses = await find_statuses()
+        else:
+            liveness, statuses = await asyncio.gather(find_liveness(), find_statuses())
+
+        if liveness is None:
+            # Deleted since it was cached
+            raise HTTPException(404, "Device not found")
+
+        device = {**metadata, **liveness, "status": statuses}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error retrieving device: {e}")
         raise HTTPException(500, "Failed to get device") from e
 
-    return device[0]
+    set_validators(
+        response,
+        device_etag(user_id, request, metadata, liveness),
+        metadata.get("updated_at"),
+        liveness.get("last_seen_at"),
+    )
+    return device
+
+
+async def load_series(
+    collection: AsyncCollection, query: dict, metric: str
+) -> tuple[np.ndarray, np.ndarray, list[ObjectId]]:
+    """(epoch milliseconds, metric value) arrays of the matching heartbeats,
+    plus their `_id`s in the same order.
+
+    Only those fields leave the server and rows are packed into arrays
+    every `SERIES_CHUNK_SIZE`, so long histories never sit in memory as
+    documents.
+    """
+    cursor = await collection.aggregate(
+        [
+            {"$match": query},
+            {"$sort": {"created_at": 1}},
+            {
+                "$project": {
+                    "t": {"$toLong": "$created_at"},
+                    "v": f"${metric}",
+                }
+            },
+        ],
+        batchSize=SERIES_CHUNK_SIZE,
+    )
+
+    x_chunks, y_chunks, ids = [], [], []
+    timestamps, values = [], []
+    async for point in cursor:
+        ids.append(point["_id"])
+        timestamps.append(point["t"])
+        values.append(point.get("v"))
+        if len(timestamps) == SERIES_CHUNK_SIZE:
+            x_chunks.append(np.array(timestamps, dtype=np.int64))
+            y_chunks.append(np.array(values, dtype=np.float64))
+            timestamps, values = [], []
+
+    x_chunks.append(np.array(timestamps, dtype=np.int64))
+    y_chunks.append(np.array(values, dtype=np.float64))
+    return np.concatenate(x_chunks), np.concatenate(y_chunks), ids
+
+
+async def downsampled_statuses(
+    collection: AsyncCollection,
+    query: dict,
+    metric: str,
+    max_points: int,
+    method: str,
+) -> list[dict]:
+    timestamps, values, ids = await load_series(collection, query, metric)
+    selected = downsample(timestamps.astype(np.float64), values, max_points, method)
+
+    # By _id: heartbeats can share a created_at, and matching on it would
+    # return all of them
+    picked = [ids[index] for index in selected.tolist()]
+    return await (
+        collection.find({**query, "_id": {"$in": picked}}, STATUS_RESPONSE_PROJECTION)
+        .sort([("created_at", -1), ("_id", -1)])
+        .to_list()
+    )
 
 
 @router.get("/{device_id}/status", response_model=list[DeviceStatus])
 async def get_device_status(
     device_id: str,
     request: Request,
-    devices_collection: DevicesCollectionDep,
+    response: Response,
+    telemetry_collection: TelemetryCollectionDep,
     commons: DevicesQueryParamsDep,
+    max_points: Optional[int] = Query(None, ge=2, le=MAX_STATUS_POINTS),
+    metric: Literal[ROLLUP_METRICS] = "cpu_usage",
+    downsampling: Literal[DOWNSAMPLING_METHODS] = "lttb",
 ):
-    user_id = request.state.user_id
+    """Heartbeats of a device, newest first.
 
-    filter_conditions = []
+    With `max_points` the whole range is downsampled instead of paged: at most
+    that many heartbeats are returned, picked by `downsampling` so the chart of
+    `metric` keeps its shape (`lttb`) or every spike (`minmax`).
+    """
+    user_id = request.state.user_id
 
-    if commons["start_date"]:
-        start_date = datetime.fromisoformat(commons["start_date"]).replace(
-            tzinfo=timezone.utc
-        )
-        filter_conditions.append(
-            {
-                "$gte": [
-                    {"$toDate": "$$item.created_at"},  # Convert to Date for comparison
-                    start_date,
-                ]
-            }
+    if max_points:
+        query = device_range_filter(
+            device_id, user_id, commons["start_date"], commons["end_date"]
         )
+        try:
+            statuses = await downsampled_statuses(
+                telemetry_collection, query, metric, max_points, downsampling
+            )
+        except Exception as e:
+            logger.error(f"Error downsampling device status: {e}")
+            raise HTTPException(500, "Failed to get device status") from e
+
+        if fast_json_responses:
+            return fast_json_response(statuses, response)
+        return statuses
+
+    query = device_range_filter(
+        device_id, user_id, commons["start_date"], commons["end_date"]
+    )
+    try:
+        if commons["cursor"]:
+            query.update(decode_cursor(commons["cursor"]))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+
+    # With a cursor the keyset itself starts the page, so $skip is not needed
+    cursor = telemetry_collection.find(
+        query, {**STATUS_RESPONSE_PROJECTION, "_id": 1}
+    ).sort([("created_at", -1), ("_id", -1)])
+    if not commons["cursor"]:
+        cursor = cursor.skip(commons["skip"])
+
+    try:
+        statuses = await cursor.limit(commons["limit"]).to_list()
+    except Exception as e:
+        logger.error(f"Error retrieving device status: {e}")
+        raise HTTPException(500, "Failed to get device status") from e
+
+    if commons["limit"] and len(statuses) == commons["limit"]:
+        response.headers["X-Next-Cursor"] = encode_cursor(statuses[-1])
+    # Only needed for the cursor
+    for heartbeat in statuses:
+        del heartbeat["_id"]
+
+    if fast_json_responses:
+        return fast_json_response(statuses, response)
+    return statuses
 
-    if commons["end_date"]:
-        end_date = datetime.fromisoformat(commons["end_date"]).replace(
-            tzinfo=timezone.utc
-        )
-        filter_conditions.append(
-            {
-                "$lte": [
-                    {"$toDate": "$$item.created_at"},  # Convert to Date for comparison
-                    end_date,
-                ]
-            }
-        )
 
-    if filter_conditions:
-        filter_cond = (
-            {"$and": filter_conditions}
-            if len(filter_conditions) > 1
-            else filter_conditions[0]
+@router.get("/{device_id}/export")
+async def export_device_telemetry(
+    device_id: str,
+    request: Request,
+    commons: DevicesQueryParamsDep,
+    collection: DevicesCollectionDep,
+    telemetry_collection: TelemetryCollectionDep,
+    format: Literal[EXPORT_FORMATS] = "ndjson",
+    gzip: bool = False,
+):
+    """Stream a device's heartbeats between `start_date` and `end_date`.
+
+    Unlike paging `/status`, the whole range is read with one server-side
+    cursor, oldest first, as NDJSON or CSV, optionally gzip-encoded.
+    """
+    user_id = request.state.user_id
+
+    if not await get_owned_device(collection, device_id, user_id):
+        raise HTTPException(404, "Device not found")
+
+    rows = export_rows(
+        telemetry_collection,
+        [device_id],
+        user_id,
+        commons["start_date"],
+        commons["end_date"],
+    )
+    return export_response(rows, format, f"telemetry-{device_id}", gzip)
+
+
+@router.get("/{device_id}/metrics", response_model=DeviceMetrics)
+async def get_device_metrics(
+    device_id: str,
+    request: Request,
+    rollups_collection: RollupsCollectionDep,
+    commons: DevicesQueryParamsDep,
+    resolution: Optional[Literal["1m", "5m", "1h"]] = None,
+    max_points: int = Query(500, ge=1, le=MAX_METRICS_POINTS),
+):
+    """Per-bucket metric stats and uptime from the pre-aggregated rollups.
+
+    Covers the last 24 hours unless `start_date` / `end_date` say otherwise.
+    Without an explicit `resolution` the finest one that fits the range in
+    `max_points` buckets is used.
+    """
+    user_id = request.state.user_id
+    end_date = commons["end_date"] or datetime.now(timezone.utc)
+    start_date = commons["start_date"] or end_date - DEFAULT_METRICS_RANGE
+    if start_date > end_date:
+        raise HTTPException(
+            status_code=400, detail="start_date must be before end_date"
         )
-    else:
-        filter_cond = True
 
-    print(f"{filter_cond}")
-    pipeline = [
-        {
-            "$match": {"id": device_id, "user_id": user_id},
-        },
-        {
-            "$addFields": {
-                "filtered_status": {
-                    "$filter": {
-                        "input": "$status",
-                        "as": "item",
-                        "cond": filter_cond,
-                    }
-                }
-            }
+    resolution = resolution or pick_resolution(start_date, end_date, max_points)
+    query = {
+        "device_id": device_id,
+        "user_id": user_id,
+        "resolution": resolution,
+        "start": {
+            "$gte": bucket_start(start_date, RESOLUTIONS[resolution]),
+            "$lte": end_date,
         },
-        {
-            "$project": {
-                "_id": 0,
-                "status": {
-                    "$slice": [
-                        {
-                            "$sortArray": {
-                                "input": "$filtered_status",
-                                "sortBy": {"created_at": -1},
-                            }
-                        },
-                        commons["skip"],
-                        commons["limit"],
-                    ],
-                },
-            }
-        },
-    ]
+    }
 
     try:
-        statuses = devices_collection.aggregate(pipeline)  # Revisar schema de saida
+        rollups = await (
+            rollups_collection.find(query, {"_id": 0})
+            .sort("start", 1)
+            .limit(max_points)
+            .to_list()
+        )
+    except Exception as e:
+        logger.error(f"Error retrieving device metrics: {e}")
+        raise HTTPException(500, "Failed to get device metrics") from e
 
-        if not statuses:
-            return []
+    return {
+        "device_id": device_id,
+        "resolution": resolution,
+        "points": [summarize(rollup) for rollup in rollups],
+    }
 
-        status_list = statuses.to_list()[0]["status"]
-        return status_list
 
+@router.post(
+    "/status/bulk",
+    status_code=status.HTTP_201_CREATED,
+    response_model=BulkIngestResult,
+)
+async def create_device_status_bulk(heartbeats: BulkHeartbeatsDep, db: DatabaseDep):
+    batch = [
+        (heartbeat.device_id, heartbeat.model_dump(exclude={"device_id"}))
+        for heartbeat in heartbeats
+    ]
+
+    try:
+        stored = await ingest_heartbeats(db, batch)
     except Exception as e:
-        logger.error(f"Error retrieving device status: {e}")
-        raise HTTPException(500, "Failed to get device status") from e
+        logger.error(f"Error ingesting heartbeat batch: {e}")
+        raise HTTPException(
+            status_code=500, detail="Unable to create device status"
+        ) from e
+
+    if stored.failed and not stored.documents:
+        raise HTTPException(status_code=500, detail="Unable to create device status")
+
+    owners = stored.owners
+    rejected = sorted({device_id for device_id, _ in batch if device_id not in owners})
+    return {
+        "accepted": len(stored.documents),
+        "rejected_devices": rejected,
+        "failed": sorted(stored.failed),
+    }
 
 
 @router.post("/{device_id}/status", status_code=status.HTTP_201_CREATED)
 async def create_device_status(
     device_id: str,
     device_status: DeviceStatusInput,
-    devices_collection: DevicesCollectionDep,
+    db: DatabaseDep,
 ):
     new_status = device_status.model_dump()
 
-    # await publish_to_stream(user_id, "new notification arrived") should subscribe to device id
-
     try:
-        devices_collection.update_one(
-            {"id": device_id},
-            {"$push": {"status": {"$each": [new_status], "$position": 0}}},
+        user_id = await batcher.submit(db, device_id, new_status)
+    except IngestQueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Ingestion queue is full",
+            headers={"Retry-After": "1"},
         )
-
     except Exception as e:
         logger.error(f"Error creating device status: {e}")
         raise HTTPException(
             status_code=500, detail="Unable to create device status"
         ) from e
 
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+
     return
 
 
-@router.post("/ack")
-async def ack_device_notification(request: Request, message_id: str):
+@router.post("/ack", response_model=NotificationAckResult)
+async def ack_device_notification(
+    request: Request,
+    message_id: Optional[str] = Query(None, pattern=STREAM_ID_PATTERN),
+    ack: Optional[NotificationAck] = None,
+):
+    """Acknowledge one notification (`message_id`) or many at once (`ids`)."""
     user_id = request.state.user_id
-    await acknowledge_message(user_id, message_id)
-    return
+    message_ids = ack.ids if ack else []
+    if message_id:
+        message_ids.append(message_id)
+
+    acknowledged = await acknowledge_messages(user_id, message_ids)
+    return {"acknowledged": acknowledged}
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=DeviceCreated)
@@ -246,36 +661,54 @@ async def create_device(
     device: DeviceForm, request: Request, collection: DevicesCollectionDep
 ):
     new_device = device.model_dump(mode="json")
-    user_id = request.state.user_id
-    sn_exists = collection.find_one({"user_id": user_id, "sn": new_device["sn"]})
-
-    if sn_exists:
-        raise HTTPException(
-            status_code=400, detail="Device with serial number already exists"
-        )
 
     try:
         new_device["user_id"] = request.state.user_id
-        new_device["status"] = []
+        new_device["last_status"] = None
+        new_device["last_seen_at"] = None
+        new_device["online"] = False
 
-        collection.insert_one(new_device)
+        await collection.insert_one(new_device)
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=400, detail="Device with serial number already exists"
+        )
     except Exception as e:
         logger.error(f"Error creating device: {e}")
         raise HTTPException(status_code=500, detail="Unable to create device") from e
 
+    # Drops a cached "does not exist" left by early heartbeats. Best-effort:
+    # the device exists either way and the entry expires with NEGATIVE_TTL.
+    await invalidate_device(new_device["id"])
     return new_device
 
 
 @router.delete("/{device_id}", status_code=status.HTTP_200_OK)
 async def delete_device(
-    device_id: str, collection: DevicesCollectionDep, request: Request
+    device_id: str,
+    collection: DevicesCollectionDep,
+    telemetry_collection: TelemetryCollectionDep,
+    rollups_collection: RollupsCollectionDep,
+    request: Request,
 ):
     user_id = request.state.user_id
+    result = None
     try:
-        collection.delete_one({"id": device_id, "user_id": user_id})
+        result = await collection.delete_one({"id": device_id, "user_id": user_id})
+        if result.deleted_count:
+            await telemetry_collection.delete_many(
+                device_range_filter(device_id, user_id)
+            )
+            await rollups_collection.delete_many(
+                {"device_id": device_id, "user_id": user_id}
+            )
     except Exception as e:
         logger.error(f"Error deleting device: {device_id}\n detail: {e}")
         raise HTTPException(status_code=400, detail="Unable to delete device") from e
+    finally:
+        # Also when only the cleanup failed: the device itself is gone
+        if result is not None and result.deleted_count:
+            await invalidate_device(device_id)
     return
 
 
@@ -288,13 +721,17 @@ async def update_device(
 ):
     user_id = request.state.user_id
     update_values = device.model_dump(exclude_unset=True)
+    # Defaults are excluded above, but every edit has to move the version
+    update_values.setdefault("updated_at", device.updated_at)
     print(f"{update_values}")
     filter = {"user_id": user_id, "id": device_id}
 
     try:
-        collection.update_one(filter, {"$set": update_values})
+        result = await collection.update_one(filter, {"$set": update_values})
     except Exception as e:
         logger.error(f"Error updating device: {device_id}\n detail: {e}")
         raise HTTPException(status_code=400, detail="Unable to update device") from e
 
+    if result.matched_count:
+        await invalidate_device(device_id)
     return
@@ -1,10 +1,14 @@
-from datetime import datetime
+from datetime import datetime, time, timezone
 from typing import Annotated, Optional
 from uuid import uuid4
 
 from fastapi import Form
 from pydantic import BaseModel, Field, field_validator
 
+from src.websocket.stream import STREAM_ID_PATTERN
+
+MAX_ACK_IDS = 10000
+
 
 class HearBeat(BaseModel):
     cpu_usage: Optional[float] = None
@@ -16,23 +20,71 @@ class HearBeat(BaseModel):
 
 class DeviceStatus(HearBeat):
     connectivity: bool
-    boot_date: str = Field()
-    created_at: str
+    boot_date: datetime = Field()
+    created_at: datetime
 
 
 class DeviceStatusInput(HearBeat):
     connectivity: bool
-    boot_date: str = Field()
-    created_at: str = Field(default_factory=lambda: datetime.now().isoformat())
+    boot_date: datetime = Field()
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
-    @field_validator("boot_date")
+    @field_validator("boot_date", mode="before")
     def validate_boot_date(cls, value):
         try:
-            date = datetime.fromisoformat(value).date().isoformat()
-            return date
+            date = datetime.fromisoformat(str(value)).date()
+            return datetime.combine(date, time.min, tzinfo=timezone.utc)
         except ValueError as e:
             raise ValueError("boot_date must be in ISO format (YYYY-MM-DD)") from e
 
+    @field_validator("created_at")
+    def validate_created_at(cls, value):
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value
+
+
+class DeviceHeartbeatInput(DeviceStatusInput):
+    device_id: str
+
+
+class BulkIngestResult(BaseModel):
+    accepted: int
+    rejected_devices: list[str] = []
+    # Positions of heartbeats that were not stored and can be retried
+    failed: list[int] = []
+
+
+class MetricSummary(BaseModel):
+    count: int
+    min: float
+    max: float
+    avg: float
+    p95: float
+
+
+class MetricsPoint(BaseModel):
+    start: datetime
+    count: int
+    uptime: float
+    metrics: dict[str, MetricSummary] = {}
+
+
+class DeviceMetrics(BaseModel):
+    device_id: str
+    resolution: str
+    points: list[MetricsPoint] = []
+
+
+class NotificationAck(BaseModel):
+    ids: list[Annotated[str, Field(pattern=STREAM_ID_PATTERN)]] = Field(
+        default_factory=list, max_length=MAX_ACK_IDS
+    )
+
+
+class NotificationAckResult(BaseModel):
+    acknowledged: int
+
 
 class Device(BaseModel):
     id: str = Field(default_factory=lambda: uuid4().hex)
@@ -40,7 +92,6 @@ class Device(BaseModel):
     location: str
     sn: str = Field(pattern="^\\d{12}$", min_length=12, max_length=12)
     description: str
-    status: list[DeviceStatus] = []
     created_at: str = Field(default_factory=lambda: datetime.now().isoformat())
     updated_at: str = Field(default_factory=lambda: datetime.now().isoformat())
 
@@ -54,6 +105,8 @@ class DeviceSummary(BaseModel):
     status: Optional[DeviceStatus] = None
     created_at: str
     updated_at: str
+    last_seen_at: Optional[datetime] = None
+    online: bool = False
 
 
 class DeviceDetails(BaseModel):
@@ -65,6 +118,8 @@ class DeviceDetails(BaseModel):
     status: list[DeviceStatus] = []
     created_at: str
     updated_at: str
+    last_seen_at: Optional[datetime] = None
+    online: bool = False
 
 
 class DeviceCreated(BaseModel):
@@ -0,0 +1,182 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+from config.env_vars import get_device_offline_after, get_retention_options
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_COLLECTION = "device_status"
+TIMESERIES_OPTIONS = {
+    "timeField": "created_at",
+    "metaField": "meta",
+    "granularity": "seconds",
+}
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+TELEMETRY_INDEX = [("meta.device_id", 1), ("created_at", -1)]
+
+STATUS_PROJECTION = {
+    "_id": 0,
+    "cpu_usage": 1,
+    "ram_usage": 1,
+    "free_disk": 1,
+    "temperature": 1,
+    "latency": 1,
+    "connectivity": 1,
+    "boot_date": 1,
+    "created_at": 1,
+}
+
+# STATUS_PROJECTION with every `DeviceStatus` field present (null when the
+# heartbeat lacks it), so reads can be returned without the response model
+STATUS_RESPONSE_PROJECTION = {
+    "_id": 0,
+    **{
+        key: {"$ifNull": [f"${key}", None]} for key in STATUS_PROJECTION if key != "_id"
+    },
+}
+
+
+async def ensure_telemetry_collection(db: AsyncDatabase) -> None:
+    """Create the heartbeat time-series collection if it does not exist yet.
+
+    Buckets are keyed by `meta` (device id + owner) and `created_at`, so range
+    reads for a single device only touch that device's buckets. Heartbeats
+    expire `TELEMETRY_RETENTION_DAYS` after `created_at`; the period is
+    re-applied with `collMod` on every startup so changing it needs no
+    migration.
+    """
+    retention_days = get_retention_options()["telemetry_days"]
+    expire_after = retention_days * 86400 if retention_days else "off"
+
+    try:
+        await db.create_collection(TELEMETRY_COLLECTION, timeseries=TIMESERIES_OPTIONS)
+        logger.info(f"Created time-series collection {TELEMETRY_COLLECTION}")
+    except CollectionInvalid:
+        pass
+
+    try:
+        await db.command(
+            "collMod", TELEMETRY_COLLECTION, expireAfterSeconds=expire_after
+        )
+    except OperationFailure as e:
+        logger.error(f"Unable to set telemetry retention: {e}")
+
+    await db.get_collection(TELEMETRY_COLLECTION).create_index(
+        TELEMETRY_INDEX, name="device_created_at"
+    )
+
+
+def parse_timestamp(value: str | datetime) -> datetime:
+    date = value if isinstance(value, datetime) else datetime.fromisoformat(value)
+    if date.tzinfo is None:
+        return date.replace(tzinfo=timezone.utc)
+    return date
+
+
+def encode_cursor(status: dict) -> str:
+    return f"{status['created_at'].isoformat()}|{status['_id']}"
+
+
+def decode_cursor(cursor: str) -> dict:
+    """Keyset filter for heartbeats after the cursor in (created_at, _id) order.
+
+    Both descending. `created_at` is client supplied and stored to the
+    millisecond, so heartbeats can share one and `_id` breaks the tie.
+    """
+    created_at, separator, document_id = cursor.rpartition("|")
+    if not separator or not ObjectId.is_valid(document_id):
+        raise ValueError("Invalid cursor")
+
+    created_at = parse_timestamp(created_at)
+    return {
+        "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": ObjectId(document_id)}},
+        ]
+    }
+
+
+def to_telemetry_document(device_id: str, user_id: str, status: dict) -> dict:
+    document = dict(status)
+    document["created_at"] = parse_timestamp(document["created_at"])
+    if isinstance(document.get("boot_date"), str):
+        document["boot_date"] = parse_timestamp(document["boot_date"])
+    document["meta"] = {"device_id": device_id, "user_id": user_id}
+    return document
+
+
+def device_range_filter(
+    device_id: str,
+    user_id: str,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+) -> dict:
+    query = {"meta.device_id": device_id, "meta.user_id": user_id}
+
+    created_at = {}
+    if start_date:
+        created_at["$gte"] = start_date
+    if end_date:
+        created_at["$lte"] = end_date
+    if created_at:
+        query["created_at"] = created_at
+
+    return query
+
+
+def status_snapshot(status: dict) -> dict:
+    return {key: status.get(key) for key in STATUS_PROJECTION if key != "_id"}
+
+
+def telemetry_event(document: dict) -> dict:
+    """JSON-ready live telemetry push for one stored heartbeat."""
+    event = {"device_id": document["meta"]["device_id"]}
+    for key, value in status_snapshot(document).items():
+        event[key] = value.isoformat() if isinstance(value, datetime) else value
+    return event
+
+
+def latest_status_update(status: dict) -> list[dict]:
+    """Update pipeline keeping `last_status` pointed at the newest heartbeat.
+
+    Runs as a single atomic update on the device document; heartbeats that
+    arrive out of order only move `last_seen_at` forward and never replace a
+    newer snapshot.
+    """
+    snapshot = status_snapshot(status)
+    is_newer = {
+        "$gt": [snapshot["created_at"], {"$ifNull": ["$last_seen_at", EPOCH]}]
+    }
+
+    return [
+        {
+            "$set": {
+                "last_status": {
+                    "$cond": [is_newer, {"$literal": snapshot}, "$last_status"]
+                },
+                "online": {"$cond": [is_newer, snapshot["connectivity"], "$online"]},
+                "last_seen_at": {
+                    "$cond": [is_newer, snapshot["created_at"], "$last_seen_at"]
+                },
+            }
+        }
+    ]
+
+
+def online_expression(now: datetime | None = None) -> dict:
+    """A device is online while its last heartbeat had connectivity and is recent."""
+    now = now or datetime.now(timezone.utc)
+    threshold = now - timedelta(seconds=get_device_offline_after())
+
+    return {
+        "$and": [
+            {"$ifNull": ["$online", False]},
+            {"$gte": [{"$ifNull": ["$last_seen_at", EPOCH]}, threshold]},
+        ]
+    }
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+from contextlib import suppress
+from typing import Hashable
+
+from config.env_vars import get_enviroment
+
+from .cache import TTLCache
+from .database import get_async_redis_storage
+
+logger = logging.getLogger(__name__)
+
+
+class CacheInvalidator:
+    """Keeps registered per-worker caches coherent across workers.
+
+    `invalidate` drops a key from this worker's cache and publishes it on the
+    cache's Redis channel. Every worker listens on the channels of all
+    registered caches over one pubsub connection, drops the keys it receives
+    and clears the caches whenever it (re)subscribes, since invalidations sent
+    while it was not subscribed were missed.
+    """
+
+    def __init__(self):
+        self._caches: dict[str, TTLCache] = {}
+        self._task: asyncio.Task | None = None
+
+    @staticmethod
+    def channel(cache: TTLCache) -> str:
+        env = get_enviroment()
+        return f"{env}:{cache.name}:invalidate"
+
+    def register(self, cache: TTLCache) -> TTLCache:
+        self._caches[self.channel(cache)] = cache
+        return cache
+
+    async def invalidate(self, cache: TTLCache, key: Hashable) -> None:
+        cache.invalidate(key)
+        try:
+            await get_async_redis_storage().publish(self.channel(cache), str(key))
+        except Exception as e:
+            # The other workers' entries still expire after the cache TTL
+            logger.error(f"Error publishing invalidation of {cache.name} {key}: {e}")
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    def apply(self, event: dict) -> None:
+        cache = self._caches.get(event["channel"])
+        if event["type"] == "message" and cache is not None:
+            cache.invalidate(event["data"])
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with get_async_redis_storage().pubsub() as pubsub:
+                    await pubsub.subscribe(*self._caches)
+                    # Anything cached while unsubscribed may have missed one
+                    for cache in self._caches.values():
+                        cache.clear()
+                    async for event in pubsub.listen():
+                        self.apply(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error listening for cache invalidations: {e}")
+                await asyncio.sleep(1)
+
+
+cache_invalidator = CacheInvalidator()
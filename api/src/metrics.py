@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import defaultdict
+from typing import Callable
+
+
+class Metrics:
+    """In-process counters, gauges and timings reported by `GET /metrics`.
+
+    Values are per worker; callers that need fleet-wide numbers scrape every
+    worker and sum them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, float] = defaultdict(float)
+        self._gauges: dict[str, float] = {}
+        self._gauge_callbacks: dict[str, Callable[[], float]] = {}
+        self._timings: dict[str, list[float]] = {}
+
+    def incr(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def register_gauge(self, name: str, callback: Callable[[], float]) -> None:
+        """Gauge computed lazily when a snapshot is taken."""
+        with self._lock:
+            self._gauge_callbacks[name] = callback
+
+    def unregister_gauge(self, name: str) -> None:
+        with self._lock:
+            self._gauge_callbacks.pop(name, None)
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            timing = self._timings.setdefault(name, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    def timer(self, name: str) -> "_Timer":
+        return _Timer(self, name)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            callbacks = dict(self._gauge_callbacks)
+            timings = {
+                name: {
+                    "count": count,
+                    "total_seconds": total,
+                    "avg_seconds": total / count if count else 0.0,
+                    "max_seconds": maximum,
+                }
+                for name, (count, total, maximum) in self._timings.items()
+            }
+
+        for name, callback in callbacks.items():
+            try:
+                gauges[name] = callback()
+            except Exception:
+                continue
+
+        return {"counters": counters, "gauges": gauges, "timings": timings}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._timings.clear()
+
+
+class _Timer:
+    def __init__(self, registry: Metrics, name: str):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self.registry.observe(self.name, time.perf_counter() - self.start)
+
+
+metrics = Metrics()
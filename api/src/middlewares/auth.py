@@ -1,34 +1,65 @@
 import logging
-import re
-from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
 
-from .constants import public_routes
+from redis.exceptions import RedisError
+from starlette.requests import HTTPConnection
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from starlette.websockets import WebSocketClose
+
+from src.database import get_async_redis_storage
+from src.users.sessions import resolve_session
+from .constants import public_post_routes, public_routes
+from .routes import RouteTable
 
 logger = logging.getLogger(__name__)
 
+route_table = RouteTable(public_routes, public_post_routes)
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        path = request.url.path
 
-        if path == "/" or any(path.startswith(route) for route in public_routes):
-            return await call_next(request)
+class AuthMiddleware:
+    """Resolves the `session_id` cookie into `request.state.user_id`.
 
-        if request.method == "OPTIONS":
-            return await call_next(request)
+    Sessions are looked up through the per-worker session cache and only go to
+    Redis on a miss. HTTP requests to non-public routes without a valid session
+    get a 401 before reaching the app; WebSocket handshakes are closed with
+    1008 (policy violation), which the server turns into a 403.
+    """
 
-        if (
-            re.fullmatch(
-                r"/api/devices/([a-z0-9]){32}/status",
-                path,
-            )
-            and request.method == "POST"
-        ):
-            return await call_next(request)
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        scope_type = scope["type"]
+        if scope_type == "http":
+            if route_table.is_public(scope["method"], scope["path"]):
+                return await self.app(scope, receive, send)
+        elif scope_type != "websocket":
+            return await self.app(scope, receive, send)
+
+        session_id = HTTPConnection(scope).cookies.get("session_id")
+        user_id = None
+        if session_id:
+            try:
+                user_id = await resolve_session(get_async_redis_storage(), session_id)
+            except RedisError as e:
+                logger.error(f"Unable to resolve session: {e}")
+                return await self.reject(scope, receive, send, unavailable=True)
 
-        session_id = request.cookies.get("session_id")
-        if not session_id:
-            raise HTTPException(status_code=401, detail="Unauthorized")
+        if not user_id:
+            return await self.reject(scope, receive, send)
+
+        scope.setdefault("state", {})["user_id"] = user_id
+        return await self.app(scope, receive, send)
+
+    @staticmethod
+    async def reject(scope: Scope, receive: Receive, send: Send, unavailable=False):
+        if scope["type"] == "websocket":
+            response = WebSocketClose(code=1011 if unavailable else 1008)
+        elif unavailable:
+            response = JSONResponse(
+                {"detail": "Session store unavailable"}, status_code=503
+            )
+        else:
+            response = JSONResponse({"detail": "Unauthorized"}, status_code=401)
 
-        return await call_next(request)
+        await response(scope, receive, send)
@@ -1 +1,8 @@
-public_routes = ["/api/users", "/docs", "/openapi.json", "/api/login"]
+# /metrics authenticates scrapers with METRICS_TOKEN instead of a session
+public_routes = ["/api/users", "/docs", "/openapi.json", "/api/login", "/metrics"]
+
+# Device-facing ingestion endpoints (POST only), matched as full-path patterns
+public_post_routes = [
+    r"/api/devices/status/bulk",
+    r"/api/devices/[a-z0-9]{32}/status",
+]
@@ -0,0 +1,43 @@
+import re
+
+_END = object()
+
+
+class RouteTable:
+    """Classifies request paths as public or session-protected.
+
+    Built once at import time: public prefixes live in a trie keyed by path
+    segment, so a lookup costs one `split` plus a dict hop per segment, and
+    the POST-only routes are joined into a single compiled pattern.
+    """
+
+    def __init__(self, public_prefixes: list[str], public_post_patterns: list[str]):
+        self._prefixes: dict = {}
+        for prefix in public_prefixes:
+            node = self._prefixes
+            for segment in prefix.strip("/").split("/"):
+                node = node.setdefault(segment, {})
+            node[_END] = True
+
+        self._public_post = re.compile(
+            "|".join(f"(?:{pattern})" for pattern in public_post_patterns)
+        )
+
+    def has_public_prefix(self, path: str) -> bool:
+        node = self._prefixes
+        for segment in path[1:].split("/"):
+            node = node.get(segment)
+            if node is None:
+                return False
+            if _END in node:
+                return True
+        return False
+
+    def is_public(self, method: str, path: str) -> bool:
+        if path == "/" or method == "OPTIONS":
+            return True
+
+        if self.has_public_prefix(path):
+            return True
+
+        return method == "POST" and self._public_post.fullmatch(path) is not None
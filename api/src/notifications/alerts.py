@@ -0,0 +1,328 @@
+import json
+import logging
+import operator
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+from pymongo.asynchronous.database import AsyncDatabase
+
+from config.env_vars import get_alert_cooldown, get_enviroment
+from src.cache import MISSING, TTLCache
+from src.database import get_async_redis_storage
+from src.invalidation import cache_invalidator
+from src.metrics import metrics
+from src.websocket.stream import publish_many_to_stream
+
+from .schemas import Notification
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATIONS_COLLECTION = "notifications"
+NOTIFICATIONS_CONFIG_COLLECTION = "notifications_config"
+
+# free_disk alerts when it drops below the threshold, every other metric above
+BELOW_THRESHOLD_METRICS = {"free_disk"}
+
+# Below this many heartbeats building the columns costs more than the per-heartbeat
+# loop saves (see benchmarks/alert_evaluation.py)
+VECTORIZE_MIN_BATCH = 4096
+
+
+@dataclass(frozen=True, slots=True)
+class ThresholdRule:
+    config_id: str
+    threshold: float
+    exceeded: Callable[[float, float], bool]
+
+
+@dataclass(frozen=True, slots=True)
+class Violation:
+    config_id: str
+    metric: str
+    value: float
+    threshold: float
+
+
+# user_id -> {metric: (rules, ...)}
+CompiledRules = dict[str, tuple[ThresholdRule, ...]]
+
+# Config changes are broadcast to every worker, the TTL only bounds a missed one
+rules_cache = cache_invalidator.register(
+    TTLCache("alert_rules", maxsize=10000, ttl=300)
+)
+
+
+def comparison_for(metric: str) -> Callable:
+    # operator.lt / operator.gt work element-wise on NumPy arrays as well
+    return operator.lt if metric in BELOW_THRESHOLD_METRICS else operator.gt
+
+
+def compile_rules(configs: list[dict]) -> CompiledRules:
+    compiled: dict[str, list[ThresholdRule]] = {}
+    for config in configs:
+        threshHold = config["threshHold"]
+        for metric in threshHold.get("watch_keys", []):
+            threshold = threshHold.get(metric)
+            if threshold is None:
+                continue
+
+            compiled.setdefault(metric, []).append(
+                ThresholdRule(
+                    config_id=str(config["_id"]),
+                    threshold=threshold,
+                    exceeded=comparison_for(metric),
+                )
+            )
+
+    return {metric: tuple(rules) for metric, rules in compiled.items()}
+
+
+async def get_user_rules(db: AsyncDatabase, user_id: str) -> CompiledRules:
+    rules = rules_cache.get(user_id)
+    if rules is not MISSING:
+        return rules
+
+    configs = await (
+        db.get_collection(NOTIFICATIONS_CONFIG_COLLECTION)
+        .find({"user_id": user_id}, {"threshHold": 1})
+        .to_list()
+    )
+    rules = compile_rules(configs)
+    rules_cache.set(user_id, rules)
+    return rules
+
+
+async def invalidate_user_rules(user_id: str) -> None:
+    await cache_invalidator.invalidate(rules_cache, user_id)
+
+
+def evaluate(rules: CompiledRules, status: dict) -> list[Violation]:
+    """Check one heartbeat against all of a user's rules in a single pass."""
+    violations = []
+    for metric, metric_rules in rules.items():
+        value = status.get(metric)
+        if value is None:
+            continue
+
+        for rule in metric_rules:
+            if rule.exceeded(value, rule.threshold):
+                violations.append(
+                    Violation(rule.config_id, metric, value, rule.threshold)
+                )
+
+    return violations
+
+
+def metric_column(statuses: list[dict], metric: str) -> np.ndarray:
+    try:
+        return np.fromiter(
+            map(operator.itemgetter(metric), statuses),
+            dtype=np.float64,
+            count=len(statuses),
+        )
+    except (KeyError, TypeError):
+        # Partial heartbeats: missing readings become NaN
+        return np.array([status.get(metric) for status in statuses], dtype=np.float64)
+
+
+def evaluate_batch(
+    heartbeats: list[tuple[str, str, dict]], rules_by_user: dict[str, CompiledRules]
+) -> list[tuple[str, str, Violation]]:
+    """Columnar version of `evaluate` for large (device_id, user_id, status) batches.
+
+    Each watched metric becomes one float column over the whole batch (missing
+    values are NaN and never violate). A user's rules for a metric are laid
+    out in slots, so slot `n` holds every user's n-th rule for that metric and
+    is checked with a single comparison against the thresholds gathered per
+    heartbeat. Returns (device_id, user_id, violation) tuples.
+    """
+    if not heartbeats:
+        return []
+
+    user_ids = list(rules_by_user)
+    user_index = {user_id: index for index, user_id in enumerate(user_ids)}
+    heartbeat_users = np.fromiter(
+        (user_index[user_id] for _, user_id, _ in heartbeats),
+        dtype=np.intp,
+        count=len(heartbeats),
+    )
+
+    metric_rules: dict[str, list[tuple[ThresholdRule, ...]]] = {}
+    for index, user_id in enumerate(user_ids):
+        for metric, rules in rules_by_user[user_id].items():
+            if metric not in metric_rules:
+                metric_rules[metric] = [()] * len(user_ids)
+            metric_rules[metric][index] = rules
+
+    statuses = [status for _, _, status in heartbeats]
+    violations = []
+    for metric, rules_per_user in metric_rules.items():
+        values = metric_column(statuses, metric)
+        exceeded = comparison_for(metric)
+
+        for slot in range(max(len(rules) for rules in rules_per_user)):
+            slot_rules = [
+                rules[slot] if slot < len(rules) else None for rules in rules_per_user
+            ]
+            thresholds = np.array(
+                [np.nan if rule is None else rule.threshold for rule in slot_rules],
+                dtype=np.float64,
+            )
+
+            with np.errstate(invalid="ignore"):
+                hits = exceeded(values, thresholds[heartbeat_users])
+
+            indexes = np.flatnonzero(hits)
+            for index, user in zip(indexes.tolist(), heartbeat_users[indexes].tolist()):
+                device_id, user_id, status = heartbeats[index]
+                rule = slot_rules[user]
+                violations.append(
+                    (
+                        device_id,
+                        user_id,
+                        Violation(
+                            rule.config_id, metric, status[metric], rule.threshold
+                        ),
+                    )
+                )
+
+    return violations
+
+
+def alert_state_key(device_id: str, config_id: str, metric: str) -> str:
+    env = get_enviroment()
+    return f"{env}:alert:{device_id}:{config_id}:{metric}"
+
+
+def recovered_keys(
+    heartbeats: list[tuple[str, str, dict]], rules_by_user: dict[str, CompiledRules]
+) -> list[str]:
+    """State keys of the rules each device's newest heartbeat no longer violates."""
+    newest: dict[str, tuple[str, dict]] = {}
+    for device_id, user_id, status in heartbeats:
+        current = newest.get(device_id)
+        if current is None or status["created_at"] >= current[1]["created_at"]:
+            newest[device_id] = (user_id, status)
+
+    return [
+        alert_state_key(device_id, rule.config_id, metric)
+        for device_id, (user_id, status) in newest.items()
+        for metric, rules in rules_by_user[user_id].items()
+        if status.get(metric) is not None
+        for rule in rules
+        if not rule.exceeded(status[metric], rule.threshold)
+    ]
+
+
+async def alert_transitions(
+    heartbeats: list[tuple[str, str, dict]],
+    rules_by_user: dict[str, CompiledRules],
+    violations: list[tuple[str, str, Violation]],
+) -> list[tuple[str, str, Violation]]:
+    """The violations that should notify: one per (device, rule) going over.
+
+    A (device, rule) pair is armed until it violates, then stays quiet until a
+    heartbeat is back within the threshold or `ALERT_COOLDOWN_SECONDS` pass.
+    The state lives in Redis, shared by every worker: violating sets the key
+    with NX and the cooldown as its TTL, recovering deletes it, all in one
+    pipelined round-trip per batch.
+    """
+    first: dict[str, tuple[str, str, Violation]] = {}
+    for device_id, user_id, violation in violations:
+        key = alert_state_key(device_id, violation.config_id, violation.metric)
+        first.setdefault(key, (device_id, user_id, violation))
+
+    recovered = recovered_keys(heartbeats, rules_by_user)
+    if not first and not recovered:
+        return []
+
+    try:
+        async with get_async_redis_storage().pipeline(transaction=False) as pipe:
+            for key in first:
+                pipe.set(key, 1, nx=True, ex=get_alert_cooldown())
+            # After the SETs, so a batch that violates and then recovers re-arms
+            if recovered:
+                pipe.delete(*recovered)
+            results = await pipe.execute()
+    except Exception as e:
+        # Better a repeated alert than a missed one
+        logger.error(f"Error updating alert state: {e}")
+        return list(first.values())
+
+    transitions = [
+        violation for violation, started in zip(first.values(), results) if started
+    ]
+    metrics.incr("alerts.suppressed", len(violations) - len(transitions))
+    return transitions
+
+
+async def evaluate_heartbeats(
+    db: AsyncDatabase, heartbeats: list[tuple[str, str, dict]]
+) -> list[dict]:
+    """Alerting stage of heartbeat ingest.
+
+    Evaluates (device_id, user_id, status) heartbeats against their owners'
+    cached threshold rules, stores a `Notification` per new violation (see
+    `alert_transitions`) and pushes them to each user's notification stream.
+    """
+    rules_by_user: dict[str, CompiledRules] = {}
+    for _, user_id, _ in heartbeats:
+        if user_id not in rules_by_user:
+            rules_by_user[user_id] = await get_user_rules(db, user_id)
+
+    with metrics.timer("alerts.evaluate"):
+        if len(heartbeats) >= VECTORIZE_MIN_BATCH:
+            violations = evaluate_batch(heartbeats, rules_by_user)
+        else:
+            violations = [
+                (device_id, user_id, violation)
+                for device_id, user_id, status in heartbeats
+                if rules_by_user[user_id]
+                for violation in evaluate(rules_by_user[user_id], status)
+            ]
+
+    violations = await alert_transitions(heartbeats, rules_by_user, violations)
+    notifications = [
+        Notification(
+            user_id=user_id,
+            device_id=device_id,
+            config_id=violation.config_id,
+            metric=violation.metric,
+            value=violation.value,
+            threshold=violation.threshold,
+        ).model_dump()
+        for device_id, user_id, violation in violations
+    ]
+
+    if not notifications:
+        return []
+
+    await db.get_collection(NOTIFICATIONS_COLLECTION).insert_many(notifications)
+    metrics.incr("alerts.notifications", len(notifications))
+
+    await publish_many_to_stream(
+        [
+            (
+                notification["user_id"],
+                notification_message(notification),
+                f"{notification['device_id']}:{notification['metric']}",
+            )
+            for notification in notifications
+        ]
+    )
+    return notifications
+
+
+def notification_message(notification: dict) -> str:
+    return json.dumps(
+        {
+            "id": str(notification["_id"]),
+            "device_id": notification["device_id"],
+            "config_id": notification["config_id"],
+            "metric": notification["metric"],
+            "value": notification["value"],
+            "threshold": notification["threshold"],
+            "created_at": notification["created_at"].isoformat(),
+        }
+    )
@@ -1,16 +1,20 @@
 from typing import Annotated
 from fastapi import Depends
-from pymongo.collection import Collection
+from pymongo.asynchronous.collection import AsyncCollection
 from src.schemas import DatabaseDep
 
+from .alerts import NOTIFICATIONS_COLLECTION, NOTIFICATIONS_CONFIG_COLLECTION
 
-def get_notifications_collection(db: DatabaseDep) -> Collection:
-    notifications_collection = db.get_collection("notifications")
+
+def get_notifications_collection(db: DatabaseDep) -> AsyncCollection:
+    notifications_collection = db.get_collection(NOTIFICATIONS_COLLECTION)
     return notifications_collection
 
 
-def get_notifications_config_collection(db: DatabaseDep) -> Collection:
-    notifications_config_collection = db.get_collection("notifications_config")
+def get_notifications_config_collection(db: DatabaseDep) -> AsyncCollection:
+    notifications_config_collection = db.get_collection(
+        NOTIFICATIONS_CONFIG_COLLECTION
+    )
     return notifications_config_collection
 
 
@@ -39,8 +43,8 @@ def get_devices_query_params(
 
 
 NotificationsCollectionDep = Annotated[
-    Collection, Depends(get_notifications_collection)
+    AsyncCollection, Depends(get_notifications_collection)
 ]
 NotificationsConfigCollectionDep = Annotated[
-    Collection, Depends(get_notifications_config_collection)
+    AsyncCollection, Depends(get_notifications_config_collection)
 ]
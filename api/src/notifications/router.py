@@ -2,7 +2,15 @@ import logging
 from typing import Optional
 from bson import ObjectId
 
-from fastapi import APIRouter, HTTPException, Request, status
+from fastapi import APIRouter, HTTPException, Request, Response, status
+
+from src.conditional import (
+    etag_matches,
+    has_validator,
+    make_etag,
+    not_modified,
+    set_validators,
+)
 
 from .schemas import (
     ThreshHoldConfig,
@@ -10,8 +18,8 @@ from .schemas import (
     NotificationConfigOut,
     NotificationConfigUpdate,
 )
+from .alerts import invalidate_user_rules
 from .dependencies import NotificationsCollectionDep, NotificationsConfigCollectionDep
-from ..devices.dependencies import DevicesCollectionDep
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 logger = logging.getLogger(__name__)
@@ -19,17 +27,46 @@ logger = logging.getLogger(__name__)
 
 @router.get("/config", response_model=Optional[list[NotificationConfigOut]])
 async def get_notifications_config(
-    request: Request, collection: NotificationsConfigCollectionDep
+    request: Request, response: Response, collection: NotificationsConfigCollectionDep
 ):
     user_id = request.state.user_id
 
     try:
-        notifications = collection.find({"user_id": user_id})
-        return notifications
+        if has_validator(request):
+            # Creating, editing and deleting configs all change the count or
+            # the latest `updated_at`
+            cursor = await collection.aggregate(
+                [
+                    {"$match": {"user_id": user_id}},
+                    {
+                        "$group": {
+                            "_id": None,
+                            "count": {"$sum": 1},
+                            "updated_at": {"$max": "$updated_at"},
+                        }
+                    },
+                ]
+            )
+            versions = await cursor.to_list()
+            version = versions[0] if versions else {"count": 0, "updated_at": None}
+            etag = make_etag(user_id, version["count"], version["updated_at"])
+            if etag_matches(request, etag):
+                return not_modified(etag, version["updated_at"])
+
+        notifications = await collection.find({"user_id": user_id}).to_list()
     except Exception as e:
         logger.error(f"Error fetching notification configs: {e}")
         raise HTTPException(500, detail="Failed to fetch notification configs") from e
 
+    updated_at = max(
+        filter(None, (config.get("updated_at") for config in notifications)),
+        default=None,
+    )
+    set_validators(
+        response, make_etag(user_id, len(notifications), updated_at), updated_at
+    )
+    return notifications
+
 
 @router.get("/config/{config_id}", response_model=Optional[NotificationConfigOut])
 async def get_notification_config(
@@ -38,7 +75,7 @@ async def get_notification_config(
     user_id = request.state.user_id
 
     try:
-        notificaiton_config = collection.find_one(
+        notificaiton_config = await collection.find_one(
             {"user_id": user_id, "_id": ObjectId(config_id)}
         )
         return notificaiton_config
@@ -60,10 +97,12 @@ async def create_notifications_config(  # Subscribe to a notificaiton stream for
     print(f"Notification: {notificationConfig}")
 
     try:
-        collection.insert_one(notificationConfig)
+        await collection.insert_one(notificationConfig)
     except Exception as e:
         raise HTTPException(500, detail="Failed to create notification config") from e
 
+    await invalidate_user_rules(user_id)
+
     return
 
 
@@ -76,17 +115,21 @@ async def update_notifications_config(
 ):
     user_id = request.state.user_id
     update_data = notificationConfig.model_dump(exclude_unset=True)
+    # Defaults are excluded above, but every edit has to move the version
+    update_data.setdefault("updated_at", notificationConfig.updated_at)
     print(f"updated: {update_data}")
 
     try:
-        collection.update_one(
+        await collection.update_one(
             {"user_id": user_id, "_id": ObjectId(notification_config_id)},
-            {"$set": notificationConfig.model_dump(exclude_unset=True)},
+            {"$set": update_data},
         )
     except Exception as e:
         logger.error(f"Error updating notification config: {e}")
         raise HTTPException(500, detail="Failed to update notification config") from e
 
+    await invalidate_user_rules(user_id)
+
     return
 
 
@@ -100,12 +143,14 @@ async def delete_notifications_config(
 ):
     user_id = request.state.user_id
     try:
-        collection.delete_one(
+        await collection.delete_one(
             {"_id": ObjectId(notification_config_id), "user_id": user_id}
         )
     except Exception as e:
         logger.error(f"Error deleting notification config: {e}")
         raise HTTPException(500, detail="Failed to delete notification config") from e
+
+    await invalidate_user_rules(user_id)
     return
 
 
@@ -116,27 +161,25 @@ async def mark_notification_as_read(
     notification_id: str,
     request: Request,
     notification_collection: NotificationsCollectionDep,
-    device_collection: DevicesCollectionDep,
 ):
     user_id = request.state.user_id
-    notificaiton = notification_collection.find_one({"_id": notification_id})
-    if not notificaiton:
+    if not ObjectId.is_valid(notification_id):
         raise HTTPException(status_code=404, detail="Notification not found")
 
-    device = device_collection.find_one(
-        {"_id": notificaiton["device_id"], "user_id": user_id}
-    )
-
-    if not device:
-        raise HTTPException(
-            status_code=401, detail="User not allowed to change notification"
-        )
-
     try:
-        device.update({"read": True})
+        # Notifications carry their owner, so one filtered update both checks
+        # ownership and marks the notification
+        result = await notification_collection.update_one(
+            {"_id": ObjectId(notification_id), "user_id": user_id},
+            {"$set": {"is_read": True}},
+        )
     except Exception as e:
+        logger.error(f"Error marking notification as read: {e}")
         raise HTTPException(
             status_code=500, detail="Failed to mark notification as read"
         ) from e
 
+    if not result.matched_count:
+        raise HTTPException(status_code=404, detail="Notification not found")
+
     return
@@ -1,6 +1,6 @@
 import logging
 
-from datetime import datetime
+from datetime import datetime, timezone
 from bson import ObjectId
 from fastapi import Form
 from pydantic import (
@@ -45,15 +45,21 @@ class ThreshHoldConfig(HearBeat):
 
 
 class Notification(BaseModel):
+    user_id: str
+    device_id: str
+    config_id: PyObjectId
+    metric: str
+    value: float
+    threshold: float
     is_read: bool = False
-    created_at: datetime = Field(default_factory=lambda: datetime.now())
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
 class NotificationConfig(BaseModel):
     user_id: str
     threshHold: ThreshHoldConfig
-    created_at: datetime = Field(default_factory=lambda: datetime.now())
-    updated_at: datetime = Field(default_factory=lambda: datetime.now())
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
 NotificationConfigForm = Annotated[NotificationConfig, Form()]
@@ -73,4 +79,4 @@ class NotificationConfigOut(BaseModel):
 
 class NotificationConfigUpdate(BaseModel):
     threshHold: Optional[ThreshHoldConfig] = None
-    updated_at: datetime = Field(default_factory=lambda: datetime.now())
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
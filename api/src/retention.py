@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import time
+from contextlib import suppress
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.asynchronous.database import AsyncDatabase
+
+from config.env_vars import get_enviroment, get_retention_options
+from src.database import get_async_redis_storage, get_database
+from src.devices.rollups import ROLLUPS_COLLECTION
+from src.devices.telemetry import TELEMETRY_COLLECTION
+from src.metrics import metrics
+from src.notifications.alerts import NOTIFICATIONS_COLLECTION
+from src.websocket.utils import get_stream_key, get_worker_id
+
+logger = logging.getLogger(__name__)
+
+READ_NOTIFICATIONS_INDEX = IndexModel(
+    [("created_at", ASCENDING)],
+    name="read_created_at",
+    partialFilterExpression={"is_read": True},
+)
+
+STORAGE_COLLECTIONS = (
+    TELEMETRY_COLLECTION,
+    ROLLUPS_COLLECTION,
+    NOTIFICATIONS_COLLECTION,
+)
+TRIM_BATCH_SIZE = 500
+
+
+def get_retention_lock_key() -> str:
+    env = get_enviroment()
+    return f"{env}:retention:lock"
+
+
+async def ensure_retention_indexes(db: AsyncDatabase) -> None:
+    await db.get_collection(NOTIFICATIONS_COLLECTION).create_indexes(
+        [READ_NOTIFICATIONS_INDEX]
+    )
+
+
+async def compact_read_notifications(db: AsyncDatabase, days: int) -> int:
+    """Delete read notifications older than `days`; returns the bytes freed."""
+    if not days:
+        return 0
+
+    collection = db.get_collection(NOTIFICATIONS_COLLECTION)
+    before = datetime.now(timezone.utc) - timedelta(days=days)
+    result = await collection.delete_many(
+        {"is_read": True, "created_at": {"$lt": before}}
+    )
+    metrics.incr("retention.notifications_deleted", result.deleted_count)
+
+    if not result.deleted_count:
+        return 0
+    stats = await collection_stats(db, NOTIFICATIONS_COLLECTION)
+    return result.deleted_count * stats.get("avgObjSize", 0)
+
+
+async def trim_notification_streams(days: int) -> int:
+    """XTRIM every user's notification stream to entries newer than `days`.
+
+    Stream ids start with their creation time in milliseconds, so `MINID`
+    drops by age whatever the stream length. Pending entries trimmed away
+    are skipped and acked on the next replay.
+    """
+    if not days:
+        return 0
+
+    redis_client = get_async_redis_storage()
+    min_id = int((time.time() - days * 86400) * 1000)
+
+    trimmed = 0
+    keys = []
+    async for key in redis_client.scan_iter(
+        match=get_stream_key("*"), count=TRIM_BATCH_SIZE, _type="stream"
+    ):
+        keys.append(key)
+        if len(keys) == TRIM_BATCH_SIZE:
+            trimmed += await _trim(redis_client, keys, min_id)
+            keys = []
+    trimmed += await _trim(redis_client, keys, min_id)
+
+    metrics.incr("retention.stream_entries_trimmed", trimmed)
+    return trimmed
+
+
+async def _trim(redis_client, keys: list[str], min_id: int) -> int:
+    if not keys:
+        return 0
+
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for key in keys:
+            # Exact: `~` only drops whole radix nodes, which capped streams
+            # rarely fill
+            pipe.xtrim(key, minid=min_id, approximate=False)
+        return sum(await pipe.execute())
+
+
+async def collection_stats(db: AsyncDatabase, name: str) -> dict:
+    cursor = await db.get_collection(name).aggregate(
+        [{"$collStats": {"storageStats": {}}}]
+    )
+    stats = await cursor.to_list()
+    return stats[0]["storageStats"] if stats else {}
+
+
+async def report_storage(db: AsyncDatabase) -> None:
+    for name in STORAGE_COLLECTIONS:
+        stats = await collection_stats(db, name)
+        metrics.set_gauge(f"storage.{name}.size_bytes", stats.get("size", 0))
+        metrics.set_gauge(f"storage.{name}.storage_bytes", stats.get("storageSize", 0))
+        metrics.set_gauge(f"storage.{name}.documents", stats.get("count", 0))
+
+
+class RetentionJob:
+    """Periodic compaction of what TTL indexes can't expire on their own.
+
+    Heartbeats and rollups expire through their TTL indexes. Every `interval`
+    seconds one worker (whichever takes the Redis lock) deletes old read
+    notifications, trims the notification streams by age and refreshes the
+    `storage.*` gauges so the effect of retention is visible.
+    """
+
+    def __init__(
+        self,
+        worker_id: str,
+        interval: float = 3600,
+        read_notification_days: int = 7,
+        stream_days: int = 7,
+    ):
+        self.worker_id = worker_id
+        self.interval = interval
+        self.read_notification_days = read_notification_days
+        self.stream_days = stream_days
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def run(self, db: AsyncDatabase) -> None:
+        with metrics.timer("retention.run"):
+            reclaimed = await compact_read_notifications(
+                db, self.read_notification_days
+            )
+            metrics.incr("retention.notifications_reclaimed_bytes", reclaimed)
+            trimmed = await trim_notification_streams(self.stream_days)
+            await report_storage(db)
+
+        logger.info(
+            f"Retention run reclaimed ~{reclaimed} bytes of notifications "
+            f"and trimmed {trimmed} stream entries"
+        )
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                # The lock outlives the run, so only one worker runs per interval
+                acquired = await get_async_redis_storage().set(
+                    get_retention_lock_key(),
+                    self.worker_id,
+                    nx=True,
+                    ex=max(int(self.interval), 1),
+                )
+                if acquired:
+                    await self.run(get_database())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error running retention job: {e}")
+
+            await asyncio.sleep(self.interval)
+
+
+retention_options = get_retention_options()
+retention_job = RetentionJob(
+    get_worker_id(),
+    interval=retention_options["interval"],
+    read_notification_days=retention_options["read_notification_days"],
+    stream_days=retention_options["stream_days"],
+)
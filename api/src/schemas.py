@@ -2,9 +2,9 @@ import logging
 from fastapi import Depends
 from typing import Annotated
 
-from .database import get_database, get_redis_storage
-from pymongo.database import Database
-from redis import Redis
+from .database import get_database, get_async_redis_storage
+from pymongo.asynchronous.database import AsyncDatabase
+from redis.asyncio import Redis
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +17,6 @@ async def common_parameters(
 
 CommonsDep = Annotated[dict, Depends(common_parameters)]
 
-DatabaseDep = Annotated[Database, Depends(get_database)]
+DatabaseDep = Annotated[AsyncDatabase, Depends(get_database)]
 
-RedisDep = Annotated[Redis, Depends(get_redis_storage)]
+RedisDep = Annotated[Redis, Depends(get_async_redis_storage)]
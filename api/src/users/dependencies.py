@@ -1,13 +1,13 @@
 from typing import Annotated
 from fastapi import Depends
-from pymongo.collection import Collection
+from pymongo.asynchronous.collection import AsyncCollection
 from src.schemas import DatabaseDep
 
 
-def get_user_collection(db: DatabaseDep) -> Collection:
+def get_user_collection(db: DatabaseDep) -> AsyncCollection:
     user_collection = db.get_collection("users")
 
     return user_collection
 
 
-UserCollectionDep = Annotated[Collection, Depends(get_user_collection)]
+UserCollectionDep = Annotated[AsyncCollection, Depends(get_user_collection)]
@@ -7,21 +7,33 @@ from config.env_vars import get_enviroment
 from src.schemas import RedisDep
 
 from .schemas import UserOutPut, GetUser, UserInputForm, UserLoginForm
-from .utils import Hasher
+from . import sessions, throttling
+from .utils import HashingBusy, hashing_pool
 
 router = APIRouter(prefix="/users", tags=["users"])
 logger = logging.getLogger(__name__)
 enviroment = get_enviroment()
 
 
+def hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many logins in progress",
+        headers={"Retry-After": "1"},
+    )
+
+
 @router.post("/", response_model=UserOutPut, status_code=status.HTTP_201_CREATED)
-def create_user(user: UserInputForm, collection: UserCollectionDep):
+async def create_user(user: UserInputForm, collection: UserCollectionDep):
     newUser = user.model_dump()
-    hashed_password = Hasher.get_password_hash(user.password)
+    try:
+        hashed_password = await hashing_pool.hash(user.password)
+    except HashingBusy:
+        raise hashing_busy()
     newUser["password"] = hashed_password
 
     try:
-        collection.insert_one(newUser)
+        await collection.insert_one(newUser)
     except Exception as e:
         logger.debug(f"Failed to insert new user: {e}")
         raise HTTPException(status_code=400, detail="Unable to create user")
@@ -30,7 +42,7 @@ def create_user(user: UserInputForm, collection: UserCollectionDep):
 
 
 @router.post("/auth", status_code=status.HTTP_204_NO_CONTENT)
-def auth_user(request: Request):
+async def auth_user(request: Request):
     session = request.cookies.get("session_id")
 
     if not session:
@@ -40,9 +52,9 @@ def auth_user(request: Request):
 
 
 @router.get("/{user_id}", response_model=GetUser)
-def get_user(user_id: str, collection: UserCollectionDep):
+async def get_user(user_id: str, collection: UserCollectionDep):
     try:
-        user = collection.find_one({"id": user_id})
+        user = await collection.find_one({"id": user_id})
     except Exception as e:
         logger.debug(f"Failed to insert new user: {e}")
         raise HTTPException(status_code=400, detail="Unable to create user")
@@ -51,15 +63,19 @@ def get_user(user_id: str, collection: UserCollectionDep):
 
 
 @router.post("/login", status_code=status.HTTP_200_OK)
-def create_session(
+async def create_session(
     user_data: UserLoginForm,
     users_collection: UserCollectionDep,
     redis_client: RedisDep,
+    request: Request,
     response: Response,
 ):
     logger.debug(f"Attempting login for user: {user_data.email}")
+    client_ip = request.client.host if request.client else "unknown"
     try:
-        user = users_collection.find_one({"email": user_data.email})
+        await throttling.check_login_allowed(redis_client, user_data.email, client_ip)
+
+        user = await users_collection.find_one({"email": user_data.email})
         print(f"user: {user}")
 
         if not user:
@@ -67,13 +83,22 @@ def create_session(
             raise ValueError("Invalid credentials")
 
         logger.info(f"username: {user['username']} \t password: {user['password']}")
-        password_valid = Hasher.verify_password(user_data.password, user["password"])
+        password_valid, new_hash = await hashing_pool.verify_and_update(
+            user_data.password, user["password"]
+        )
 
         if not password_valid:
             raise ValueError("Invalid credentials")
 
+        await throttling.clear_login_failures(redis_client, user_data.email)
+        if new_hash:
+            # Stored with outdated bcrypt parameters
+            await users_collection.update_one(
+                {"id": user["id"]}, {"$set": {"password": new_hash}}
+            )
+
         session_id = uuid4().hex
-        redis_client.setex(f"userSession:{session_id}", 3600, user["id"])
+        await sessions.create_session(redis_client, session_id, user["id"])
 
         response.set_cookie(
             key="session_id",
@@ -81,11 +106,22 @@ def create_session(
             httponly=True,
             secure=False if enviroment == "development" else True,
             samesite="lax",
-            expires=3600,
-            max_age=3600,
+            expires=sessions.SESSION_TTL,
+            max_age=sessions.SESSION_TTL,
+        )
+
+    except throttling.LoginThrottled as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
         )
 
+    except HashingBusy:
+        raise hashing_busy()
+
     except ValueError as e:
+        await throttling.record_login_failure(redis_client, user_data.email, client_ip)
         raise HTTPException(status_code=401, detail=str(e))
 
     except Exception as e:
@@ -96,22 +132,17 @@ def create_session(
 
 
 @router.delete("/logout", status_code=status.HTTP_200_OK)
-def delete_session(
-    request: Request,
-    users_collection: UserCollectionDep,
-    response: Response,
-    redis_client: RedisDep,
-):
-    user_id = request.cookies.get("session_id")
-    user_session = f"userSession:{user_id}"
+async def delete_session(request: Request, response: Response, redis_client: RedisDep):
+    session_id = request.cookies.get("session_id")
 
     try:
-        user = users_collection.find_one({"id": user_session})
+        if not session_id:
+            raise ValueError("Invalid credentials")
 
-        if not user:
+        deleted = await sessions.delete_session(redis_client, session_id)
+        if not deleted:
             raise ValueError("Invalid credentials")
 
-        redis_client.delete(user_session)
         response.delete_cookie(key="session_id")
 
     except ValueError as e:
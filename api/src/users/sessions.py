@@ -0,0 +1,41 @@
+from redis.asyncio import Redis
+
+from config.env_vars import get_session_cache_options
+from src.cache import MISSING, TTLCache
+from src.invalidation import cache_invalidator
+
+SESSION_TTL = 3600
+
+# session_id -> user_id. Logouts are broadcast to every worker; entries also
+# live far shorter than the session itself in case a broadcast is missed.
+session_cache = cache_invalidator.register(
+    TTLCache("sessions", **get_session_cache_options())
+)
+
+
+def session_key(session_id: str) -> str:
+    return f"userSession:{session_id}"
+
+
+async def create_session(redis_client: Redis, session_id: str, user_id: str) -> None:
+    await redis_client.setex(session_key(session_id), SESSION_TTL, user_id)
+    session_cache.set(session_id, user_id)
+
+
+async def resolve_session(redis_client: Redis, session_id: str) -> str | None:
+    """Return the session's user_id, hitting Redis only on a cache miss."""
+    user_id = session_cache.get(session_id)
+    if user_id is not MISSING:
+        return user_id
+
+    user_id = await redis_client.get(session_key(session_id))
+    if user_id:
+        session_cache.set(session_id, user_id)
+    return user_id
+
+
+async def delete_session(redis_client: Redis, session_id: str) -> bool:
+    deleted = await redis_client.delete(session_key(session_id)) > 0
+    # After the delete, so no worker can re-cache the session from Redis
+    await cache_invalidator.invalidate(session_cache, session_id)
+    return deleted
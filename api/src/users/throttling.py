@@ -0,0 +1,65 @@
+from redis.asyncio import Redis
+
+from config.env_vars import get_enviroment, get_login_throttle_options
+from src.metrics import metrics
+
+throttle_options = get_login_throttle_options()
+
+
+class LoginThrottled(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("Too many failed login attempts")
+        self.retry_after = retry_after
+
+
+def login_failures_key(kind: str, value: str) -> str:
+    env = get_enviroment()
+    return f"{env}:login_failures:{kind}:{value}"
+
+
+def failure_keys(email: str, ip: str) -> list[tuple[str, int]]:
+    return [
+        (
+            login_failures_key("email", email.lower()),
+            throttle_options["max_email_failures"],
+        ),
+        (login_failures_key("ip", ip), throttle_options["max_ip_failures"]),
+    ]
+
+
+async def check_login_allowed(redis_client: Redis, email: str, ip: str) -> None:
+    """Raise `LoginThrottled` while the email or the IP has too many failures.
+
+    Checked before the password is, so a throttled attempt costs no bcrypt
+    work. Counters are fixed windows that start at the first failure.
+    """
+    keys = failure_keys(email, ip)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for key, _ in keys:
+            pipe.get(key)
+            pipe.ttl(key)
+        results = await pipe.execute()
+
+    for index, (key, limit) in enumerate(keys):
+        failures, ttl = results[2 * index], results[2 * index + 1]
+        if failures is not None and int(failures) >= limit:
+            if ttl < 0:
+                # A counter left without expiry would throttle forever
+                await redis_client.expire(key, throttle_options["window"], nx=True)
+                ttl = throttle_options["window"]
+            metrics.incr("auth.login_throttled")
+            raise LoginThrottled(max(ttl, 1))
+
+
+async def record_login_failure(redis_client: Redis, email: str, ip: str) -> None:
+    # INCR first: the key may expire between any two commands, and an expiry
+    # set after the INCR always lands on the counter it incremented
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for key, _ in failure_keys(email, ip):
+            pipe.incr(key)
+            pipe.expire(key, throttle_options["window"], nx=True)
+        await pipe.execute()
+
+
+async def clear_login_failures(redis_client: Redis, email: str) -> None:
+    await redis_client.delete(login_failures_key("email", email.lower()))
@@ -1,6 +1,22 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from config.env_vars import get_password_hashing_options
+from src.metrics import metrics
+
+hashing_options = get_password_hashing_options()
+
+# Pinning min and max rounds to the configured cost makes any hash made with
+# another cost "need update", so it is rehashed on the next successful login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=hashing_options["rounds"],
+    bcrypt__min_rounds=hashing_options["rounds"],
+    bcrypt__max_rounds=hashing_options["rounds"],
+)
 
 
 class Hasher:
@@ -8,6 +24,69 @@ class Hasher:
     def verify_password(plain_password, hashed_password):
         return pwd_context.verify(plain_password, hashed_password)
 
+    @staticmethod
+    def verify_and_update(plain_password, hashed_password):
+        return pwd_context.verify_and_update(plain_password, hashed_password)
+
     @staticmethod
     def get_password_hash(password):
         return pwd_context.hash(password)
+
+
+class HashingBusy(Exception):
+    pass
+
+
+class HashingPool:
+    """Runs bcrypt on a small dedicated thread pool.
+
+    bcrypt releases the GIL while hashing, so `workers` threads use that many
+    cores and leave the event loop (and heartbeat ingest) the rest, unlike
+    the shared default threadpool that a login burst can fill. At most
+    `max_pending` hashes may be running or queued; more raise `HashingBusy`.
+    """
+
+    def __init__(self, workers: int = 1, max_pending: int = 32):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor: ThreadPoolExecutor | None = None
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            metrics.incr("auth.hashing_rejected")
+            raise HashingBusy()
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="bcrypt"
+            )
+
+        self.pending += 1
+        try:
+            with metrics.timer("auth.hashing"):
+                return await asyncio.get_running_loop().run_in_executor(
+                    self._executor, fn, *args
+                )
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self.run(Hasher.get_password_hash, password)
+
+    async def verify_and_update(
+        self, password: str, hashed_password: str
+    ) -> tuple[bool, str | None]:
+        """(valid, new hash if the stored one uses outdated parameters)."""
+        return await self.run(Hasher.verify_and_update, password, hashed_password)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+hashing_pool = HashingPool(
+    workers=hashing_options["workers"], max_pending=hashing_options["max_pending"]
+)
+metrics.register_gauge("auth.hashing_pending", lambda: hashing_pool.pending)
@@ -0,0 +1,53 @@
+import json
+from typing import Any
+
+import msgpack
+
+Event = dict[str, Any] | str
+
+
+class TextCodec:
+    """Default mode: one text frame per event, plain strings sent as-is."""
+
+    subprotocol: str | None = None
+    batched = False
+
+    def encode(self, events: list[Event]) -> str | bytes:
+        (event,) = events
+        return event if isinstance(event, str) else json.dumps(event)
+
+
+class JsonBatchCodec(TextCodec):
+    """A JSON array of events per text frame.
+
+    Repeated keys across a batch compress well with permessage-deflate, which
+    uvicorn negotiates whenever the client offers it.
+    """
+
+    subprotocol = "notifications.json-batch.v1"
+    batched = True
+
+    def encode(self, events: list[Event]) -> str | bytes:
+        return json.dumps(events)
+
+
+class MsgpackBatchCodec(TextCodec):
+    """A MessagePack array of events per binary frame."""
+
+    subprotocol = "notifications.msgpack.v1"
+    batched = True
+
+    def encode(self, events: list[Event]) -> str | bytes:
+        return msgpack.packb(events)
+
+
+# In server preference order
+BATCH_CODECS = [MsgpackBatchCodec(), JsonBatchCodec()]
+TEXT_CODEC = TextCodec()
+
+
+def negotiate(requested: list[str]) -> TextCodec:
+    for codec in BATCH_CODECS:
+        if codec.subprotocol in requested:
+            return codec
+    return TEXT_CODEC
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+from contextlib import suppress
+
+from redis.exceptions import ResponseError
+
+from src.database import get_async_redis_storage
+from src.metrics import metrics
+
+from .routing import message_router
+from .stream import (
+    GROUP_NAME,
+    XREAD_TIMEOUT,
+    create_consumer_group,
+    stream_envelope,
+)
+from .utils import get_stream_key, get_worker_id, get_worker_stream_key
+
+logger = logging.getLogger(__name__)
+
+XREAD_BATCH_COUNT = 1000
+WAKEUP_STREAM_TTL = 3600
+
+
+class StreamDispatcher:
+    """Reads every locally connected user's notification stream in one loop.
+
+    Each worker is a single consumer (named after the worker) of the
+    notification group and issues one blocking XREADGROUP over the streams of
+    all users with an open socket here. Redis load therefore grows with
+    workers, not sockets.
+
+    The group hands each entry to exactly one worker, so the reading worker
+    routes it to every worker where the user has a socket (see
+    `MessageRouter`).
+
+    A per-worker wakeup stream is part of every read so that subscribing a new
+    user interrupts the blocking call instead of waiting for it to time out.
+
+    One missing group (Redis restarted or flushed, a stream trimmed away) fails
+    the whole read with NOGROUP, so after one every group is recreated before
+    reading again, each user's from the last entry this worker read from it.
+    """
+
+    def __init__(self, count: int = XREAD_BATCH_COUNT, block: int = XREAD_TIMEOUT):
+        self.count = count
+        self.block = block
+        self.consumer = get_worker_id()
+        self.wakeup_key = get_worker_stream_key(self.consumer)
+        self._streams: dict[str, str] = {}
+        self._last_ids: dict[str, str] = {}
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+        metrics.register_gauge("ws.dispatcher.streams", lambda: len(self._streams))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        metrics.unregister_gauge("ws.dispatcher.streams")
+
+        try:
+            await get_async_redis_storage().delete(self.wakeup_key)
+        except Exception as e:
+            logger.error(f"Error removing wakeup stream {self.wakeup_key}: {e}")
+
+    async def subscribe(self, user_id: str) -> None:
+        stream_key = get_stream_key(user_id)
+        if stream_key in self._streams:
+            return
+
+        await create_consumer_group(user_id)
+        self._streams[stream_key] = user_id
+        await self._wake()
+
+    def unsubscribe(self, user_id: str) -> None:
+        # Messages published meanwhile stay in the stream for the next reader
+        stream_key = get_stream_key(user_id)
+        self._streams.pop(stream_key, None)
+        self._last_ids.pop(stream_key, None)
+
+    async def _wake(self) -> None:
+        redis_client = get_async_redis_storage()
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.xadd(self.wakeup_key, {"wake": 1}, maxlen=10, approximate=False)
+                pipe.expire(self.wakeup_key, WAKEUP_STREAM_TTL)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error waking stream dispatcher: {e}")
+
+    async def _create_group(self, stream_key: str) -> None:
+        try:
+            await get_async_redis_storage().xgroup_create(
+                stream_key,
+                GROUP_NAME,
+                id=self._last_ids.get(stream_key, "$"),
+                mkstream=True,
+            )
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def _create_groups(self, missing: set[str]) -> None:
+        """Create the groups of `missing` streams, discarding each once it exists."""
+        for stream_key in list(missing):
+            if stream_key == self.wakeup_key or stream_key in self._streams:
+                await self._create_group(stream_key)
+            missing.discard(stream_key)
+
+    async def _run(self) -> None:
+        redis_client = get_async_redis_storage()
+        missing = {self.wakeup_key}
+
+        while True:
+            try:
+                await self._create_groups(missing)
+
+                streams = {self.wakeup_key: ">"}
+                streams.update((stream_key, ">") for stream_key in self._streams)
+                response = await redis_client.xreadgroup(
+                    GROUP_NAME,
+                    self.consumer,
+                    streams,
+                    count=self.count,
+                    block=self.block,
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error reading notification streams: {e}")
+                # NOGROUP; connection errors leave the groups as they were
+                if isinstance(e, ResponseError):
+                    missing.update([self.wakeup_key, *self._streams])
+                await asyncio.sleep(1)
+                continue
+
+            batch = []
+            for stream_key, messages in response or []:
+                if stream_key == self.wakeup_key:
+                    await redis_client.xack(
+                        stream_key,
+                        GROUP_NAME,
+                        *(message_id for message_id, _ in messages),
+                    )
+                    continue
+
+                user_id = self._streams.get(stream_key)
+                if user_id is None:
+                    continue
+
+                self._last_ids[stream_key] = messages[-1][0]
+
+                batch.extend(
+                    (
+                        user_id,
+                        stream_envelope(message_id, message_data.get("message", "")),
+                        message_data.get("key"),
+                    )
+                    for message_id, message_data in messages
+                )
+
+            if not batch:
+                continue
+
+            metrics.incr("ws.dispatcher.messages", len(batch))
+            try:
+                await message_router.deliver_many(batch)
+            except Exception as e:
+                logger.error(f"Error routing {len(batch)} notifications: {e}")
+
+
+dispatcher = StreamDispatcher()
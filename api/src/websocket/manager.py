@@ -1,32 +1,281 @@
 import asyncio
-from fastapi import WebSocket
+import logging
+import time
+from collections import deque
+from contextlib import suppress
+from typing import Callable
 
-from typing import List, Dict
+from fastapi import WebSocket, status
+
+from config.env_vars import get_websocket_options
+from src.metrics import metrics
+
+from .codecs import Event, TextCodec, negotiate
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "coalesce")
+CLOSE_TIMEOUT = 1
+
+
+class Connection:
+    """One socket with its own bounded outbound queue and writer task.
+
+    `enqueue` never waits: when the queue is full the overflow policy decides
+    what is lost. `coalesce` replaces the queued message with the same key (the
+    newest reading about a device/metric wins) and falls back to dropping the
+    oldest one. Sockets that lose more than `max_dropped` messages before
+    their writer drains the queue again, or stall a send past `send_timeout`,
+    are evicted with 1013 so they reconnect and catch up.
+
+    With a batching codec the writer waits up to `batch_window` seconds after
+    the first event and sends up to `max_batch_size` queued events as one
+    frame.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user_id: str,
+        max_queue_size: int,
+        overflow_policy: str,
+        send_timeout: float,
+        max_dropped: int,
+        on_evict: Callable[["Connection"], None],
+        codec: TextCodec,
+        batch_window: float = 0.025,
+        max_batch_size: int = 100,
+    ):
+        self.websocket = websocket
+        self.codec = codec
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.user_id = user_id
+        self.max_queue_size = max_queue_size
+        self.overflow_policy = overflow_policy
+        self.send_timeout = send_timeout
+        self.max_dropped = max_dropped
+        # Messages lost since the queue was last empty; coalescing loses none
+        self.dropped = 0
+        self.closed = False
+        self.evicted = False
+        self._on_evict = on_evict
+        self._queue: deque[tuple[str | None, Event]] = deque()
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._task = asyncio.create_task(self._write())
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def enqueue(self, message: Event, key: str | None = None) -> None:
+        if self.closed:
+            return
+
+        if len(self._queue) < self.max_queue_size:
+            self._queue.append((key, message))
+            self._ready.set()
+            return
+
+        if self.overflow_policy == "coalesce" and self._replace(key, message):
+            metrics.incr("ws.coalesced")
+            return
+
+        if self.overflow_policy != "drop_newest":
+            self._queue.popleft()
+            self._queue.append((key, message))
+        self.dropped += 1
+        metrics.incr("ws.dropped")
+
+        if self.dropped > self.max_dropped:
+            self.evict("too many dropped messages")
+
+    async def put(self, message: Event, key: str | None = None) -> bool:
+        """Queue a message, waiting for room instead of applying the policy.
+
+        For bulk sends such as backlog replay; returns False once the socket
+        is closed.
+        """
+        while not self.closed:
+            if len(self._queue) < self.max_queue_size:
+                self._queue.append((key, message))
+                self._ready.set()
+                return True
+
+            self._space.clear()
+            await self._space.wait()
+
+        return False
+
+    def _replace(self, key: str | None, message: Event) -> bool:
+        if key is None:
+            return False
+
+        for index in range(len(self._queue) - 1, -1, -1):
+            if self._queue[index][0] == key:
+                self._queue[index] = (key, message)
+                return True
+        return False
+
+    def evict(self, reason: str) -> None:
+        if self.closed:
+            return
+
+        logger.info(f"Evicting slow socket of user {self.user_id}: {reason}")
+        metrics.incr("ws.evicted")
+        self.closed = True
+        self.evicted = True
+        self._queue.clear()
+        self._ready.set()
+        self._space.set()
+        self._on_evict(self)
+
+    async def stop(self) -> None:
+        self.closed = True
+        self._space.set()
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+
+    async def _write(self) -> None:
+        while not self.closed:
+            if not self._queue:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+
+            events = [self._queue.popleft()[1]]
+            if self.codec.batched:
+                if len(self._queue) + 1 < self.max_batch_size:
+                    await asyncio.sleep(self.batch_window)
+                    if self.closed:
+                        break
+                while self._queue and len(events) < self.max_batch_size:
+                    events.append(self._queue.popleft()[1])
+            self._space.set()
+            if not self._queue:
+                # Caught up: earlier overflows no longer count towards eviction
+                self.dropped = 0
+
+            frame = self.codec.encode(events)
+            start = time.perf_counter()
+            try:
+                async with asyncio.timeout(self.send_timeout):
+                    if isinstance(frame, bytes):
+                        await self.websocket.send_bytes(frame)
+                    else:
+                        await self.websocket.send_text(frame)
+            except TimeoutError:
+                self.evict("send timed out")
+                break
+            except Exception as e:
+                logger.info(f"Stopped writing to socket of user {self.user_id}: {e}")
+                self.closed = True
+                self._space.set()
+                return
+
+            metrics.observe("ws.send", time.perf_counter() - start)
+            metrics.incr("ws.frames")
+            metrics.incr("ws.events", len(events))
+            # Bytes on the wire: text frames go out as UTF-8
+            size = len(frame) if isinstance(frame, bytes) else len(frame.encode())
+            metrics.incr("ws.frame_bytes", size)
+
+        if self.evicted:
+            with suppress(Exception):
+                async with asyncio.timeout(CLOSE_TIMEOUT):
+                    await self.websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
 
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, List[WebSocket]] = {}
-        self.lock = asyncio.Lock()
+    def __init__(
+        self,
+        max_queue_size: int = 100,
+        overflow_policy: str = "coalesce",
+        send_timeout: float = 5,
+        max_dropped: int = 1000,
+        batch_window: float = 0.025,
+        max_batch_size: int = 100,
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown websocket overflow policy: {overflow_policy}")
+
+        self.max_queue_size = max_queue_size
+        self.overflow_policy = overflow_policy
+        self.send_timeout = send_timeout
+        self.max_dropped = max_dropped
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        # Connection tuples are replaced, never mutated, so notify_user can
+        # iterate a user's sockets without holding a lock.
+        self.active_connections: dict[str, tuple[Connection, ...]] = {}
 
-    async def connect(self, websocket: WebSocket, user_id: str) -> None:
-        await websocket.accept()
-        async with self.lock:
-            self.active_connections[user_id].append(websocket)
+    async def accept(
+        self,
+        websocket: WebSocket,
+        user_id: str,
+        on_evict: Callable[[Connection], None],
+    ) -> Connection:
+        """Accept a socket with this manager's queue settings, unregistered."""
+        # Clients opt into batched frames through Sec-WebSocket-Protocol
+        codec = negotiate(websocket.scope.get("subprotocols", []))
+        await websocket.accept(subprotocol=codec.subprotocol)
+        return Connection(
+            websocket,
+            user_id,
+            self.max_queue_size,
+            self.overflow_policy,
+            self.send_timeout,
+            self.max_dropped,
+            on_evict=on_evict,
+            codec=codec,
+            batch_window=self.batch_window,
+            max_batch_size=self.max_batch_size,
+        )
 
-        return
+    async def connect(self, websocket: WebSocket, user_id: str) -> Connection:
+        connection = await self.accept(websocket, user_id, on_evict=self._remove)
+        connections = self.active_connections.get(user_id, ())
+        self.active_connections[user_id] = connections + (connection,)
+        return connection
 
     async def disconnect(self, user_id: str, websocket: WebSocket) -> None:
-        async with self.lock:
-            if websocket in self.active_connections.get(user_id, []):
-                self.active_connections[user_id].remove(websocket)
-                if not self.active_connections[user_id]:
-                    del self.active_connections[user_id]
+        for connection in self.active_connections.get(user_id, ()):
+            if connection.websocket is websocket:
+                self._remove(connection)
+                await connection.stop()
+                return
+
+    def _remove(self, connection: Connection) -> None:
+        remaining = tuple(
+            other
+            for other in self.active_connections.get(connection.user_id, ())
+            if other is not connection
+        )
+        if remaining:
+            self.active_connections[connection.user_id] = remaining
+        else:
+            self.active_connections.pop(connection.user_id, None)
+
+    def notify_user(self, message: Event, user_id: str, key: str | None = None) -> None:
+        for connection in self.active_connections.get(user_id, ()):
+            connection.enqueue(message, key)
+
+    def connection_count(self) -> int:
+        return sum(len(connections) for connections in self._snapshot())
+
+    def queue_depth(self) -> int:
+        return sum(
+            len(connection)
+            for connections in self._snapshot()
+            for connection in connections
+        )
 
-    async def notify_user(self, message: str, user_id: str):
-        async with self.lock:
-            for connection in self.active_connections.get(user_id, []):
-                await connection.send_text(message)
+    def _snapshot(self) -> tuple[tuple[Connection, ...], ...]:
+        # Gauges are read from the metrics endpoint's thread
+        return tuple(self.active_connections.values())
 
 
-manager = ConnectionManager()
+manager = ConnectionManager(**get_websocket_options())
+metrics.register_gauge("ws.connections", manager.connection_count)
+metrics.register_gauge("ws.send_queue_depth", manager.queue_depth)
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import time
+from contextlib import suppress
+
+from config.env_vars import get_presence_options
+from src.database import get_async_redis_storage
+from src.metrics import metrics
+
+from .utils import get_presence_key, get_worker_id
+
+logger = logging.getLogger(__name__)
+
+
+class PresenceRegistry:
+    """Which workers hold sockets for which users, shared through Redis.
+
+    Every user has a sorted set of worker ids scored by the time the entry
+    expires. A worker refreshes the entries of its connected users every
+    `heartbeat` seconds, so one that dies without cleaning up stops receiving
+    traffic after at most `ttl` seconds.
+    """
+
+    def __init__(self, worker_id: str, ttl: float = 30, heartbeat: float = 10):
+        self.worker_id = worker_id
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self._users: set[str] = set()
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._refresh_loop())
+        metrics.register_gauge("ws.presence.users", lambda: len(self._users))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        metrics.unregister_gauge("ws.presence.users")
+
+        users, self._users = self._users, set()
+        try:
+            async with get_async_redis_storage().pipeline(transaction=False) as pipe:
+                for user_id in users:
+                    pipe.zrem(get_presence_key(user_id), self.worker_id)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error removing presence of worker {self.worker_id}: {e}")
+
+    async def add(self, user_id: str) -> None:
+        self._users.add(user_id)
+        async with get_async_redis_storage().pipeline(transaction=False) as pipe:
+            self._mark(pipe, user_id, time.time())
+            await pipe.execute()
+
+    async def remove(self, user_id: str) -> None:
+        self._users.discard(user_id)
+        await get_async_redis_storage().zrem(get_presence_key(user_id), self.worker_id)
+
+    async def workers_for(self, user_ids: list[str]) -> dict[str, list[str]]:
+        """Live worker ids per user, in one pipelined round-trip."""
+        now = time.time()
+        async with get_async_redis_storage().pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.zrangebyscore(get_presence_key(user_id), now, "+inf")
+            workers = await pipe.execute()
+
+        return dict(zip(user_ids, workers))
+
+    def _mark(self, pipe, user_id: str, now: float) -> None:
+        presence_key = get_presence_key(user_id)
+        pipe.zadd(presence_key, {self.worker_id: now + self.ttl})
+        pipe.zremrangebyscore(presence_key, "-inf", now)
+        pipe.expire(presence_key, int(self.ttl) + 1)
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            try:
+                now = time.time()
+                async with get_async_redis_storage().pipeline(
+                    transaction=False
+                ) as pipe:
+                    for user_id in list(self._users):
+                        self._mark(pipe, user_id, now)
+                    await pipe.execute()
+            except Exception as e:
+                logger.error(f"Error refreshing presence: {e}")
+
+
+presence = PresenceRegistry(get_worker_id(), **get_presence_options())
@@ -1,56 +1,202 @@
-import logging
 import asyncio
-from fastapi import APIRouter, WebSocket, Request, WebSocketDisconnect, status
+import json
+import logging
+import re
+from typing import Optional
+
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect, status
+from pymongo.asynchronous.database import AsyncDatabase
 
+from config.env_vars import get_telemetry_subscription_options
+from src.devices.cache import get_devices
+from src.devices.indexes import DEVICES_COLLECTION
+from src.schemas import DatabaseDep
 from src.websocket.stream import (
-    create_consumer_group,
-    get_pending_messages,
-    listen_to_stream,
+    STREAM_ID_PATTERN,
+    acknowledge_messages,
+    claim_idle_messages,
     publish_to_stream,
+    replay_pending,
+    stream_envelope,
 )
-from .manager import manager
+from .dispatcher import dispatcher
+from .manager import Connection, manager
+from .presence import presence
+from .telemetry import TelemetrySubscription, telemetry_hub
 
 router = APIRouter(prefix="/ws", tags=["websocket"])
 
 logger = logging.getLogger(__name__)
 
+STREAM_ID_REGEX = re.compile(STREAM_ID_PATTERN)
+
+
+async def disconnect(user_id: str, websocket: WebSocket) -> None:
+    await manager.disconnect(user_id, websocket)
+    if user_id in manager.active_connections:
+        return
+
+    # Last socket of this user on this worker
+    dispatcher.unsubscribe(user_id)
+    try:
+        await presence.remove(user_id)
+    except Exception as e:
+        logger.error(f"Failed to remove presence of user {user_id}: {e}")
+
+
+async def replay_backlog(
+    connection: Connection, user_id: str, last_id: Optional[str]
+) -> None:
+    """Send every notification still pending for this user, oldest first."""
+    try:
+        claimed = await claim_idle_messages(user_id, dispatcher.consumer)
+        if claimed:
+            logger.info(f"Claimed {claimed} idle notifications for user {user_id}")
+
+        async for entries in replay_pending(user_id, dispatcher.consumer, last_id):
+            for message_id, message_data in entries:
+                sent = await connection.put(
+                    stream_envelope(message_id, message_data.get("message", "")),
+                    message_data.get("key"),
+                )
+                if not sent:
+                    return
+    except Exception as e:
+        logger.error(f"Failed to replay pending messages: {e}")
+
+
+def acked_ids(data: str) -> list[str] | None:
+    """Message ids from an `{"ack": [...]}` frame, None for anything else.
+
+    Ids that are not stream ids are left out, like `/devices/ack` rejects
+    them, since one of them would fail the whole XACK.
+    """
+    try:
+        frame = json.loads(data)
+    except ValueError:
+        return None
+
+    if not isinstance(frame, dict) or not isinstance(frame.get("ack"), list):
+        return None
+    return [
+        message_id
+        for message_id in map(str, frame["ack"])
+        if STREAM_ID_REGEX.match(message_id)
+    ]
+
+
+def subscription_frame(data: str) -> tuple[str, list[str]] | None:
+    """(action, device ids) from a `{"subscribe": [...]}` or `{"unsubscribe": [...]}`
+    frame, None for anything else."""
+    try:
+        frame = json.loads(data)
+    except ValueError:
+        return None
+
+    if not isinstance(frame, dict):
+        return None
+    for action in ("subscribe", "unsubscribe"):
+        if isinstance(frame.get(action), list):
+            return action, [str(device_id) for device_id in frame[action]]
+    return None
+
+
+async def owned_device_ids(
+    db: AsyncDatabase, user_id: str, device_ids: list[str]
+) -> list[str]:
+    devices = await get_devices(db.get_collection(DEVICES_COLLECTION), device_ids)
+    return [
+        device_id
+        for device_id, device in devices.items()
+        if device["user_id"] == user_id
+    ]
+
 
 @router.websocket("/notification")
-async def websocket_endpoint(websocket: WebSocket, request: Request):
-    user_id = request.state.user_id
+async def websocket_endpoint(
+    websocket: WebSocket,
+    last_id: Optional[str] = Query(None, pattern=STREAM_ID_PATTERN),
+):
+    user_id = websocket.state.user_id
 
-    await manager.connect(websocket, user_id)
+    connection = await manager.connect(websocket, user_id)
 
     try:
-        await create_consumer_group(user_id)
+        await presence.add(user_id)
+        await dispatcher.subscribe(user_id)
 
     except Exception:
-        logger.error("Failed to create consumer group")
+        logger.error("Failed to subscribe to notification stream")
+        await disconnect(user_id, websocket)
         await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
         return
 
+    replay = asyncio.create_task(replay_backlog(connection, user_id, last_id))
+
     try:
-        pending_messages = await get_pending_messages(user_id)
-        if pending_messages:
-            logger.info(f"Sending pending messages to user {pending_messages}")
-            for msg in pending_messages[0][1]:
-                message = msg[1].get(b"message", b"").decode("utf-8")
-                await websocket.send_text(message)
+        while True:
+            data = await websocket.receive_text()
+            message_ids = acked_ids(data)
+            if message_ids is not None:
+                await acknowledge_messages(user_id, message_ids)
+                continue
 
+            # Echo back or handle client messages.
+            await publish_to_stream(user_id, f"[Echo] {data}")
+    except WebSocketDisconnect as e:
+        logger.info("WebSocket disconnected: %s", e)
     except Exception as e:
-        logger.error(f"Failed to read pending messages: {e}")
+        logger.error("Unexpected error on WebSocket connection: %s", e)
+    finally:
+        replay.cancel()
+        await disconnect(user_id, websocket)
+
+
+@router.websocket("/telemetry")
+async def telemetry_endpoint(
+    websocket: WebSocket,
+    db: DatabaseDep,
+    interval_ms: Optional[int] = Query(None, ge=0, le=60000),
+):
+    """Live heartbeats of the devices the client subscribes to.
 
-    listener_task = asyncio.create_task(listen_to_stream(user_id, websocket))
+    Clients send `{"subscribe": [device ids]}` / `{"unsubscribe": [...]}` and
+    get back the full set they are subscribed to; each device then pushes at
+    most once every `interval_ms`.
+    """
+    user_id = websocket.state.user_id
+    options = get_telemetry_subscription_options()
+    interval = options["interval"] if interval_ms is None else interval_ms / 1000
+
+    # Evicted sockets are cleaned up once the receive loop below ends
+    connection = await manager.accept(websocket, user_id, on_evict=lambda _: None)
+    subscription = TelemetrySubscription(connection, interval)
 
     try:
         while True:
             data = await websocket.receive_text()
-            # Echo back or handle client messages.
-            await publish_to_stream(user_id, f"[Echo] {data}")
+            frame = subscription_frame(data)
+            if frame is None:
+                connection.enqueue({"error": "Unknown frame"})
+                continue
+
+            action, device_ids = frame
+            if action == "unsubscribe":
+                await telemetry_hub.unsubscribe(subscription, device_ids)
+            else:
+                device_ids = await owned_device_ids(db, user_id, device_ids)
+                if len(subscription.devices | set(device_ids)) > options["max_devices"]:
+                    connection.enqueue(
+                        {"error": f"At most {options['max_devices']} devices"}
+                    )
+                    continue
+                await telemetry_hub.subscribe(subscription, device_ids)
+
+            connection.enqueue({"subscribed": sorted(subscription.devices)})
     except WebSocketDisconnect as e:
         logger.info("WebSocket disconnected: %s", e)
     except Exception as e:
         logger.error("Unexpected error on WebSocket connection: %s", e)
     finally:
-        await manager.disconnect(user_id, websocket)
-        listener_task.cancel()
+        await telemetry_hub.close(subscription)
+        await connection.stop()
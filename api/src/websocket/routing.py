@@ -0,0 +1,84 @@
+import asyncio
+import json
+import logging
+from contextlib import suppress
+
+from src.database import get_async_redis_storage
+from src.metrics import metrics
+
+from .manager import ConnectionManager, manager
+from .presence import PresenceRegistry, presence
+from .utils import get_worker_channel
+
+logger = logging.getLogger(__name__)
+
+
+class MessageRouter:
+    """Delivers messages to a user's sockets on whichever workers hold them.
+
+    Sockets on this worker are notified directly. Messages for users that
+    the presence registry places on other workers are batched into one
+    PUBLISH per worker on that worker's delivery channel, which its own
+    router listens to.
+    """
+
+    def __init__(self, presence: PresenceRegistry, manager: ConnectionManager):
+        self.presence = presence
+        self.manager = manager
+        self.worker_id = presence.worker_id
+        self.channel = get_worker_channel(self.worker_id)
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def deliver(self, user_id: str, message: str, key: str | None = None):
+        await self.deliver_many([(user_id, message, key)])
+
+    async def deliver_many(self, messages: list[tuple[str, str, str | None]]) -> None:
+        user_ids = list({user_id for user_id, _, _ in messages})
+        workers = await self.presence.workers_for(user_ids)
+
+        remote: dict[str, list[tuple[str, str, str | None]]] = {}
+        for user_id, message, key in messages:
+            self.manager.notify_user(message, user_id, key)
+            for worker_id in workers.get(user_id, ()):
+                if worker_id != self.worker_id:
+                    remote.setdefault(worker_id, []).append((user_id, message, key))
+
+        if not remote:
+            return
+
+        async with get_async_redis_storage().pipeline(transaction=False) as pipe:
+            for worker_id, batch in remote.items():
+                pipe.publish(get_worker_channel(worker_id), json.dumps(batch))
+            await pipe.execute()
+        metrics.incr("ws.routed_messages", sum(len(batch) for batch in remote.values()))
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with get_async_redis_storage().pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    async for event in pubsub.listen():
+                        if event["type"] != "message":
+                            continue
+                        for user_id, message, key in json.loads(event["data"]):
+                            self.manager.notify_user(message, user_id, key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error listening on {self.channel}: {e}")
+                await asyncio.sleep(1)
+
+
+message_router = MessageRouter(presence, manager)
@@ -1,5 +1,5 @@
-import asyncio
 import logging
+from typing import AsyncIterator
 
 from src.database import get_async_redis_storage
 
@@ -10,14 +10,22 @@ logger = logging.getLogger(__name__)
 GROUP_NAME = get_consumer_group()
 MAX_STREAM_LENGTH = 1000
 XREAD_TIMEOUT = 5000
-XREAD_COUNT = 1
+REPLAY_BATCH_COUNT = 500
+ACK_BATCH_SIZE = 1000
+# Pending entries untouched for this long belong to a consumer that is gone
+CLAIM_MIN_IDLE_MS = 60000
+STREAM_ID_PATTERN = r"^\d+(-\d+)?$"
 
-redis_client = get_async_redis_storage()
 
+def stream_payload(message: str, key: str | None = None) -> dict:
+    # `key` lets slow sockets coalesce queued messages about the same thing
+    return {"message": message} if key is None else {"message": message, "key": key}
 
-async def publish_to_stream(user_id: str, message: str):
+
+async def publish_to_stream(user_id: str, message: str, key: str | None = None):
+    redis_client = get_async_redis_storage()
     stream_key = get_stream_key(user_id)
-    payload = {"message": message}
+    payload = stream_payload(message, key)
 
     try:
         msg_id = await redis_client.xadd(
@@ -27,7 +35,26 @@ async def publish_to_stream(user_id: str, message: str):
         logger.error(f"Error publishing to stream {stream_key}: {e}")
 
 
+async def publish_many_to_stream(messages: list[tuple[str, str, str | None]]):
+    """Publish (user_id, message, key) entries in a single pipelined round-trip."""
+    redis_client = get_async_redis_storage()
+
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for user_id, message, key in messages:
+                pipe.xadd(
+                    get_stream_key(user_id),
+                    stream_payload(message, key),
+                    maxlen=MAX_STREAM_LENGTH,
+                    approximate=True,
+                )
+            await pipe.execute()
+    except Exception as e:
+        logger.error(f"Error publishing {len(messages)} messages to streams: {e}")
+
+
 async def create_consumer_group(user_id: str):
+    redis_client = get_async_redis_storage()
     stream_key = get_stream_key(user_id)
 
     try:
@@ -39,55 +66,97 @@ async def create_consumer_group(user_id: str):
             logger.error(f"Error creating consumer group for {stream_key}: {e}")
 
 
-async def get_pending_messages(user_id: str):
+def stream_id(message_id: str) -> tuple[int, int]:
+    milliseconds, _, sequence = message_id.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+
+def stream_envelope(message_id: str, message: str) -> dict:
+    """What a socket receives for a stream entry; the id is what clients ack."""
+    return {"id": message_id, "message": message}
+
+
+async def claim_idle_messages(user_id: str, consumer_name: str) -> int:
+    """Take over entries left pending by consumers that went away.
+
+    Walks the whole pending list with XAUTOCLAIM, moving entries idle for at
+    least `CLAIM_MIN_IDLE_MS` to `consumer_name` so they are replayed to it.
+    """
+    redis_client = get_async_redis_storage()
     stream_key = get_stream_key(user_id)
-    consumer_name = user_id
 
-    try:
-        pending_messages = await redis_client.xreadgroup(
-            GROUP_NAME, consumer_name, {stream_key: "0"}, count=XREAD_COUNT, block=0
+    claimed = 0
+    start_id = "0-0"
+    while True:
+        start_id, messages, *_ = await redis_client.xautoclaim(
+            stream_key,
+            GROUP_NAME,
+            consumer_name,
+            CLAIM_MIN_IDLE_MS,
+            start_id=start_id,
+            count=REPLAY_BATCH_COUNT,
         )
-        if pending_messages:
-            for _stream, messages in pending_messages:
-                logger.info(f"Pending messages for {user_id}: {messages}")
+        claimed += len(messages)
+        if start_id == "0-0":
+            return claimed
 
-        return pending_messages
-    except Exception as e:
-        logger.error(f"Error reading pending messages from {stream_key}: {e}")
-        return []
 
+async def replay_pending(
+    user_id: str, consumer_name: str, last_id: str | None = None
+) -> AsyncIterator[list[tuple[str, dict]]]:
+    """Page through the consumer's pending entries, oldest first.
 
-async def listen_to_stream(user_id: str, websocket):
+    Entries up to `last_id` (the last one the client reports having seen)
+    and entries already trimmed from the stream are acknowledged instead of
+    yielded.
+    """
+    redis_client = get_async_redis_storage()
     stream_key = get_stream_key(user_id)
-    consumer_name = user_id
+    seen_up_to = stream_id(last_id) if last_id else None
 
+    cursor = "0"
     while True:
-        try:
-            new_message = await redis_client.xreadgroup(
-                GROUP_NAME,
-                consumer_name,
-                {stream_key: ">"},
-                count=XREAD_COUNT,
-                block=XREAD_TIMEOUT,
-            )
-
-            if new_message:
-                for _stream, messages in new_message:
-                    for message_id, message_data in messages:
-                        message = message_data.get(b"message", b"").decode("utf-8")
-                        logger.info(f"Sending message to {user_id}: {message}")
-                        await websocket.send_text(message)
+        response = await redis_client.xreadgroup(
+            GROUP_NAME, consumer_name, {stream_key: cursor}, count=REPLAY_BATCH_COUNT
+        )
+        entries = response[0][1] if response else []
+        if not entries:
+            return
+        cursor = entries[-1][0]
+
+        pending, done = [], []
+        for message_id, message_data in entries:
+            if not message_data or (
+                seen_up_to is not None and stream_id(message_id) <= seen_up_to
+            ):
+                done.append(message_id)
             else:
-                await asyncio.sleep(1)
-        except Exception as e:
-            logger.error(f"Error listening to stream {stream_key}: {e}")
-            await asyncio.sleep(1)
+                pending.append((message_id, message_data))
 
+        if done:
+            await acknowledge_messages(user_id, done)
+        if pending:
+            yield pending
 
-async def acknowledge_message(user_id: str, message_id: str):
+
+async def acknowledge_messages(user_id: str, message_ids: list[str]) -> int:
+    """XACK many ids at once; returns how many were still pending."""
+    if not message_ids:
+        return 0
+
+    redis_client = get_async_redis_storage()
     stream_key = get_stream_key(user_id)
     try:
-        if message_id:
-            await redis_client.xack(stream_key, GROUP_NAME, message_id)
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for start in range(0, len(message_ids), ACK_BATCH_SIZE):
+                pipe.xack(
+                    stream_key, GROUP_NAME, *message_ids[start : start + ACK_BATCH_SIZE]
+                )
+            acknowledged = await pipe.execute()
     except Exception as e:
-        logger.error(f"Error acknowledging message {message_id} in {stream_key}: {e}")
+        logger.error(
+            f"Error acknowledging {len(message_ids)} messages in {stream_key}: {e}"
+        )
+        return 0
+
+    return sum(acknowledged)
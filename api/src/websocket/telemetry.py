@@ -0,0 +1,198 @@
+import asyncio
+import json
+import logging
+from contextlib import suppress
+
+from src.database import get_async_redis_storage
+from src.metrics import metrics
+
+from .manager import Connection
+from .utils import get_device_channel
+
+logger = logging.getLogger(__name__)
+
+GET_MESSAGE_TIMEOUT = 1
+
+
+async def publish_telemetry(events: list[dict]) -> None:
+    """Fan heartbeats out to live subscribers, one pipelined round-trip.
+
+    Pub/sub is fire-and-forget: a heartbeat nobody is watching costs one
+    PUBLISH and is never stored, the telemetry collection stays the record.
+    """
+    if not events:
+        return
+
+    async with get_async_redis_storage().pipeline(transaction=False) as pipe:
+        for event in events:
+            pipe.publish(get_device_channel(event["device_id"]), json.dumps(event))
+        await pipe.execute()
+
+
+class TelemetrySubscription:
+    """The devices one socket watches, throttled per device.
+
+    A device pushes at most once every `interval` seconds; readings arriving
+    in between replace each other and the newest is sent when the interval
+    ends, so a slow subscriber sees a downsampled but current series.
+    """
+
+    def __init__(self, connection: Connection, interval: float):
+        self.connection = connection
+        self.interval = interval
+        self.devices: set[str] = set()
+        self._last_sent: dict[str, float] = {}
+        self._pending: dict[str, dict | str] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+
+    def push(self, device_id: str, event: dict | str) -> None:
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        wait = self._last_sent.get(device_id, now - self.interval) + self.interval
+        wait -= now
+        if wait <= 0:
+            self._send(device_id, event, now)
+            return
+
+        metrics.incr("ws.telemetry.throttled")
+        self._pending[device_id] = event
+        if device_id not in self._timers:
+            self._timers[device_id] = loop.call_later(wait, self._flush, device_id)
+
+    def discard(self, device_id: str) -> None:
+        self.devices.discard(device_id)
+        self._last_sent.pop(device_id, None)
+        self._pending.pop(device_id, None)
+        timer = self._timers.pop(device_id, None)
+        if timer is not None:
+            timer.cancel()
+
+    def close(self) -> None:
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        self._pending.clear()
+
+    def _flush(self, device_id: str) -> None:
+        self._timers.pop(device_id, None)
+        event = self._pending.pop(device_id, None)
+        if event is not None:
+            self._send(device_id, event, asyncio.get_running_loop().time())
+
+    def _send(self, device_id: str, event: dict | str, now: float) -> None:
+        self._last_sent[device_id] = now
+        self.connection.enqueue(event, f"telemetry:{device_id}")
+        metrics.incr("ws.telemetry.pushed")
+
+
+class TelemetryHub:
+    """Routes device channels to the subscriptions of this worker.
+
+    The worker holds one pub/sub connection and is subscribed to a device's
+    channel only while at least one of its sockets watches that device.
+    """
+
+    def __init__(self):
+        self.subscribers: dict[str, set[TelemetrySubscription]] = {}
+        self._pubsub = None
+        self._subscribed = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._listen())
+        metrics.register_gauge("ws.telemetry.devices", lambda: len(self.subscribers))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        metrics.unregister_gauge("ws.telemetry.devices")
+
+    async def subscribe(
+        self, subscription: TelemetrySubscription, device_ids: list[str]
+    ) -> None:
+        channels = []
+        for device_id in device_ids:
+            subscription.devices.add(device_id)
+            if device_id not in self.subscribers:
+                self.subscribers[device_id] = set()
+                channels.append(get_device_channel(device_id))
+            self.subscribers[device_id].add(subscription)
+
+        if channels and self._pubsub is not None:
+            await self._pubsub.subscribe(*channels)
+            self._subscribed.set()
+
+    async def unsubscribe(
+        self, subscription: TelemetrySubscription, device_ids: list[str]
+    ) -> None:
+        channels = []
+        for device_id in device_ids:
+            subscription.discard(device_id)
+            subscriptions = self.subscribers.get(device_id)
+            if subscriptions is None:
+                continue
+
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self.subscribers[device_id]
+                channels.append(get_device_channel(device_id))
+
+        if channels and self._pubsub is not None:
+            await self._pubsub.unsubscribe(*channels)
+
+    async def close(self, subscription: TelemetrySubscription) -> None:
+        await self.unsubscribe(subscription, list(subscription.devices))
+        subscription.close()
+
+    def _dispatch(self, channel: str, data: str) -> None:
+        device_id = channel.split(":")[-2]
+        event = None
+        for subscription in self.subscribers.get(device_id, ()):
+            if subscription.connection.codec.batched:
+                # Batching codecs encode whole frames, so they need the dict
+                if event is None:
+                    event = json.loads(data)
+                subscription.push(device_id, event)
+            else:
+                subscription.push(device_id, data)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with get_async_redis_storage().pubsub() as pubsub:
+                    # Published first so no subscribe made meanwhile is lost
+                    self._pubsub = pubsub
+                    try:
+                        await self._receive(pubsub)
+                    finally:
+                        self._pubsub = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error listening for device telemetry: {e}")
+                await asyncio.sleep(1)
+
+    async def _receive(self, pubsub) -> None:
+        channels = [get_device_channel(device_id) for device_id in self.subscribers]
+        if channels:
+            await pubsub.subscribe(*channels)
+
+        while True:
+            if not pubsub.subscribed:
+                self._subscribed.clear()
+                await self._subscribed.wait()
+                continue
+
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=GET_MESSAGE_TIMEOUT
+            )
+            if message is not None and message["type"] == "message":
+                self._dispatch(message["channel"], message["data"])
+
+
+telemetry_hub = TelemetryHub()
@@ -1,3 +1,6 @@
+import os
+import socket
+
 from config.env_vars import get_enviroment
 
 
@@ -11,3 +14,27 @@ def get_consumer_group() -> str:
     env = get_enviroment()
     group_sufix = "notification_group"
     return f"{env}:{group_sufix}"
+
+
+def get_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def get_worker_stream_key(worker_id: str) -> str:
+    env = get_enviroment()
+    return f"{env}:worker:{worker_id}:wakeup"
+
+
+def get_presence_key(user_id: str) -> str:
+    env = get_enviroment()
+    return f"{env}:{user_id}:presence"
+
+
+def get_worker_channel(worker_id: str) -> str:
+    env = get_enviroment()
+    return f"{env}:worker:{worker_id}:deliver"
+
+
+def get_device_channel(device_id: str) -> str:
+    env = get_enviroment()
+    return f"{env}:device:{device_id}:telemetry"
@@ -0,0 +1,108 @@
+import random
+from collections import Counter
+
+from src.notifications.alerts import (
+    Violation,
+    compile_rules,
+    evaluate,
+    evaluate_batch,
+)
+
+METRICS = ["cpu_usage", "ram_usage", "free_disk", "temperature", "latency"]
+
+
+def scalar(heartbeats: list, rules_by_user: dict) -> Counter:
+    return Counter(
+        (device_id, user_id, violation)
+        for device_id, user_id, status in heartbeats
+        for violation in evaluate(rules_by_user[user_id], status)
+    )
+
+
+def test_batch_matches_scalar_on_mixed_rules():
+    rules_by_user = {
+        "user-1": compile_rules(
+            [
+                {
+                    "_id": "config-1",
+                    "threshHold": {
+                        "watch_keys": ["cpu_usage", "free_disk"],
+                        "cpu_usage": 80,
+                        "free_disk": 10,
+                    },
+                },
+                # Second rule on the same metric lands in another slot
+                {
+                    "_id": "config-2",
+                    "threshHold": {"watch_keys": ["cpu_usage"], "cpu_usage": 90},
+                },
+            ]
+        ),
+        # Watched but without a threshold: never violates
+        "user-2": compile_rules(
+            [{"_id": "config-3", "threshHold": {"watch_keys": ["temperature"]}}]
+        ),
+        "user-3": compile_rules(
+            [
+                {
+                    "_id": "config-4",
+                    "threshHold": {"watch_keys": ["temperature"], "temperature": 70},
+                }
+            ]
+        ),
+    }
+    heartbeats = [
+        ("device-1", "user-1", {"cpu_usage": 95, "free_disk": 5}),
+        ("device-2", "user-1", {"cpu_usage": 85, "free_disk": 50}),
+        # Equal to the threshold is not exceeded, in either direction
+        ("device-3", "user-1", {"cpu_usage": 80, "free_disk": 10}),
+        ("device-4", "user-2", {"temperature": 99}),
+        # Partial heartbeat: missing readings never violate
+        ("device-5", "user-3", {"cpu_usage": 99}),
+        ("device-6", "user-3", {"temperature": 71.5}),
+    ]
+
+    violations = evaluate_batch(heartbeats, rules_by_user)
+
+    assert Counter(violations) == scalar(heartbeats, rules_by_user)
+    assert sorted(violations, key=lambda violation: violation[0]) == [
+        ("device-1", "user-1", Violation("config-1", "cpu_usage", 95, 80)),
+        ("device-1", "user-1", Violation("config-2", "cpu_usage", 95, 90)),
+        ("device-1", "user-1", Violation("config-1", "free_disk", 5, 10)),
+        ("device-2", "user-1", Violation("config-1", "cpu_usage", 85, 80)),
+        ("device-6", "user-3", Violation("config-4", "temperature", 71.5, 70)),
+    ]
+
+
+def test_batch_matches_scalar_on_random_heartbeats():
+    rng = random.Random(0)
+    rules_by_user = {}
+    for user in range(50):
+        configs = []
+        for config in range(rng.randint(0, 3)):
+            watch_keys = rng.sample(METRICS, rng.randint(1, len(METRICS)))
+            threshHold = {"watch_keys": watch_keys}
+            for metric in watch_keys:
+                threshHold[metric] = rng.uniform(0, 100)
+            configs.append({"_id": f"{user}-{config}", "threshHold": threshHold})
+        rules_by_user[f"user-{user}"] = compile_rules(configs)
+
+    heartbeats = []
+    for index in range(5000):
+        metrics = rng.sample(METRICS, rng.randint(0, len(METRICS)))
+        heartbeats.append(
+            (
+                f"device-{index % 200}",
+                f"user-{index % 50}",
+                {metric: rng.uniform(0, 100) for metric in metrics},
+            )
+        )
+
+    violations = evaluate_batch(heartbeats, rules_by_user)
+
+    assert violations
+    assert Counter(violations) == scalar(heartbeats, rules_by_user)
+
+
+def test_empty_batch():
+    assert evaluate_batch([], {"user-1": compile_rules([])}) == []
@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+
+from src.database import get_async_redis_storage
+from src.notifications import alerts
+from src.notifications.alerts import (
+    alert_state_key,
+    compile_rules,
+    evaluate_heartbeats,
+    rules_cache,
+)
+
+NOW = datetime(2025, 6, 1, 12, tzinfo=timezone.utc)
+
+
+class FakeNotifications:
+    def __init__(self):
+        self.inserted: list[dict] = []
+
+    async def insert_many(self, documents: list[dict]):
+        for document in documents:
+            document["_id"] = ObjectId()
+        self.inserted += documents
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.notifications = FakeNotifications()
+
+    def get_collection(self, name: str) -> FakeNotifications:
+        return self.notifications
+
+
+@pytest.fixture()
+def db():
+    rules_cache.set(
+        "user-1",
+        compile_rules(
+            [
+                {
+                    "_id": "config-1",
+                    "threshHold": {"watch_keys": ["cpu_usage"], "cpu_usage": 30},
+                }
+            ]
+        ),
+    )
+    yield FakeDatabase()
+    rules_cache.clear()
+
+
+def heartbeats(*cpu_usages: float, start: int = 0) -> list:
+    return [
+        (
+            "device-1",
+            "user-1",
+            {"cpu_usage": cpu_usage, "created_at": NOW + timedelta(seconds=start + i)},
+        )
+        for i, cpu_usage in enumerate(cpu_usages)
+    ]
+
+
+def values(db: FakeDatabase) -> list[float]:
+    return [notification["value"] for notification in db.notifications.inserted]
+
+
+def test_consecutive_violations_notify_once(db, fake_redis):
+    async def scenario():
+        await evaluate_heartbeats(db, heartbeats(45))
+        await evaluate_heartbeats(db, heartbeats(50, start=1))
+        # Several violating heartbeats in one batch notify once as well
+        await evaluate_heartbeats(db, heartbeats(60, 70, start=2))
+
+        assert values(db) == [45]
+        # Comparable with the UTC cutoff of compact_read_notifications
+        assert db.notifications.inserted[0]["created_at"].tzinfo == timezone.utc
+
+    fake_redis(scenario())
+
+
+def test_recovery_rearms_the_alert(db, fake_redis):
+    async def scenario():
+        await evaluate_heartbeats(db, heartbeats(45))
+        await evaluate_heartbeats(db, heartbeats(10, start=1))
+        await evaluate_heartbeats(db, heartbeats(50, start=2))
+        # A batch ending back within the threshold re-arms the alert
+        await evaluate_heartbeats(db, heartbeats(55, 10, start=3))
+        await evaluate_heartbeats(db, heartbeats(65, start=5))
+
+        assert values(db) == [45, 50, 65]
+
+    fake_redis(scenario())
+
+
+def test_missing_reading_keeps_the_alert(db, fake_redis):
+    async def scenario():
+        await evaluate_heartbeats(db, heartbeats(45))
+        await evaluate_heartbeats(
+            db, [("device-1", "user-1", {"created_at": NOW + timedelta(seconds=1)})]
+        )
+        await evaluate_heartbeats(db, heartbeats(50, start=2))
+
+        assert values(db) == [45]
+
+    fake_redis(scenario())
+
+
+def test_alert_repeats_after_the_cooldown(db, fake_redis, monkeypatch):
+    monkeypatch.setattr(alerts, "get_alert_cooldown", lambda: 60)
+
+    async def scenario():
+        await evaluate_heartbeats(db, heartbeats(45))
+        key = alert_state_key("device-1", "config-1", "cpu_usage")
+        assert 0 < await get_async_redis_storage().ttl(key) <= 60
+
+        # What the TTL running out leaves behind
+        await get_async_redis_storage().delete(key)
+        await evaluate_heartbeats(db, heartbeats(50, start=1))
+
+        assert values(db) == [45, 50]
+
+    fake_redis(scenario())
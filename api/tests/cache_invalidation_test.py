@@ -0,0 +1,95 @@
+import asyncio
+
+from src.cache import MISSING, TTLCache
+from src.database import get_async_redis_storage
+from src.invalidation import CacheInvalidator
+from src.notifications import alerts
+from src.users import sessions
+
+
+async def wait_for(condition, timeout: float = 5) -> None:
+    async with asyncio.timeout(timeout):
+        while not await condition():
+            await asyncio.sleep(0.01)
+
+
+async def subscribed(invalidator: CacheInvalidator, cache: TTLCache) -> None:
+    redis_client = get_async_redis_storage()
+
+    async def listening():
+        channel = invalidator.channel(cache)
+        return (await redis_client.pubsub_numsub(channel))[0][1] > 0
+
+    await wait_for(listening)
+
+
+def test_invalidation_reaches_other_worker(fake_redis):
+    async def scenario():
+        # Two workers, each with its own copy of the same cache
+        local, remote = CacheInvalidator(), CacheInvalidator()
+        local_cache = local.register(TTLCache("sessions"))
+        remote_cache = remote.register(TTLCache("sessions"))
+        remote.start()
+        try:
+            await subscribed(remote, remote_cache)
+            local_cache.set("session-1", "user-1")
+            remote_cache.set("session-1", "user-1")
+            remote_cache.set("session-2", "user-2")
+
+            await local.invalidate(local_cache, "session-1")
+
+            async def dropped():
+                return remote_cache.get("session-1") is MISSING
+
+            await wait_for(dropped)
+            assert local_cache.get("session-1") is MISSING
+            assert remote_cache.get("session-2") == "user-2"
+        finally:
+            await remote.stop()
+
+    fake_redis(scenario())
+
+
+def test_logout_is_not_accepted_by_other_workers(fake_redis):
+    async def scenario():
+        redis_client = get_async_redis_storage()
+        remote = CacheInvalidator()
+        remote_cache = remote.register(TTLCache("sessions"))
+        remote.start()
+        try:
+            await subscribed(remote, remote_cache)
+            await sessions.create_session(redis_client, "session-1", "user-1")
+            remote_cache.set("session-1", "user-1")
+
+            assert await sessions.delete_session(redis_client, "session-1")
+
+            async def dropped():
+                return remote_cache.get("session-1") is MISSING
+
+            await wait_for(dropped)
+            assert await sessions.resolve_session(redis_client, "session-1") is None
+        finally:
+            await remote.stop()
+
+    fake_redis(scenario())
+
+
+def test_notification_config_change_reaches_other_workers(fake_redis):
+    async def scenario():
+        remote = CacheInvalidator()
+        remote_cache = remote.register(TTLCache(alerts.rules_cache.name))
+        remote.start()
+        try:
+            await subscribed(remote, remote_cache)
+            remote_cache.set("user-1", {"temperature": ()})
+
+            await alerts.invalidate_user_rules("user-1")
+
+            async def dropped():
+                return remote_cache.get("user-1") is MISSING
+
+            await wait_for(dropped)
+        finally:
+            await remote.stop()
+
+    fake_redis(scenario())
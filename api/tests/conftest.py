@@ -0,0 +1,51 @@
+import asyncio
+import socket
+import threading
+
+import pytest
+from fakeredis import TcpFakeServer
+
+from src.database import clients
+
+
+@pytest.fixture()
+def redis_server(monkeypatch):
+    """A local Redis stand-in, with REDIS_HOST and REDIS_PORT pointing at it.
+
+    Worker subprocesses reach it too when started with `os.environ`.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("REDIS_HOST", "127.0.0.1")
+    monkeypatch.setenv("REDIS_PORT", str(port))
+
+    yield port
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture()
+def fake_redis(redis_server):
+    """Point the app's Redis clients at `redis_server`.
+
+    Yields a `run(coroutine)` helper that runs the coroutine on a fresh event
+    loop and closes the clients before that loop ends, since their connection
+    pools are bound to it.
+    """
+
+    async def with_clients(coroutine):
+        try:
+            return await coroutine
+        finally:
+            await clients.close()
+
+    def run(coroutine):
+        return asyncio.run(with_clients(coroutine))
+
+    return run
@@ -1,28 +1,40 @@
-from fastapi import HTTPException
 import pytest
+import json
 import logging
 
 from main import app
-from src.database import get_db_client, get_database
-from pymongo.database import Database
+from src.database import get_database, get_db_client, get_sync_db_client
+from src.devices.ingest import batcher
+from src.devices.indexes import ensure_indexes
+from src.devices.router import (
+    decode_device_cursor,
+    device_page_pipeline,
+    encode_device_cursor,
+)
 from fastapi.testclient import TestClient
 
 
 client = TestClient(app)
+unauthenticated_client = TestClient(app)
 logger = logging.getLogger(__name__)
 
 
 def get_database_override():
-    client = get_db_client()
-    return Database(client, "test_database")
+    return get_db_client().get_database("test_database")
 
 
 app.dependency_overrides[get_database] = get_database_override
 
 
+@pytest.fixture(scope="module", autouse=True)
+def client_lifespan():
+    with client:
+        yield
+
+
 @pytest.fixture()
 def users_collection():
-    return get_database_override().get_collection("users")
+    return get_sync_db_client().get_database("test_database").get_collection("users")
 
 
 @pytest.fixture(autouse=True)
@@ -30,8 +42,7 @@ def database_cleanup():
     yield
 
     print("TEARDOWN STARTED....\n")
-    client = get_db_client()
-    client.drop_database("test_database")
+    get_sync_db_client().drop_database("test_database")
     print("TEARDOWN COMPLETE\n")
 
 
@@ -135,33 +146,32 @@ def create_multiple_devices(user_cookies):
 
 @pytest.fixture()
 def create_multiple_status(created_device):
-    device_sn = created_device["sn"]
+    device_id = created_device["id"]
     mocked_status_1 = {
-        "device_sn": device_sn,
-        "conectivity": True,
+        "connectivity": True,
         "boot_date": "2023-10-01",
         "cpu_usage": 45,
         "ram_usage": 60,
         "free_disk": 120,
-        "tempeture": 40,
+        "temperature": 40,
         "latency": 20,
     }
 
     mocked_status_2 = {
-        "device_sn": device_sn,
-        "conectivity": True,
+        "connectivity": True,
         "boot_date": "2023-10-01",
         "cpu_usage": 45,
         "ram_usage": 60,
         "free_disk": 120,
-        "tempeture": 36.5,
+        "temperature": 36.5,
         "latency": 20,
     }
 
     status = [mocked_status_1, mocked_status_2]
     for stat in status:
-        response = client.post(f"/api/devices/{device_sn}/status", json=stat)
+        response = client.post(f"/api/devices/{device_id}/status", json=stat)
         assert response.status_code == 201
+    client.portal.call(batcher.join)
 
     yield created_device
 
@@ -232,6 +242,17 @@ def test_delete_device(created_device, user_cookies):
     assert response.status_code == 200
 
 
+def test_deleted_device_is_not_served_from_cache(created_device, user_cookies):
+    device_url = f"/api/devices/{created_device['id']}"
+
+    assert client.get(device_url, cookies=user_cookies).status_code == 200
+    assert client.delete(device_url, cookies=user_cookies).status_code == 200
+
+    response = client.get(device_url, cookies=user_cookies)
+
+    assert response.status_code == 404
+
+
 def test_update_device(created_device, user_cookies):
     expected_location = "Warehouse 3"
     device_id = created_device["id"]
@@ -254,6 +275,37 @@ def test_update_device(created_device, user_cookies):
     assert updated_device["location"] == expected_location
 
 
+def test_conditional_get_device(created_device, user_cookies):
+    for url in ("/api/devices/", f"/api/devices/{created_device['id']}"):
+        response = client.get(url, cookies=user_cookies)
+        etag = response.headers["ETag"]
+
+        assert response.status_code == 200
+
+        response = client.get(
+            url, cookies=user_cookies, headers={"If-None-Match": etag}
+        )
+
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
+
+    client.put(
+        f"/api/devices/{created_device['id']}",
+        cookies=user_cookies,
+        data={"location": "Warehouse 4"},
+    )
+
+    response = client.get(
+        f"/api/devices/{created_device['id']}",
+        cookies=user_cookies,
+        headers={"If-None-Match": etag},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["location"] == "Warehouse 4"
+
+
 def test_create_device_unauthenticated():
     mocked_device = {
         "name": "Temperature Sensor",
@@ -262,42 +314,52 @@ def test_create_device_unauthenticated():
         "description": "Monitors temperature",
     }
 
-    with pytest.raises(HTTPException):
-        response = client.post("/api/devices", data=mocked_device)
-        assert response.status_code == 401
+    response = unauthenticated_client.post("/api/devices", json=mocked_device)
+    assert response.status_code == 401
 
 
 def test_create_device_status(user_cookies, created_device):
-    device_sn = created_device["sn"]
+    device_id = created_device["id"]
 
     mocked_status = {
-        "device_sn": device_sn,
-        "conectivity": True,
+        "connectivity": True,
         "boot_date": "2023-10-01",
         "cpu_usage": 45,
         "ram_usage": 60,
         "free_disk": 120,
-        "tempeture": 36.5,
+        "temperature": 36.5,
         "latency": 20,
     }
 
-    response = client.post(f"/api/devices/{device_sn}/status", json=mocked_status)
+    response = client.post(f"/api/devices/{device_id}/status", json=mocked_status)
 
     assert response.status_code == 201
 
-    status_response = client.get(f"/api/devices/{device_sn}/status")
+    status_response = client.get(f"/api/devices/{device_id}/status")
     assert status_response.status_code == 200
 
     status_data = status_response.json()
 
     assert len(status_data) == 1
 
-    assert status_data[0]["boot_date"] == "2023-10-01"
+    assert status_data[0]["boot_date"].startswith("2023-10-01")
+
+
+def test_create_status_for_unknown_device():
+    mocked_status = {
+        "connectivity": True,
+        "boot_date": "2023-10-01",
+        "cpu_usage": 45,
+    }
+
+    response = client.post(f"/api/devices/{'0' * 32}/status", json=mocked_status)
+
+    assert response.status_code == 404
 
 
 def test_list_device_status(create_multiple_status):
-    device_sn = create_multiple_status["sn"]
-    response = client.get(f"/api/devices/{device_sn}/status")
+    device_id = create_multiple_status["id"]
+    response = client.get(f"/api/devices/{device_id}/status")
 
     assert response.status_code == 200
 
@@ -307,9 +369,9 @@ def test_list_device_status(create_multiple_status):
 
 
 def test_get_device_status(create_multiple_status):
-    device_sn = create_multiple_status["sn"]
+    device_id = create_multiple_status["id"]
 
-    response = client.get(f"/api/devices/{device_sn}/status")
+    response = client.get(f"/api/devices/{device_id}/status")
 
     assert response.status_code == 200
 
@@ -319,12 +381,341 @@ def test_get_device_status(create_multiple_status):
 
 
 def test_get_filtered_device_status(create_multiple_status):
-    device_sn = create_multiple_status["sn"]
+    device_id = create_multiple_status["id"]
 
-    response = client.get(f"/api/devices/{device_sn}/status", params={"skip": 1})
+    response = client.get(f"/api/devices/{device_id}/status", params={"skip": 1})
 
     assert response.status_code == 200
 
     statuses = response.json()
 
     assert len(statuses) == 1
+
+
+def test_paginate_device_status_with_cursor(create_multiple_status):
+    device_id = create_multiple_status["id"]
+
+    first_page = client.get(f"/api/devices/{device_id}/status", params={"limit": 1})
+
+    assert first_page.status_code == 200
+    assert len(first_page.json()) == 1
+
+    next_cursor = first_page.headers["X-Next-Cursor"]
+    second_page = client.get(
+        f"/api/devices/{device_id}/status", params={"limit": 1, "cursor": next_cursor}
+    )
+
+    assert second_page.status_code == 200
+    statuses = second_page.json()
+
+    assert len(statuses) == 1
+    assert statuses[0]["created_at"] < first_page.json()[0]["created_at"]
+
+
+def test_paginate_device_status_with_invalid_cursor(created_device):
+    device_id = created_device["id"]
+
+    for cursor in ("2024-01-01T00:00:00+00:00", "2024-01-01T00:00:00+00:00|x"):
+        response = client.get(
+            f"/api/devices/{device_id}/status", params={"cursor": cursor}
+        )
+
+        assert response.status_code == 400
+
+
+def test_paginate_device_status_with_duplicate_timestamps(created_device):
+    device_id = created_device["id"]
+    heartbeats = [
+        {
+            "device_id": device_id,
+            "connectivity": True,
+            "boot_date": "2023-10-01",
+            "created_at": created_at,
+            "temperature": temperature,
+        }
+        for temperature, created_at in enumerate(
+            ["2024-01-01T00:00:02+00:00"] + ["2024-01-01T00:00:01+00:00"] * 3
+        )
+    ]
+    response = client.post("/api/devices/status/bulk", json=heartbeats)
+    assert response.status_code == 201
+
+    temperatures = []
+    params = {"limit": 1}
+    while True:
+        page = client.get(f"/api/devices/{device_id}/status", params=params)
+        assert page.status_code == 200
+        temperatures += [status["temperature"] for status in page.json()]
+        if "X-Next-Cursor" not in page.headers:
+            break
+        params["cursor"] = page.headers["X-Next-Cursor"]
+
+    assert temperatures[0] == 0
+    assert sorted(temperatures) == [0, 1, 2, 3]
+
+
+def test_list_devices_with_latest_status(create_multiple_status):
+    response = client.get("/api/devices")
+
+    assert response.status_code == 200
+
+    device = response.json()[0]
+
+    assert device["status"]["temperature"] == 36.5
+    assert device["last_seen_at"] == device["status"]["created_at"]
+    assert device["online"] is True
+
+
+def test_paginate_devices_with_cursor(create_multiple_devices):
+    first_page = client.get(
+        "/api/devices", params={"limit": 2, "include_total": True}
+    )
+
+    assert first_page.status_code == 200
+    assert len(first_page.json()) == 2
+    assert first_page.headers["X-Total-Count"] == "3"
+
+    second_page = client.get(
+        "/api/devices",
+        params={"limit": 2, "cursor": first_page.headers["X-Next-Cursor"]},
+    )
+
+    assert second_page.status_code == 200
+    devices = second_page.json()
+
+    assert len(devices) == 1
+    assert devices[0]["id"] not in [device["id"] for device in first_page.json()]
+
+
+def test_list_devices_query_uses_index(create_multiple_devices):
+    client.portal.call(ensure_indexes, get_database_override())
+
+    database = get_sync_db_client().get_database("test_database")
+    devices = list(database.get_collection("devices").find().sort("created_at", 1))
+    user_id = devices[0]["user_id"]
+
+    def winning_plan(page_query: dict) -> str:
+        # The pipeline get_devices runs, as the server plans it
+        explain = database.command(
+            "explain",
+            {
+                "aggregate": "devices",
+                "pipeline": device_page_pipeline(page_query, 0, 10),
+                "cursor": {},
+            },
+            verbosity="queryPlanner",
+        )
+        # Fully pushed down pipelines have no `stages`
+        assert not any("$sort" in stage for stage in explain.get("stages", []))
+        planner = explain.get("queryPlanner") or explain["stages"][0]["$cursor"][
+            "queryPlanner"
+        ]
+        return str(planner["winningPlan"])
+
+    pages = [
+        {"user_id": user_id},
+        {"user_id": user_id, **decode_device_cursor(encode_device_cursor(devices[0]))},
+    ]
+    for page_query in pages:
+        plan = winning_plan(page_query)
+        assert "IXSCAN" in plan
+        assert "COLLSCAN" not in plan
+        # Sorted by the index, not in memory
+        assert "'stage': 'SORT'" not in plan
+
+    filters = [
+        {"user_id": user_id, "location": "Warehouse 1"},
+        {"user_id": user_id, "sn": "123456789101"},
+    ]
+    for page_query in filters:
+        plan = winning_plan(page_query)
+        assert "IXSCAN" in plan
+        assert "COLLSCAN" not in plan
+
+
+def test_create_device_status_bulk(created_device):
+    device_id = created_device["id"]
+    unknown_device_id = "0" * 32
+    heartbeats = [
+        {"device_id": device_id, "connectivity": True, "boot_date": "2023-10-01"},
+        {"device_id": device_id, "connectivity": False, "boot_date": "2023-10-01"},
+        {"device_id": unknown_device_id, "connectivity": True, "boot_date": "2023-10-01"},
+    ]
+
+    response = client.post("/api/devices/status/bulk", json=heartbeats)
+
+    assert response.status_code == 201
+    assert response.json() == {
+        "accepted": 2,
+        "rejected_devices": [unknown_device_id],
+        "failed": [],
+    }
+
+    ndjson = "\n".join(json.dumps(heartbeat) for heartbeat in heartbeats[:2])
+    response = client.post(
+        "/api/devices/status/bulk",
+        content=ndjson,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 201
+    assert response.json()["accepted"] == 2
+
+    statuses = client.get(f"/api/devices/{device_id}/status").json()
+
+    assert len(statuses) == 4
+
+
+def test_create_device_status_bulk_invalid_item(created_device):
+    heartbeats = [
+        {"device_id": created_device["id"], "connectivity": True, "boot_date": "2023"},
+    ]
+
+    response = client.post("/api/devices/status/bulk", json=heartbeats)
+
+    assert response.status_code == 422
+
+
+def test_device_telemetry_is_pushed_to_subscribers(created_device):
+    device_id = created_device["id"]
+    unknown_device_id = "0" * 32
+
+    with client.websocket_connect("/ws/telemetry?interval_ms=0") as websocket:
+        websocket.send_text(json.dumps({"subscribe": [device_id, unknown_device_id]}))
+        assert json.loads(websocket.receive_text()) == {"subscribed": [device_id]}
+
+        heartbeat = {"connectivity": True, "boot_date": "2023-10-01", "cpu_usage": 45}
+        response = client.post(f"/api/devices/{device_id}/status", json=heartbeat)
+        assert response.status_code == 201
+
+        event = json.loads(websocket.receive_text())
+
+        websocket.send_text(json.dumps({"unsubscribe": [device_id]}))
+        assert json.loads(websocket.receive_text()) == {"subscribed": []}
+
+    assert event["device_id"] == device_id
+    assert event["cpu_usage"] == 45
+    assert event["connectivity"] is True
+    assert event["created_at"]
+
+
+def test_device_metrics_from_rollups(created_device):
+    device_id = created_device["id"]
+    heartbeats = [
+        {
+            "device_id": device_id,
+            "connectivity": cpu_usage != 40,
+            "boot_date": "2023-10-01",
+            "created_at": f"2024-01-01T00:0{minute}:10+00:00",
+            "cpu_usage": cpu_usage,
+        }
+        for minute, cpu_usage in enumerate([10, 20, 30, 40])
+    ]
+
+    response = client.post("/api/devices/status/bulk", json=heartbeats)
+    assert response.status_code == 201
+
+    response = client.get(
+        f"/api/devices/{device_id}/metrics",
+        params={
+            "start_date": "2024-01-01T00:00:00+00:00",
+            "end_date": "2024-01-01T01:00:00+00:00",
+        },
+    )
+
+    assert response.status_code == 200
+    metrics = response.json()
+    assert metrics["resolution"] == "1m"
+    assert len(metrics["points"]) == 4
+
+    response = client.get(
+        f"/api/devices/{device_id}/metrics",
+        params={
+            "start_date": "2024-01-01T00:00:00+00:00",
+            "end_date": "2024-01-01T01:00:00+00:00",
+            "max_points": 2,
+        },
+    )
+
+    metrics = response.json()
+    assert metrics["resolution"] == "1h"
+    (point,) = metrics["points"]
+    assert point["count"] == 4
+    assert point["uptime"] == 0.75
+    cpu_usage = point["metrics"]["cpu_usage"]
+    assert cpu_usage["min"] == 10
+    assert cpu_usage["max"] == 40
+    assert cpu_usage["avg"] == 25
+    assert cpu_usage["p95"] == pytest.approx(40, rel=0.01)
+
+
+def test_get_device_status_downsampled(created_device):
+    device_id = created_device["id"]
+    heartbeats = [
+        {
+            "device_id": device_id,
+            "connectivity": True,
+            "boot_date": "2023-10-01",
+            "created_at": f"2024-01-01T00:00:{second:02d}+00:00",
+            "cpu_usage": 95 if second == 17 else 10 + second % 3,
+        }
+        for second in range(60)
+    ]
+
+    response = client.post("/api/devices/status/bulk", json=heartbeats)
+    assert response.status_code == 201
+
+    for downsampling in ("lttb", "minmax"):
+        response = client.get(
+            f"/api/devices/{device_id}/status",
+            params={"max_points": 10, "downsampling": downsampling},
+        )
+
+        assert response.status_code == 200
+        statuses = response.json()
+        assert 2 <= len(statuses) <= 10
+        assert 95 in [status["cpu_usage"] for status in statuses]
+        created_at = [status["created_at"] for status in statuses]
+        assert created_at == sorted(created_at, reverse=True)
+
+
+
+def test_get_device_status_downsampled_with_shared_timestamps(created_device):
+    device_id = created_device["id"]
+    heartbeats = [
+        {
+            "device_id": device_id,
+            "connectivity": True,
+            "boot_date": "2023-10-01",
+            "created_at": f"2024-01-01T00:00:{second // 3:02d}+00:00",
+            "cpu_usage": 10 + second,
+        }
+        for second in range(60)
+    ]
+
+    response = client.post("/api/devices/status/bulk", json=heartbeats)
+    assert response.status_code == 201
+
+    response = client.get(f"/api/devices/{device_id}/status", params={"max_points": 5})
+
+    assert response.status_code == 200
+    assert 2 <= len(response.json()) <= 5
+
+def test_export_device_telemetry(create_multiple_status):
+    device_id = create_multiple_status["id"]
+
+    response = client.get(f"/api/devices/{device_id}/export")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(row["temperature"] for row in rows) == [36.5, 40]
+    assert all(row["device_id"] == device_id for row in rows)
+
+    response = client.get("/api/devices/export", params={"format": "csv", "gzip": True})
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    lines = response.text.splitlines()
+    assert lines[0].startswith("device_id,")
+    assert len(lines) == 3
@@ -0,0 +1,127 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pymongo.errors import BulkWriteError, WriteError
+
+from src.devices.cache import device_cache
+from src.devices.indexes import DEVICES_COLLECTION
+from src.devices.ingest import HeartbeatBatcher
+from src.devices.rollups import ROLLUPS_COLLECTION
+from src.devices.telemetry import TELEMETRY_COLLECTION
+from src.notifications.alerts import rules_cache
+
+DEVICE_ID = "0123456789abcdef0123456789abcdef"
+NOW = datetime(2025, 6, 1, 12, tzinfo=timezone.utc)
+
+
+class FakeCollection:
+    def __init__(self):
+        self.inserted: list[dict] = []
+        self.bulk_writes: list[list] = []
+        self.rejected: set[float] = set()
+        self.gate: asyncio.Event | None = None
+
+    async def insert_many(self, documents: list[dict], ordered: bool = True):
+        # Documents whose temperature is in `rejected` fail, like a partial
+        # unordered insert
+        errors = [
+            {"index": index, "code": 121, "errmsg": "Document failed validation"}
+            for index, document in enumerate(documents)
+            if document["temperature"] in self.rejected
+        ]
+        self.inserted += [
+            document
+            for index, document in enumerate(documents)
+            if index not in {error["index"] for error in errors}
+        ]
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": 0})
+
+    async def bulk_write(self, requests: list, ordered: bool = True):
+        if self.gate is not None:
+            await self.gate.wait()
+        self.bulk_writes.append(requests)
+
+
+class FakeDatabase:
+    name = "test_database"
+
+    def __init__(self):
+        self.collections: dict[str, FakeCollection] = {}
+
+    def get_collection(self, name: str) -> FakeCollection:
+        return self.collections.setdefault(name, FakeCollection())
+
+
+def heartbeat(index: int) -> dict:
+    return {
+        "connectivity": True,
+        "boot_date": NOW,
+        "created_at": NOW + timedelta(seconds=index),
+        "cpu_usage": 10.0,
+        "temperature": float(index),
+    }
+
+
+@pytest.fixture()
+def db():
+    device_cache.set(DEVICE_ID, {"id": DEVICE_ID, "user_id": "user-1"})
+    rules_cache.set("user-1", {})
+    yield FakeDatabase()
+    device_cache.clear()
+    rules_cache.clear()
+
+
+def test_partial_insert_fails_only_the_rejected_heartbeats(db, fake_redis):
+    async def scenario():
+        db.get_collection(TELEMETRY_COLLECTION).rejected = {1.0}
+        batcher = HeartbeatBatcher(max_batch_size=3, max_delay=1)
+        batcher.start()
+        try:
+            results = await asyncio.gather(
+                *(
+                    batcher.submit(db, DEVICE_ID, heartbeat(index))
+                    for index in range(3)
+                ),
+                return_exceptions=True,
+            )
+            await batcher.join()
+        finally:
+            await batcher.stop()
+
+        assert results[0] == results[2] == "user-1"
+        assert isinstance(results[1], WriteError)
+
+        inserted = db.get_collection(TELEMETRY_COLLECTION).inserted
+        assert [document["temperature"] for document in inserted] == [0.0, 2.0]
+        # Follow-up work only covers what was stored
+        [snapshots] = db.get_collection(DEVICES_COLLECTION).bulk_writes
+        assert len(snapshots) == 1
+        assert db.get_collection(ROLLUPS_COLLECTION).bulk_writes
+
+    fake_redis(scenario())
+
+
+def test_requests_are_answered_before_follow_up_work(db, fake_redis):
+    async def scenario():
+        snapshots = db.get_collection(DEVICES_COLLECTION)
+        snapshots.gate = asyncio.Event()
+        batcher = HeartbeatBatcher(max_batch_size=1)
+        batcher.start()
+        try:
+            owner = await asyncio.wait_for(
+                batcher.submit(db, DEVICE_ID, heartbeat(0)), 1
+            )
+            assert owner == "user-1"
+            assert db.get_collection(TELEMETRY_COLLECTION).inserted
+            assert not snapshots.bulk_writes
+
+            snapshots.gate.set()
+            await asyncio.wait_for(batcher.join(), 1)
+            assert snapshots.bulk_writes
+        finally:
+            snapshots.gate.set()
+            await batcher.stop()
+
+    fake_redis(scenario())
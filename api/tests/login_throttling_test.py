@@ -0,0 +1,78 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from src.users import throttling
+from src.users.throttling import (
+    LoginThrottled,
+    check_login_allowed,
+    login_failures_key,
+    record_login_failure,
+)
+
+EMAIL = "user@example.com"
+IP = "203.0.113.7"
+
+
+@pytest.fixture()
+def options(monkeypatch):
+    monkeypatch.setitem(throttling.throttle_options, "window", 2)
+    monkeypatch.setitem(throttling.throttle_options, "max_email_failures", 2)
+    monkeypatch.setitem(throttling.throttle_options, "max_ip_failures", 100)
+    return throttling.throttle_options
+
+
+def test_failures_throttle_until_the_window_expires(options):
+    async def scenario():
+        redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        for _ in range(2):
+            await check_login_allowed(redis_client, EMAIL, IP)
+            await record_login_failure(redis_client, EMAIL, IP)
+
+        with pytest.raises(LoginThrottled) as throttled:
+            await check_login_allowed(redis_client, EMAIL, IP)
+        assert 1 <= throttled.value.retry_after <= options["window"]
+
+        # Every counter carries the window, so the lockout ends with it
+        key = login_failures_key("email", EMAIL)
+        assert await redis_client.ttl(key) > 0
+        await asyncio.sleep(2.1)
+        await check_login_allowed(redis_client, EMAIL, IP)
+        await record_login_failure(redis_client, EMAIL, IP)
+        assert await redis_client.get(key) == "1"
+        assert await redis_client.ttl(key) > 0
+
+    asyncio.run(scenario())
+
+
+def test_counter_without_expiry_is_rearmed(options):
+    async def scenario():
+        redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        key = login_failures_key("email", EMAIL)
+        # What a bare INCR after the key expired used to leave behind
+        await redis_client.set(key, 5)
+
+        with pytest.raises(LoginThrottled) as throttled:
+            await check_login_allowed(redis_client, EMAIL, IP)
+        assert throttled.value.retry_after == options["window"]
+        assert await redis_client.ttl(key) > 0
+
+        await asyncio.sleep(2.1)
+        await check_login_allowed(redis_client, EMAIL, IP)
+
+    asyncio.run(scenario())
+
+
+def test_failure_on_counter_without_expiry_sets_one(options):
+    async def scenario():
+        redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        key = login_failures_key("ip", IP)
+        await redis_client.set(key, 1)
+
+        await record_login_failure(redis_client, EMAIL, IP)
+
+        assert await redis_client.get(key) == "2"
+        assert 0 < await redis_client.ttl(key) <= options["window"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,27 @@
+from fastapi.testclient import TestClient
+
+from main import app
+
+# No lifespan: /metrics needs neither Mongo nor Redis
+client = TestClient(app)
+
+
+def test_metrics_are_disabled_without_a_token(monkeypatch):
+    monkeypatch.delenv("METRICS_TOKEN", raising=False)
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer "})
+
+    assert response.status_code == 404
+
+
+def test_metrics_require_the_token(monkeypatch):
+    monkeypatch.setenv("METRICS_TOKEN", "scrape-token")
+
+    assert client.get("/metrics").status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer wrong"})
+    assert response.status_code == 401
+    assert response.headers["WWW-Authenticate"] == "Bearer"
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-token"})
+    assert response.status_code == 200
+    assert isinstance(response.json(), dict)
@@ -1,11 +1,16 @@
+import json
 import logging
+from datetime import datetime, timedelta, timezone
 
+import msgpack
 import pytest
-from fastapi import HTTPException, status
+from fastapi import WebSocketDisconnect, status
 from fastapi.testclient import TestClient
 from main import app
-from pymongo.database import Database
-from src.database import get_database, get_db_client
+from src.database import get_database, get_db_client, get_sync_db_client
+from src.devices.ingest import batcher
+from src.notifications.alerts import NOTIFICATIONS_COLLECTION
+from src.retention import compact_read_notifications
 
 client = TestClient(app)
 unauthenticated_client = TestClient(app)
@@ -14,13 +19,18 @@ logger = logging.getLogger(__name__)
 
 
 def get_database_override():
-    client = get_db_client()
-    return Database(client, "test_database")
+    return get_db_client().get_database("test_database")
 
 
 app.dependency_overrides[get_database] = get_database_override
 
 
+@pytest.fixture(scope="module", autouse=True)
+def client_lifespan():
+    with client:
+        yield
+
+
 @pytest.fixture()
 def created_device(user_cookies):
     mocked_device = {
@@ -45,7 +55,7 @@ def created_device(user_cookies):
 
 @pytest.fixture()
 def users_collection():
-    return get_database_override().get_collection("users")
+    return get_sync_db_client().get_database("test_database").get_collection("users")
 
 
 @pytest.fixture(autouse=True)
@@ -53,8 +63,7 @@ def database_cleanup():
     yield
 
     print("TEARDOWN STARTED....\n")
-    client = get_db_client()
-    client.drop_database("test_database")
+    get_sync_db_client().drop_database("test_database")
     print("TEARDOWN COMPLETE\n")
 
 
@@ -207,8 +216,180 @@ def test_create_notification_config_unauthenticated(created_device):
         },
     }
 
-    with pytest.raises(HTTPException):
-        response = unauthenticated_client.post(
-            "/api/notifications/config", json=mocked_config
-        )
-        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    response = unauthenticated_client.post(
+        "/api/notifications/config", json=mocked_config
+    )
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_heartbeat_over_threshold_creates_notification(user_cookies, created_device):
+    device_id = created_device["id"]
+    mocked_config = {"watch_keys": ["cpu_usage"], "cpu_usage": 30}
+
+    response = client.post("/api/notifications/config", json=mocked_config)
+    assert response.status_code == 201
+
+    heartbeats = [
+        {"connectivity": True, "boot_date": "2023-10-01", "cpu_usage": 45},
+        {"connectivity": True, "boot_date": "2023-10-01", "cpu_usage": 10},
+    ]
+
+    for heartbeat in heartbeats:
+        response = client.post(f"/api/devices/{device_id}/status", json=heartbeat)
+        assert response.status_code == 201
+    client.portal.call(batcher.join)
+
+    sync_client = get_sync_db_client()
+    notifications = list(
+        sync_client.get_database("test_database")
+        .get_collection("notifications")
+        .find({"device_id": device_id})
+    )
+
+    assert len(notifications) == 1
+    assert notifications[0]["metric"] == "cpu_usage"
+    assert notifications[0]["value"] == 45
+    assert notifications[0]["threshold"] == 30
+
+
+def test_notification_is_pushed_to_websocket(user_cookies, created_device):
+    device_id = created_device["id"]
+    mocked_config = {"watch_keys": ["cpu_usage"], "cpu_usage": 30}
+
+    response = client.post("/api/notifications/config", json=mocked_config)
+    assert response.status_code == 201
+
+    with client.websocket_connect("/ws/notification") as websocket:
+        heartbeat = {"connectivity": True, "boot_date": "2023-10-01", "cpu_usage": 45}
+        response = client.post(f"/api/devices/{device_id}/status", json=heartbeat)
+        assert response.status_code == 201
+
+        envelope = json.loads(websocket.receive_text())
+
+    message = json.loads(envelope["message"])
+    assert envelope["id"]
+    assert message["device_id"] == device_id
+    assert message["metric"] == "cpu_usage"
+    assert message["value"] == 45
+
+
+def test_notifications_are_batched_with_msgpack_subprotocol(
+    user_cookies, created_device
+):
+    device_id = created_device["id"]
+    mocked_config = {"watch_keys": ["cpu_usage"], "cpu_usage": 30}
+
+    response = client.post("/api/notifications/config", json=mocked_config)
+    assert response.status_code == 201
+
+    with client.websocket_connect(
+        "/ws/notification", subprotocols=["notifications.msgpack.v1"]
+    ) as websocket:
+        assert websocket.accepted_subprotocol == "notifications.msgpack.v1"
+
+        heartbeat = {"connectivity": True, "boot_date": "2023-10-01", "cpu_usage": 45}
+        response = client.post(f"/api/devices/{device_id}/status", json=heartbeat)
+        assert response.status_code == 201
+
+        batch = msgpack.unpackb(websocket.receive_bytes())
+
+    assert isinstance(batch, list)
+    messages = [json.loads(envelope["message"]) for envelope in batch]
+    assert any(message["device_id"] == device_id for message in messages)
+
+
+def test_unacked_notifications_are_replayed_on_reconnect(user_cookies, created_device):
+    device_id = created_device["id"]
+    mocked_config = {"watch_keys": ["cpu_usage"], "cpu_usage": 30}
+    heartbeat = {"connectivity": True, "boot_date": "2023-10-01", "cpu_usage": 45}
+
+    response = client.post("/api/notifications/config", json=mocked_config)
+    assert response.status_code == 201
+
+    with client.websocket_connect("/ws/notification") as websocket:
+        client.post(f"/api/devices/{device_id}/status", json=heartbeat)
+        first = json.loads(websocket.receive_text())
+
+    with client.websocket_connect("/ws/notification") as websocket:
+        replayed = json.loads(websocket.receive_text())
+        websocket.send_text(json.dumps({"ack": [replayed["id"]]}))
+
+    assert replayed["id"] == first["id"]
+
+    # Back under the threshold first, or the next violation is not notified
+    recovered = {**heartbeat, "cpu_usage": 10}
+    client.post(f"/api/devices/{device_id}/status", json=recovered)
+    client.post(f"/api/devices/{device_id}/status", json=heartbeat)
+    client.portal.call(batcher.join)
+    with client.websocket_connect("/ws/notification") as websocket:
+        latest = json.loads(websocket.receive_text())
+
+    assert latest["id"] != first["id"]
+
+
+def test_websocket_skips_notifications_up_to_last_id(user_cookies, created_device):
+    device_id = created_device["id"]
+    mocked_config = {"watch_keys": ["cpu_usage"], "cpu_usage": 30}
+
+    response = client.post("/api/notifications/config", json=mocked_config)
+    assert response.status_code == 201
+
+    with client.websocket_connect("/ws/notification") as websocket:
+        for cpu_usage in (40, 10, 50):
+            heartbeat = {
+                "connectivity": True,
+                "boot_date": "2023-10-01",
+                "cpu_usage": cpu_usage,
+            }
+            client.post(f"/api/devices/{device_id}/status", json=heartbeat)
+        first = json.loads(websocket.receive_text())
+        second = json.loads(websocket.receive_text())
+
+    with client.websocket_connect(
+        f"/ws/notification?last_id={first['id']}"
+    ) as websocket:
+        replayed = json.loads(websocket.receive_text())
+
+    assert replayed["id"] == second["id"]
+
+
+def test_ack_many_notifications(user_cookies):
+    response = client.post("/api/devices/ack", json={"ids": ["1-0", "2-0"]})
+
+    assert response.status_code == 200
+    assert response.json() == {"acknowledged": 0}
+
+
+def test_ack_rejects_invalid_ids(user_cookies):
+    response = client.post("/api/devices/ack", json={"ids": ["not-an-id"]})
+
+    assert response.status_code == 422
+
+
+def test_websocket_requires_session():
+    with pytest.raises(WebSocketDisconnect) as exc_info:
+        with unauthenticated_client.websocket_connect("/ws/notification"):
+            pass
+
+    assert exc_info.value.code == status.WS_1008_POLICY_VIOLATION
+
+
+def test_compact_read_notifications():
+    now = datetime.now(timezone.utc)
+    collection = (
+        get_sync_db_client()
+        .get_database("test_database")
+        .get_collection(NOTIFICATIONS_COLLECTION)
+    )
+    collection.insert_many(
+        [
+            {"user_id": "user-1", "is_read": True, "created_at": now - timedelta(8)},
+            {"user_id": "user-1", "is_read": True, "created_at": now - timedelta(6)},
+            {"user_id": "user-1", "is_read": False, "created_at": now - timedelta(8)},
+        ]
+    )
+
+    client.portal.call(compact_read_notifications, get_database_override(), 7)
+
+    remaining = collection.find({}, {"_id": 0, "is_read": 1}).sort("created_at", 1)
+    assert [notification["is_read"] for notification in remaining] == [False, True]
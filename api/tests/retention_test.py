@@ -0,0 +1,75 @@
+import asyncio
+from types import SimpleNamespace
+
+from src import retention
+from src.database import get_async_redis_storage
+from src.retention import (
+    RetentionJob,
+    get_retention_lock_key,
+    trim_notification_streams,
+)
+from src.websocket.utils import get_stream_key
+
+NOW = 1_700_000_000.0
+DAY_MS = 86_400_000
+
+
+def test_trim_keeps_entries_from_the_cutoff_on(fake_redis, monkeypatch):
+    monkeypatch.setattr(retention, "time", SimpleNamespace(time=lambda: NOW))
+    cutoff = int(NOW * 1000) - 7 * DAY_MS
+
+    async def scenario():
+        redis_client = get_async_redis_storage()
+        for user_id in ("user-1", "user-2"):
+            for ms in (cutoff - DAY_MS, cutoff - 1, cutoff, cutoff + 1):
+                await redis_client.xadd(
+                    get_stream_key(user_id), {"message": "m"}, id=f"{ms}-0"
+                )
+        await redis_client.set(get_stream_key("not-a-stream"), "value")
+
+        trimmed = await trim_notification_streams(7)
+
+        assert trimmed == 4
+        for user_id in ("user-1", "user-2"):
+            entries = await redis_client.xrange(get_stream_key(user_id))
+            assert [entry_id for entry_id, _ in entries] == [
+                f"{cutoff}-0",
+                f"{cutoff + 1}-0",
+            ]
+
+    fake_redis(scenario())
+
+
+def test_trim_is_disabled_with_zero_days(fake_redis):
+    async def scenario():
+        redis_client = get_async_redis_storage()
+        await redis_client.xadd(get_stream_key("user-1"), {"message": "m"}, id="1-0")
+
+        assert await trim_notification_streams(0) == 0
+        assert await redis_client.xlen(get_stream_key("user-1")) == 1
+
+    fake_redis(scenario())
+
+
+def test_only_one_worker_runs_per_interval(fake_redis):
+    async def scenario():
+        runs = []
+        jobs = [RetentionJob(f"worker-{index}", interval=60) for index in range(3)]
+        for job in jobs:
+
+            async def run(db, job=job):
+                runs.append(job.worker_id)
+
+            job.run = run
+            job.start()
+
+        await asyncio.sleep(0.2)
+        for job in jobs:
+            await job.stop()
+
+        redis_client = get_async_redis_storage()
+        assert len(runs) == 1
+        assert await redis_client.get(get_retention_lock_key()) == runs[0]
+        assert 0 < await redis_client.ttl(get_retention_lock_key()) <= 60
+
+    fake_redis(scenario())
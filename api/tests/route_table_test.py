@@ -0,0 +1,87 @@
+import pytest
+
+from src.middlewares.auth import route_table
+from src.middlewares.routes import RouteTable
+
+DEVICE_ID = "0123456789abcdef0123456789abcdef"
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/api/users",
+        "/api/users/",
+        "/api/users/x",
+        "/api/login",
+        "/docs",
+        "/docs/oauth2-redirect",
+        "/openapi.json",
+        "/metrics",
+    ],
+)
+def test_public_prefixes(path):
+    assert route_table.is_public("GET", path)
+    assert route_table.is_public("POST", path)
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/api/usersx",
+        "/api/loginx",
+        "/docsx",
+        "/openapi.jsonx",
+        "/api",
+        "/api/devices",
+        "/api/notifications/users",
+        "",
+    ],
+)
+def test_prefix_must_end_on_a_segment(path):
+    assert not route_table.is_public("GET", path)
+    assert not route_table.is_public("POST", path)
+
+
+@pytest.mark.parametrize(
+    "path", [f"/api/devices/{DEVICE_ID}/status", "/api/devices/status/bulk"]
+)
+def test_device_ingestion_is_public_for_post_only(path):
+    assert route_table.is_public("POST", path)
+    for method in ["GET", "PUT", "PATCH", "DELETE"]:
+        assert not route_table.is_public(method, path)
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        f"/api/devices/{DEVICE_ID}",
+        f"/api/devices/{DEVICE_ID}/status/",
+        f"/api/devices/{DEVICE_ID}/status/extra",
+        f"/api/devices/{DEVICE_ID[:-1]}/status",
+        f"/api/devices/{DEVICE_ID}0/status",
+        f"/api/devices/{DEVICE_ID.upper()}/status",
+        f"/prefix/api/devices/{DEVICE_ID}/status",
+        "/api/devices/status/bulk/extra",
+    ],
+)
+def test_device_ingestion_patterns_match_the_full_path(path):
+    assert not route_table.is_public("POST", path)
+
+
+def test_root_and_preflight_are_public():
+    assert route_table.is_public("GET", "/")
+    assert route_table.is_public("OPTIONS", "/api/devices")
+    assert not route_table.is_public("GET", "/api/devices")
+
+
+def test_prefix_trie_matches_nested_prefixes():
+    table = RouteTable(["/a/b", "/a/b/c/d", "/x"], [r"/y/[0-9]+"])
+
+    assert table.is_public("GET", "/a/b")
+    assert table.is_public("GET", "/a/b/c")
+    assert table.is_public("GET", "/x/y")
+    assert not table.is_public("GET", "/a")
+    assert not table.is_public("GET", "/a/c/b")
+    assert table.is_public("POST", "/y/12")
+    assert not table.is_public("POST", "/y/1a")
+    assert not table.is_public("GET", "/y/12")
@@ -0,0 +1,61 @@
+"""Stand-alone worker process driven by websocket_routing_test.
+
+    python -m tests.routing_worker hold <user_id>
+    python -m tests.routing_worker send <user_id> <message>
+
+`hold` registers a socket for the user, prints "ready" once it can be routed
+to and then prints every message the socket receives until stdin closes.
+`send` delivers one message through the routing layer and exits.
+"""
+
+import asyncio
+import sys
+
+from src.database import clients, get_async_redis_storage
+from src.websocket.manager import manager
+from src.websocket.presence import presence
+from src.websocket.routing import message_router
+
+
+class PrintingSocket:
+    scope = {"type": "websocket", "subprotocols": []}
+
+    async def accept(self, subprotocol: str | None = None):
+        pass
+
+    async def send_text(self, message: str):
+        print(f"received {message}", flush=True)
+
+    async def close(self, code: int):
+        pass
+
+
+async def hold(user_id: str) -> None:
+    presence.start()
+    message_router.start()
+    await manager.connect(PrintingSocket(), user_id)
+    await presence.add(user_id)
+
+    redis_client = get_async_redis_storage()
+    while (await redis_client.pubsub_numsub(message_router.channel))[0][1] == 0:
+        await asyncio.sleep(0.05)
+    print("ready", flush=True)
+
+    await asyncio.get_running_loop().run_in_executor(None, sys.stdin.read)
+    await message_router.stop()
+    await presence.stop()
+
+
+async def send(user_id: str, message: str) -> None:
+    await message_router.deliver(user_id, message)
+
+
+async def main(command: str, *args: str) -> None:
+    try:
+        await {"hold": hold, "send": send}[command](*args)
+    finally:
+        await clients.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*sys.argv[1:]))
@@ -0,0 +1,113 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+
+from src.conditional import http_date, make_etag, set_validators
+from src.devices.schemas import DeviceStatus, DeviceSummary
+from src.serialization import FastJSONResponse, fast_json_response
+
+NOW = datetime(2025, 6, 1, 12, 30, 15, 123000, tzinfo=timezone.utc)
+
+
+def make_status(index: int) -> dict:
+    # Shaped like STATUS_RESPONSE_PROJECTION output: every field, nulls kept
+    return {
+        "cpu_usage": 12.5 + index,
+        "ram_usage": None if index % 2 else 48.25,
+        "free_disk": 100.0,
+        "temperature": 61.75,
+        "latency": None,
+        "connectivity": index % 3 != 0,
+        "boot_date": datetime(2025, 1, 1, tzinfo=timezone.utc),
+        # Millisecond precision, as stored by Mongo
+        "created_at": NOW - timedelta(milliseconds=1500 * index),
+    }
+
+
+def make_device(index: int) -> dict:
+    return {
+        "id": f"{index:032x}",
+        "name": f"device {index}",
+        "location": "rack ü",
+        "sn": f"{index:012d}",
+        "description": 'with "quotes" and \\ slashes',
+        "created_at": "2025-05-01T10:00:00.000001",
+        "updated_at": "2025-05-02T10:00:00",
+        "status": make_status(index) if index % 2 else None,
+        "last_seen_at": NOW if index % 2 else None,
+        "online": bool(index % 2),
+    }
+
+
+def make_client(documents: list[dict], response_model) -> TestClient:
+    app = FastAPI()
+
+    def headers(response: Response):
+        response.headers["X-Total-Count"] = str(len(documents))
+        set_validators(response, make_etag(len(documents)), NOW)
+
+    @app.get("/model", response_model=response_model)
+    async def model(response: Response):
+        headers(response)
+        return documents
+
+    @app.get("/fast", response_model=response_model)
+    async def fast(response: Response):
+        headers(response)
+        return fast_json_response(documents, response)
+
+    return TestClient(app)
+
+
+def test_statuses_are_byte_identical_to_the_response_model():
+    client = make_client([make_status(index) for index in range(5)], list[DeviceStatus])
+
+    model, fast = client.get("/model"), client.get("/fast")
+
+    assert fast.status_code == model.status_code == 200
+    assert fast.content == model.content
+    assert fast.headers == model.headers
+    assert fast.json()[0]["created_at"] == "2025-06-01T12:30:15.123000Z"
+    assert fast.json()[0]["boot_date"] == "2025-01-01T00:00:00Z"
+
+
+def test_device_summaries_match_the_response_model():
+    client = make_client(
+        [make_device(index) for index in range(4)], list[DeviceSummary]
+    )
+
+    model, fast = client.get("/model"), client.get("/fast")
+
+    assert fast.json() == model.json()
+    assert fast.headers["content-type"] == model.headers["content-type"]
+    for header in ["etag", "last-modified", "cache-control", "x-total-count"]:
+        assert fast.headers[header] == model.headers[header]
+    assert fast.json()[1]["last_seen_at"] == "2025-06-01T12:30:15.123000Z"
+
+
+def test_fast_response_renders_utc_as_z():
+    body = FastJSONResponse(
+        {
+            "utc": datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+            "offset": datetime(
+                2025, 1, 2, 3, 4, 5, tzinfo=timezone(timedelta(hours=2))
+            ),
+            "missing": None,
+        }
+    ).body
+
+    assert json.loads(body) == {
+        "utc": "2025-01-02T03:04:05Z",
+        "offset": "2025-01-02T03:04:05+02:00",
+        "missing": None,
+    }
+
+
+def test_http_date_reads_naive_values_as_utc():
+    assert http_date(datetime(2025, 1, 2, 3, 4, 5)) == "Thu, 02 Jan 2025 03:04:05 GMT"
+    assert (
+        http_date("2025-01-02T03:04:05", "2025-01-02T04:00:00+02:00")
+        == "Thu, 02 Jan 2025 03:04:05 GMT"
+    )
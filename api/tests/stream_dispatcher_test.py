@@ -0,0 +1,63 @@
+import asyncio
+
+from src.database import get_async_redis_storage
+from src.websocket.dispatcher import StreamDispatcher
+from src.websocket.manager import manager
+from src.websocket.stream import GROUP_NAME, publish_to_stream
+from src.websocket.utils import get_stream_key
+
+
+class RecordingSocket:
+    scope = {"type": "websocket", "subprotocols": []}
+
+    def __init__(self):
+        self.sent: list[str] = []
+
+    async def accept(self, subprotocol: str | None = None):
+        pass
+
+    async def send_text(self, message: str):
+        self.sent.append(message)
+
+    async def close(self, code: int):
+        pass
+
+
+async def received(socket: RecordingSocket, message: str, timeout: float = 5):
+    async with asyncio.timeout(timeout):
+        while not any(message in sent for sent in socket.sent):
+            await asyncio.sleep(0.01)
+
+
+async def delivery_resumes(break_groups) -> None:
+    socket = RecordingSocket()
+    connection = await manager.connect(socket, "user-1")
+    dispatcher = StreamDispatcher(block=100)
+    dispatcher.start()
+    try:
+        await dispatcher.subscribe("user-1")
+        await publish_to_stream("user-1", "before")
+        await received(socket, "before")
+
+        await break_groups(get_async_redis_storage())
+        await publish_to_stream("user-1", "after")
+
+        await received(socket, "after")
+        assert sum("before" in sent for sent in socket.sent) == 1
+    finally:
+        await dispatcher.stop()
+        await manager.disconnect("user-1", connection.websocket)
+
+
+def test_delivery_resumes_after_user_group_is_destroyed(fake_redis):
+    async def destroy(redis_client):
+        await redis_client.xgroup_destroy(get_stream_key("user-1"), GROUP_NAME)
+
+    fake_redis(delivery_resumes(destroy))
+
+
+def test_delivery_resumes_after_redis_is_flushed(fake_redis):
+    async def flush(redis_client):
+        await redis_client.flushall()
+
+    fake_redis(delivery_resumes(flush))
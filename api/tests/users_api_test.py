@@ -1,31 +1,35 @@
 import logging
+from uuid import uuid4
 
 import pytest
 from fastapi.testclient import TestClient
-from pymongo.database import Database
 
 from main import app
-from src.database import get_database, get_db_client
+from src.database import get_database, get_db_client, get_sync_db_client
 
 client = TestClient(app)
 logger = logging.getLogger(__name__)
 
 
 def get_database_override():
-    client = get_db_client()
-    return Database(client, "test_database")
+    return get_db_client().get_database("test_database")
 
 
 app.dependency_overrides[get_database] = get_database_override
 
 
+@pytest.fixture(scope="module", autouse=True)
+def client_lifespan():
+    with client:
+        yield
+
+
 @pytest.fixture(autouse=True)
 def database_cleanup():
     yield
 
     print("TEARDOWN STARTED....\n")
-    client = get_db_client()
-    client.drop_database("test_database")
+    get_sync_db_client().drop_database("test_database")
     print("TEARDOWN COMPLETE\n")
 
 
@@ -81,3 +85,31 @@ def test_login_user(created_user):
 
     assert response.status_code == 200
     assert response.cookies.get("session_id", "") != ""
+
+
+def test_logout_invalidates_session(created_user):
+    response = client.post("/api/users/login", data=created_user)
+    session_headers = {"cookie": f"session_id={response.cookies['session_id']}"}
+
+    # Warm the session cache before logging out
+    response = client.get("/api/devices", headers=session_headers)
+    assert response.status_code == 200
+
+    response = client.delete("/api/users/logout", headers=session_headers)
+    assert response.status_code == 200
+
+    response = client.get("/api/devices", headers=session_headers)
+    assert response.status_code == 401
+
+
+def test_login_is_throttled_after_repeated_failures():
+    credentials = {"email": f"{uuid4().hex}@mail.com", "password": "WrongPassword1"}
+
+    for _ in range(5):
+        response = client.post("/api/users/login", data=credentials)
+        assert response.status_code == 401
+
+    response = client.post("/api/users/login", data=credentials)
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
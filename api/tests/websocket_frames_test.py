@@ -0,0 +1,16 @@
+import json
+
+from src.websocket.router import acked_ids
+
+
+def test_acked_ids_keeps_only_stream_ids():
+    frame = json.dumps({"ack": ["1700000000000-0", "1700000000001", "0-x", 12, None]})
+
+    assert acked_ids(frame) == ["1700000000000-0", "1700000000001", "12"]
+
+
+def test_acked_ids_ignores_other_frames():
+    assert acked_ids("hello") is None
+    assert acked_ids(json.dumps({"ack": "1700000000000-0"})) is None
+    assert acked_ids(json.dumps(["1700000000000-0"])) is None
+
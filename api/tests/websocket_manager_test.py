@@ -0,0 +1,176 @@
+import asyncio
+
+from fastapi import status
+
+from src.metrics import metrics
+from src.websocket.codecs import TEXT_CODEC
+from src.websocket.manager import Connection
+
+
+class GatedSocket:
+    """Socket whose sends block until `gate` is set."""
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.sent: list[str] = []
+        self.close_code: int | None = None
+
+    async def send_text(self, message: str):
+        await self.gate.wait()
+        self.sent.append(message)
+
+    async def close(self, code: int):
+        self.close_code = code
+
+
+def make_connection(socket, overflow_policy="drop_oldest", **options) -> Connection:
+    evicted = []
+    connection = Connection(
+        socket,
+        "user-1",
+        max_queue_size=options.get("max_queue_size", 3),
+        overflow_policy=overflow_policy,
+        send_timeout=options.get("send_timeout", 5),
+        max_dropped=options.get("max_dropped", 100),
+        on_evict=evicted.append,
+        codec=TEXT_CODEC,
+    )
+    connection.evictions = evicted
+    return connection
+
+
+async def stalled(socket, overflow_policy, **options) -> Connection:
+    """A connection whose writer is stuck sending "m0"."""
+    connection = make_connection(socket, overflow_policy, **options)
+    connection.enqueue("m0")
+    await asyncio.sleep(0)
+    return connection
+
+
+async def drain(connection: Connection, socket: GatedSocket) -> None:
+    socket.gate.set()
+    while len(connection):
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+
+def test_drop_oldest_keeps_the_newest_messages():
+    async def scenario():
+        socket = GatedSocket()
+        connection = await stalled(socket, "drop_oldest")
+        for index in range(1, 6):
+            connection.enqueue(f"m{index}")
+
+        assert connection.dropped == 2
+        await drain(connection, socket)
+        assert socket.sent == ["m0", "m3", "m4", "m5"]
+        await connection.stop()
+
+    asyncio.run(scenario())
+
+
+def test_drop_newest_keeps_the_queued_messages():
+    async def scenario():
+        socket = GatedSocket()
+        connection = await stalled(socket, "drop_newest")
+        for index in range(1, 6):
+            connection.enqueue(f"m{index}")
+
+        assert connection.dropped == 2
+        await drain(connection, socket)
+        assert socket.sent == ["m0", "m1", "m2", "m3"]
+        await connection.stop()
+
+    asyncio.run(scenario())
+
+
+def test_coalesce_replaces_without_counting_a_drop():
+    async def scenario():
+        socket = GatedSocket()
+        connection = await stalled(socket, "coalesce")
+        connection.enqueue("cpu 1", key="device-1:cpu")
+        connection.enqueue("ram 1", key="device-1:ram")
+        connection.enqueue("temperature 1", key="device-1:temperature")
+        connection.enqueue("cpu 2", key="device-1:cpu")
+        connection.enqueue("cpu 3", key="device-1:cpu")
+
+        assert connection.dropped == 0
+
+        # Nothing to coalesce with: falls back to dropping the oldest
+        connection.enqueue("disk 1", key="device-1:disk")
+        assert connection.dropped == 1
+
+        await drain(connection, socket)
+        assert socket.sent == ["m0", "ram 1", "temperature 1", "disk 1"]
+        await connection.stop()
+
+    asyncio.run(scenario())
+
+
+def test_socket_losing_too_many_messages_is_evicted():
+    async def scenario():
+        socket = GatedSocket()
+        connection = await stalled(socket, "drop_oldest", max_dropped=2)
+        for index in range(1, 7):
+            connection.enqueue(f"m{index}")
+
+        assert connection.evicted
+        assert connection.evictions == [connection]
+
+        # The stalled send completes, then the socket is closed with 1013
+        socket.gate.set()
+        await asyncio.wait_for(connection._task, 1)
+        assert socket.close_code == status.WS_1013_TRY_AGAIN_LATER
+
+    asyncio.run(scenario())
+
+
+def test_drops_are_forgotten_once_the_queue_drains():
+    async def scenario():
+        socket = GatedSocket()
+        connection = await stalled(socket, "drop_oldest", max_dropped=2)
+        for _ in range(3):
+            for index in range(1, 6):
+                connection.enqueue(f"m{index}")
+            assert connection.dropped == 2
+
+            await drain(connection, socket)
+            assert connection.dropped == 0
+            socket.gate.clear()
+            connection.enqueue("m0")
+            await asyncio.sleep(0)
+
+        assert not connection.evicted
+        await connection.stop()
+
+    asyncio.run(scenario())
+
+
+def test_stalled_send_is_evicted():
+    async def scenario():
+        socket = GatedSocket()
+        connection = await stalled(socket, "drop_oldest", send_timeout=0.05)
+
+        await asyncio.wait_for(connection._task, 1)
+
+        assert connection.evicted
+        assert socket.close_code == status.WS_1013_TRY_AGAIN_LATER
+
+    asyncio.run(scenario())
+
+
+def test_frame_bytes_count_the_encoded_text():
+    async def scenario():
+        socket = GatedSocket()
+        socket.gate.set()
+        connection = make_connection(socket)
+        before = metrics.snapshot()["counters"].get("ws.frame_bytes", 0)
+
+        connection.enqueue("héllo")
+        await drain(connection, socket)
+
+        after = metrics.snapshot()["counters"]["ws.frame_bytes"]
+        assert after - before == len("héllo".encode())
+        await connection.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,68 @@
+import os
+import selectors
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+API_DIR = Path(__file__).resolve().parent.parent
+
+
+def read_line(process: subprocess.Popen, timeout: float = 10) -> str:
+    with selectors.DefaultSelector() as selector:
+        selector.register(process.stdout, selectors.EVENT_READ)
+        if not selector.select(timeout):
+            raise TimeoutError("worker did not answer in time")
+    return process.stdout.readline().strip()
+
+
+@pytest.fixture()
+def redis_env(redis_server):
+    """Environment that points every worker process at `redis_server`."""
+    return dict(os.environ)
+
+
+def start_worker(env: dict, *args: str, **kwargs) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "tests.routing_worker", *args],
+        cwd=API_DIR,
+        env=env,
+        text=True,
+        stdout=subprocess.PIPE,
+        **kwargs,
+    )
+
+
+def test_message_reaches_socket_on_another_worker(redis_env):
+    holder = start_worker(redis_env, "hold", "user-1", stdin=subprocess.PIPE)
+    try:
+        assert read_line(holder) == "ready"
+
+        sender = start_worker(redis_env, "send", "user-1", "hello")
+        assert sender.wait(timeout=10) == 0
+
+        assert read_line(holder) == "received hello"
+    finally:
+        holder.stdin.close()
+        holder.wait(timeout=10)
+
+
+def test_sockets_of_one_user_on_two_workers_both_receive(redis_env):
+    holders = [
+        start_worker(redis_env, "hold", "user-1", stdin=subprocess.PIPE)
+        for _ in range(2)
+    ]
+    try:
+        for holder in holders:
+            assert read_line(holder) == "ready"
+
+        sender = start_worker(redis_env, "send", "user-1", "hello")
+        assert sender.wait(timeout=10) == 0
+
+        for holder in holders:
+            assert read_line(holder) == "received hello"
+    finally:
+        for holder in holders:
+            holder.stdin.close()
+            holder.wait(timeout=10)